@@ -1,39 +1,433 @@
 import math
-from agents import common
+import time
 from agents.common import check_end_state as game_state
-from agents.common import BoardPiece, SavedState, PlayerAction
+from agents.common import check_end_state_incremental
+from agents.common import BoardPiece, SavedState, PlayerAction, BitBoard, as_array, mirror_move, NO_PLAYER
+from agents.common import encode_bitboards, bit_connected_four
 import numpy as np
 from agents.common import GameState
-from typing import Optional, Tuple
+from agents.windows import N_WINDOWS, CELL_WINDOWS, WINDOW_INDICES
+from agents.threats import Threats
+from agents.opening_book import book_move
+from typing import Optional, Tuple, Union, List
 
 DEPTH = 4
+TIME_BUDGET = None  # in sec; when set, the search deepens iteratively until the time is out instead of using DEPTH
+ENGINE = 'alphabeta'  # default search engine
+ENGINES = ('alphabeta', 'pvs', 'mtdf')  # full window alpha-beta, principal variation search and MTD(f)
 ROW = 6
 COL = 7
 
+CENTER_ORDER = [3, 2, 4, 1, 5, 0, 6]  # static move order, central columns take part in more lines
+ORDERING = ('pv', 'tt', 'killer', 'history', 'center')  # default move ordering heuristics, by priority
+TT_SIZE = 2 ** 16  # default number of entries of the transposition table
+EXACT = 0  # the stored value is the exact minimax value
+LOWER_BOUND = 1  # the search failed high, the value is at least the stored one
+UPPER_BOUND = 2  # the search failed low, the value is at most the stored one
 
-def generate_move_minimax(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]) -> Tuple[
-    PlayerAction, Optional[SavedState]]:
+# random 63-bit numbers for every piece on every cell, the Zobrist key of a board is the XOR of its pieces.
+# The low 64 bits of a key hash the board and the high 64 bits its mirror image, both are updated by one XOR.
+_zobrist_rng = np.random.default_rng(20201)
+_zobrist = _zobrist_rng.integers(1, 2 ** 63, size=(2, ROW, COL), dtype=np.int64).tolist()
+_zobrist_min = int(_zobrist_rng.integers(1, 2 ** 63, dtype=np.int64))
+KEY_BITS = 64
+KEY_MASK = (1 << KEY_BITS) - 1
+ZOBRIST = [[[_zobrist[p][row][col] | (_zobrist[p][row][COL - 1 - col] << KEY_BITS) for col in range(COL)]
+            for row in range(ROW)] for p in range(2)]
+ZOBRIST_MIN = _zobrist_min | (_zobrist_min << KEY_BITS)  # set when the opponent is on turn
+
+
+class TranspositionTable:
+    """
+    A class used to represent a fixed size transposition table. Each Zobrist key maps to one slot,
+    so the memory never grows beyond max_entries entries.
+
+    Attributes:
+        max_entries: int number of slots of the table
+        replacement: str 'depth' keeps the deeper search in a slot, 'always' keeps the newest one
+        probes: int number of lookups
+        hits: int number of lookups that found the position
+        stores: int number of stored results
+        overwrites: int number of stores that replaced another position
+
+    Methods:
+        lookup, store, hit_rate
+    """
+
+    def __init__(self, max_entries: int = TT_SIZE, replacement: str = 'depth'):
+        """
+        Initializes an empty table
+        Parameters:
+            max_entries: number of slots, caps the memory of the table
+            replacement: 'depth' or 'always', policy used when two positions share a slot
+        """
+        if replacement not in ('depth', 'always'):
+            raise ValueError(f'unknown replacement policy {replacement}')
+        self.max_entries = max_entries
+        self.replacement = replacement
+        self.slots = [None] * max_entries  # (key, depth, value, bound, best move) or None
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def lookup(self, key: int) -> Optional[Tuple[int, float, int, Optional[int]]]:
+        """
+        Returns depth, value, bound and best move stored for the position or None
+        Parameters:
+            key: Zobrist key of the position
+        """
+        self.probes += 1
+        entry = self.slots[key % self.max_entries]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1:]
+
+    def store(self, key: int, depth: int, value: float, bound: int, move: Optional[int]):
+        """
+        Stores the result of a search, if the replacement policy allows it
+        Parameters:
+            key: Zobrist key of the position
+            depth: remaining depth the position was searched with
+            value: result of the search
+            bound: EXACT, LOWER_BOUND or UPPER_BOUND
+            move: best move found or None
+        """
+        index = key % self.max_entries
+        entry = self.slots[index]
+        if entry is not None and entry[0] != key:
+            if self.replacement == 'depth' and entry[1] > depth:
+                return
+            self.overwrites += 1
+        self.slots[index] = (key, depth, value, bound, move)
+        self.stores += 1
+
+    def hit_rate(self) -> float:
+        """
+        Returns the part of the lookups that found the position
+        Parameters: None
+        """
+        return self.hits / self.probes if self.probes else 0.0
+
+
+# WINDOW_SCORE[own][other] value of a window for the player with `own` pieces, the weights of evaluate_position
+WINDOW_SCORE = np.zeros((5, 5), dtype=np.int64)
+WINDOW_SCORE[3, 0], WINDOW_SCORE[2, 0], WINDOW_SCORE[1, 0] = 1000, 100, 1
+_WINDOW_SCORE = WINDOW_SCORE.tolist()  # nested lists are faster to index with single ints
+
+
+class IncrementalEvaluator:
+    """
+    A class used to keep the heuristic of evaluate_curr_board up to date while moves are made and unmade.
+    Only the windows through the changed cell are updated, so the evaluation of a leaf is O(1).
+
+    Attributes:
+        counts: List[List[int]] number of pieces of PLAYER1 and PLAYER2 in every window
+        totals: List[int] sum of the window scores of PLAYER1 and PLAYER2
+        fours: List[int] number of windows filled by PLAYER1 and PLAYER2
+
+    Methods:
+        play, undo, evaluate
+    """
+
+    def __init__(self, board: np.ndarray):
+        """
+        Counts the pieces of every window of `board`
+        Parameters:
+            board: ndarray representation of the board
+        """
+        self.counts = [[0] * N_WINDOWS, [0] * N_WINDOWS]
+        self.totals = [0, 0]
+        self.fours = [0, 0]
+        for row, col in zip(*np.nonzero(board)):
+            self.play(row, col, board[row, col])
+
+    def play(self, row: int, col: int, player: BoardPiece):
+        """
+        Adds a piece of `player` on the cell (row, col)
+        """
+        own, other = self.counts[player - 1], self.counts[2 - player]
+        totals = self.totals
+        for w in CELL_WINDOWS[row][col]:
+            mine, theirs = own[w], other[w]
+            totals[player - 1] += _WINDOW_SCORE[mine + 1][theirs] - _WINDOW_SCORE[mine][theirs]
+            totals[2 - player] += _WINDOW_SCORE[theirs][mine + 1] - _WINDOW_SCORE[theirs][mine]
+            own[w] = mine + 1
+            if mine == 3:
+                self.fours[player - 1] += 1
+
+    def undo(self, row: int, col: int, player: BoardPiece):
+        """
+        Removes the piece of `player` from the cell (row, col)
+        """
+        own, other = self.counts[player - 1], self.counts[2 - player]
+        totals = self.totals
+        for w in CELL_WINDOWS[row][col]:
+            mine, theirs = own[w], other[w]
+            totals[player - 1] += _WINDOW_SCORE[mine - 1][theirs] - _WINDOW_SCORE[mine][theirs]
+            totals[2 - player] += _WINDOW_SCORE[theirs][mine - 1] - _WINDOW_SCORE[theirs][mine]
+            own[w] = mine - 1
+            if mine == 4:
+                self.fours[player - 1] -= 1
+
+    def evaluate(self, player: BoardPiece) -> int:
+        """
+        Returns the same value as evaluate_curr_board(board, player) for the current board
+        """
+        if self.fours[player - 1]:
+            return 110000
+        if self.fours[2 - player]:
+            return -100000
+        return self.totals[player - 1]
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the deadline of the context is over
+    """
+
+
+class SearchContext:
+    """
+    A class used to represent the state shared by all nodes of one search
+
+    Attributes:
+        tt: TranspositionTable shared by all children of the root or None
+        nodes: int number of visited nodes
+        best_move: int best move at the root of the last finished search
+        deadline: float time.time() after which the search is aborted or None
+        completed_depth: int deepest finished iteration of iterative deepening
+        pv: List[int] principal variation of the last finished iteration
+        pv_moves: dict Zobrist key -> move of the positions on the principal variation, searched first
+        ordering: Tuple[str, ...] move ordering heuristics, see ordered_moves
+        killers: List[List[int]] two latest moves per ply that caused a cutoff
+        history: List[List[int]] cutoff score of every column for the maximising and the minimising player
+        root_moves: int number of pieces on the board at the root
+        nodes_per_ply: List[int] number of visited nodes per ply
+        cutoffs: List[int] number of cutoffs per ply
+        first_move_cutoffs: List[int] number of cutoffs per ply caused by the first searched move
+        heights: List[int] number of pieces in every column of the searched board
+        stack: List[int] columns played since the root
+        incremental: bool True to score the leaves with an IncrementalEvaluator
+        evaluator: IncrementalEvaluator of the searched board or None
+
+    Methods:
+        record_cutoff, branching_factors
+    """
+
+    def __init__(self, tt: Optional[TranspositionTable] = None, use_tt: bool = True,
+                 ordering: Tuple[str, ...] = ORDERING, incremental: bool = True):
+        """
+        Initializes the context
+        Parameters:
+            tt: transposition table to be used, a new one is created when not provided
+            use_tt: False to search without a transposition table
+            ordering: move ordering heuristics by priority, any of 'pv', 'tt', 'killer', 'history' and 'center'
+            incremental: False to score every leaf from scratch with evaluate_threats
+        """
+        unknown = set(ordering) - set(ORDERING)
+        if unknown:
+            raise ValueError(f'unknown move ordering {unknown}')
+        self.tt = (tt if tt is not None else TranspositionTable()) if use_tt else None
+        self.nodes = 0
+        self.best_move = None
+        self.deadline = None
+        self.completed_depth = 0
+        self.pv = []
+        self.pv_moves = {}
+        self.ordering = tuple(ordering)
+        self.killers = [[None, None] for _ in range(ROW * COL + 1)]
+        self.history = [[0] * COL, [0] * COL]
+        self.root_moves = 0
+        self.nodes_per_ply = [0] * (ROW * COL + 1)
+        self.cutoffs = [0] * (ROW * COL + 1)
+        self.first_move_cutoffs = [0] * (ROW * COL + 1)
+        self.heights = [0] * COL
+        self.stack = []
+        self.incremental = incremental
+        self.evaluator = None
+
+    def record_cutoff(self, ply: int, move: int, index: int, depth: int, maximising: bool):
+        """
+        Updates the killer moves, the history table and the cutoff statistics after a cutoff
+        Parameters:
+            ply: distance of the node from the root
+            move: column that caused the cutoff
+            index: position of the move in the searched order
+            depth: remaining depth of the node
+            maximising: True, when the agent is on turn in the node
+        """
+        self.cutoffs[ply] += 1
+        if index == 0:
+            self.first_move_cutoffs[ply] += 1
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[0 if maximising else 1][move] += depth * depth
+
+    def branching_factors(self) -> List[float]:
+        """
+        Returns the effective branching factor per ply, the number of nodes of a ply divided by the previous ply
+        Parameters: None
+        """
+        factors = []
+        for ply in range(1, len(self.nodes_per_ply)):
+            if self.nodes_per_ply[ply] == 0:
+                break
+            factors.append(self.nodes_per_ply[ply] / self.nodes_per_ply[ply - 1])
+        return factors
+
+
+def generate_move_minimax(board: Union[np.ndarray, BitBoard], player: BoardPiece, saved_state: Optional[SavedState],
+                          context: Optional[SearchContext] = None, time_budget: Optional[float] = None,
+                          engine: Optional[str] = None, use_book: bool = False) \
+        -> Tuple[PlayerAction, Optional[SavedState]]:
     """
        Choose a move based on alpha-beta minimax
        Arguments:
-       board: ndarray representation of the board
+       board: ndarray or BitBoard representation of the board
        player: whether agent plays with X (Player1) or O (Player2)
        saved_state: computation that it could reuse for future moves
+       context: transposition table and statistics of the search, a new one is created when not provided
+       time_budget: in sec; deepen iteratively until the time is out, TIME_BUDGET when not provided,
+                    the fixed DEPTH is searched when both are None
+       engine: one of ENGINES, ENGINE when not provided
+       use_book: True to play the move of the opening book, when the position is in it; no state is returned then
        Return:
            Tuple[PlayerAction, SavedState]: returns the column, where the agent will play and agent computations
        """
-    board_copy = board.copy()
+    if use_book:
+        move = book_move(board, player)
+        if move is not None:
+            return move, None  # the state of the search does not belong to the book position
+    board_copy = as_array(board).copy()
+    if context is None:
+        context = SearchContext()
+    if time_budget is None:
+        time_budget = TIME_BUDGET
+    if engine is None:
+        engine = ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f'unknown search engine {engine}')
+
+    if time_budget is not None:
+        return PlayerAction(iterative_deepening(board_copy, player, context, time_budget, engine)), saved_state
 
-    # compute with alpha-beta next action
-    value, SavedValue = alpha_beta_minimax(board_copy, player, -math.inf, math.inf, DEPTH, True)
-    action = np.where(SavedValue == value)[0][0]  # find the column comes the best value
-    return action, saved_state
+    # compute with the engine next action
+    search_root(board_copy, player, DEPTH, context, zobrist_key(board_copy), engine)
+    return PlayerAction(context.best_move), saved_state
 
 
-def alpha_beta_minimax(board: np.ndarray, player: BoardPiece, alpha: int, beta: int, depth: int, maximising: bool) \
+def search_root(board: np.ndarray, player: BoardPiece, depth: int, context: SearchContext, key: int,
+                engine: str = 'alphabeta', guess: int = 0) -> int:
+    """
+    Searches the root with one of the engines and sets context.best_move
+    Arguments:
+        board: ndarray representation of the board
+        player: the player on turn
+        depth: depth of the search
+        context: transposition table and statistics of the search
+        key: Zobrist key of the board
+        engine: 'alphabeta', 'pvs' or 'mtdf'
+        guess: first guess of the value for 'mtdf', usually the value of the previous iteration
+    Return:
+        int: value of the root for `player`
+    """
+    if engine == 'alphabeta':
+        value, _ = alpha_beta_minimax(board, player, -math.inf, math.inf, depth, True, context=context, key=key)
+        return value
+    elif engine == 'pvs':
+        return negamax(board, player, -math.inf, math.inf, depth, context=context, key=key)
+    elif engine == 'mtdf':
+        return mtdf(board, player, guess, depth, context, key)
+    raise ValueError(f'unknown search engine {engine}')
+
+
+def iterative_deepening(board: np.ndarray, player: BoardPiece, context: SearchContext, time_budget: float,
+                        engine: str = 'alphabeta') -> int:
+    """
+    Searches with depth 1, 2, 3, ... until the time budget is out. The first depth is always finished.
+    Every iteration searches the principal variation of the previous one first.
+    Arguments:
+        board: ndarray representation of the board
+        player: the player on turn
+        context: transposition table and statistics of the search
+        time_budget: in sec; time after which the running iteration is aborted
+        engine: one of ENGINES, MTD(f) starts every iteration from the value of the previous one
+    Return:
+        int: best move of the deepest finished iteration
+    """
+    tic = time.time()
+    key = zobrist_key(board)
+    best_move = None
+    value = 0
+    context.deadline = None
+    for depth in range(1, ROW * COL - np.count_nonzero(board) + 1):
+        try:
+            value = search_root(board, player, depth, context, key, engine, value)
+        except SearchTimeout:
+            break
+        best_move = context.best_move
+        context.completed_depth = depth
+        context.pv = principal_variation(board, player, context, key, depth)
+        context.deadline = tic + time_budget
+        if time.time() > context.deadline:
+            break
+    context.deadline = None
+    return best_move
+
+
+def principal_variation(board: np.ndarray, player: BoardPiece, context: SearchContext, key: int, depth: int) \
+        -> List[int]:
+    """
+    Follows the best moves stored in the transposition table from the root and records them in context.pv_moves
+    Arguments:
+        board: ndarray representation of the board at the root
+        player: the player on turn at the root
+        context: context of the finished search
+        key: Zobrist key of the root
+        depth: maximal length of the variation
+    Return:
+        List[int]: moves of the principal variation
+    """
+    context.pv_moves = {}
+    if context.tt is None:
+        context.pv_moves[key] = context.best_move
+        return [context.best_move]
+
+    board = board.copy()
+    pv = []
+    on_turn = player
+    for ply in range(depth):
+        maximising = ply % 2 == 0
+        node_key = key if maximising else key ^ ZOBRIST_MIN
+        tt_key, mirrored = canonical_zobrist(node_key)
+        entry = context.tt.lookup(tt_key)
+        move = context.best_move if ply == 0 else entry[3] if entry is not None else None
+        if move is None:
+            break
+        if ply > 0 and mirrored:
+            move = mirror_move(move)
+        row = np.count_nonzero(board[:, move])
+        if row >= ROW:
+            break
+        context.pv_moves[node_key] = move
+        pv.append(move)
+        board[row, move] = on_turn
+        key ^= ZOBRIST[on_turn - 1][row][move]
+        on_turn = other_player(on_turn)
+    return pv
+
+
+def alpha_beta_minimax(board: np.ndarray, player: BoardPiece, alpha: int, beta: int, depth: int, maximising: bool,
+                       last_move: Optional[Tuple[int, int]] = None, moves: Optional[int] = None,
+                       context: Optional['SearchContext'] = None, key: int = 0) \
         -> Tuple[int, np.ndarray]:
     """
     Recursive Alpha-beta pruning,minimax. Called by alpha_beta_action.
+    The moves are made and unmade in place on `board`, which is unchanged when the search returns.
     Arguments:
             board: ndarray representation of the board
             player: the player or the opponent to be mini/maximized
@@ -41,59 +435,364 @@ def alpha_beta_minimax(board: np.ndarray, player: BoardPiece, alpha: int, beta:
             beta: value set to infinity
             depth: evaluate the game tree down to some fixed depth
             maximising: True, when agent is on turn(MAX), False when opponent is on turn(MIN)
+            last_move: row and column of the last move, None at the root
+            moves: number of pieces on the board, counted when not provided
+            context: transposition table and statistics shared by the whole search,
+                     at the root a context without table and move ordering is used when not provided
+            key: Zobrist key of the pieces on the board, updated with every move
         Return:
             Tuple[int, SavedValue]: returns the best value and list with computed values for each column
     """
 
     # define the opponent
     opponent = other_player(player)
+    root = last_move is None
+    if root:
+        context, moves = start_search(board, context, moves)
+    ply = moves - context.root_moves
+    context.nodes += 1
+    context.nodes_per_ply[ply] += 1
+    if context.deadline is not None and time.time() > context.deadline:
+        raise SearchTimeout
+    tt = context.tt
+    # same pieces with the other player on turn is another position
+    node_key = key if maximising else key ^ ZOBRIST_MIN
+    # a position and its mirror image share the entry, the moves of the mirror image are mirrored
+    tt_key, mirrored = canonical_zobrist(node_key)
 
-    # evaluate current board when all the moves are done or game is won by one of the players
-    if (depth == 0 or
-            game_state(board, BoardPiece(1)) != GameState.STILL_PLAYING or
-            game_state(board, BoardPiece(2)) != GameState.STILL_PLAYING):
-        return (depth + 1) * evaluate_curr_board(board, player) - (depth + 1) * evaluate_curr_board(board, opponent)
+    # use the stored result, when the position was already searched at least as deep
+    alpha_orig, beta_orig = alpha, beta
+    tt_move = None
+    entry = tt.lookup(tt_key) if tt is not None else None
+    if entry is not None:
+        tt_move = entry[3] if entry[3] is None or not mirrored else mirror_move(entry[3])
+        if entry[0] >= depth and not root:
+            entry_value, bound = entry[1], entry[2]
+            if bound == EXACT:
+                return entry_value
+            elif bound == LOWER_BOUND:
+                alpha = max(alpha, entry_value)
+            else:
+                beta = min(beta, entry_value)
+            if alpha >= beta:
+                return entry_value
 
+    # evaluate current board when all the moves are done or game is won by one of the players,
+    # the root is always searched to return a move
+    if depth == 0 or (not root and game_over(board, opponent if maximising else player, last_move, moves)):
+        if context.evaluator is not None:
+            value = (depth + 1) * context.evaluator.evaluate(player) - (depth + 1) * context.evaluator.evaluate(opponent)
+        else:
+            position, mask = encode_bitboards(board, player)  # one encoding for both players
+            value = (depth + 1) * evaluate_threats(position, mask) \
+                - (depth + 1) * evaluate_threats(mask ^ position, mask)
+        if tt is not None:
+            tt.store(tt_key, depth, value, EXACT, None)
+        return value
 
-    SavedValue = np.zeros(7)  # list with computed values for each column
+    if root:
+        SavedValue = np.full(COL, np.nan)  # list with computed values for each column, None for full columns
+    heights = context.heights
+    best_move = None
+    searched = 0  # number of searched children
     # Alpha - Beta pruning
     # maximising the agent
     if maximising:
-        tmp_board = board.copy()
-        for col in range(COL):
-            if np.count_nonzero(board[:, col] == 0) > 0:
-                after_action = common.apply_player_action(board, col, player, True)  # do move with player
-                value = alpha_beta_minimax(after_action, player, alpha, beta, depth - 1, False)  # evaluate board
-                if depth == DEPTH:
+        for col in ordered_moves(context, node_key, ply, tt_move, maximising):
+            row = heights[col]  # row where the piece falls
+            if row < ROW:
+                make_move(board, context, col, player)  # do move with player
+                try:
+                    value = alpha_beta_minimax(board, player, alpha, beta, depth - 1, False, (row, col), moves + 1,
+                                               context, key ^ ZOBRIST[player - 1][row][col])  # evaluate board
+                finally:
+                    unmake_move(board, context)
+                if root:
                     SavedValue[col] = value  # saves values for child of root(first move)
-                board = tmp_board.copy()
                 # cut off
                 if value > alpha:
                     alpha = value
+                    best_move = col
                     if alpha >= beta:
+                        context.record_cutoff(ply, col, searched, depth, maximising)
                         break
-            else:
-                SavedValue[col] = None  # when the column is full
-        if depth == DEPTH:
+                searched += 1
+        if tt is not None:
+            bound = UPPER_BOUND if alpha <= alpha_orig else LOWER_BOUND if alpha >= beta else EXACT
+            tt.store(tt_key, depth, alpha, bound, stored_move(best_move, mirrored))
+        if root:
+            context.best_move = best_move
             return alpha, SavedValue  # final return
         else:
             return alpha
     # minimising the opponent
     else:
-        tmp_board = board.copy()
-        for col in range(COL):
-            if np.count_nonzero(board[:, col] == 0) > 0:
-                after_action = common.apply_player_action(board, col, opponent, True)
-                value = alpha_beta_minimax(after_action, player, alpha, beta, depth - 1, True)
-                board = tmp_board.copy()
+        for col in ordered_moves(context, node_key, ply, tt_move, maximising):
+            row = heights[col]
+            if row < ROW:
+                make_move(board, context, col, opponent)
+                try:
+                    value = alpha_beta_minimax(board, player, alpha, beta, depth - 1, True, (row, col), moves + 1,
+                                               context, key ^ ZOBRIST[opponent - 1][row][col])
+                finally:
+                    unmake_move(board, context)
                 # cut off
                 if value < beta:
                     beta = value
+                    best_move = col
                     if alpha >= beta:
+                        context.record_cutoff(ply, col, searched, depth, maximising)
                         break
+                searched += 1
+        if tt is not None:
+            bound = LOWER_BOUND if beta >= beta_orig else UPPER_BOUND if beta <= alpha else EXACT
+            tt.store(tt_key, depth, beta, bound, stored_move(best_move, mirrored))
         return beta
 
 
+def negamax(board: np.ndarray, player: BoardPiece, alpha: int, beta: int, depth: int,
+            last_move: Optional[Tuple[int, int]] = None, moves: Optional[int] = None,
+            context: Optional[SearchContext] = None, key: int = 0) -> int:
+    """
+    Recursive fail-soft negamax with principal variation search. The first child is searched with the full window,
+    the others with a null window around alpha and searched again only when they fall inside the window.
+    The values are for the player on turn and use the heuristic of alpha_beta_minimax,
+    so the root value is the same as the one of alpha_beta_minimax.
+    Arguments:
+            board: ndarray representation of the board
+            player: the player on turn
+            alpha: lower bound of the window
+            beta: upper bound of the window
+            depth: evaluate the game tree down to some fixed depth
+            last_move: row and column of the last move, None at the root
+            moves: number of pieces on the board, counted when not provided
+            context: transposition table and statistics shared by the whole search,
+                     at the root a context without table and move ordering is used when not provided
+            key: Zobrist key of the pieces on the board, updated with every move
+        Return:
+            int: value of the position for `player`, a bound when it falls outside the window
+    """
+    opponent = other_player(player)
+    root = last_move is None
+    if root:
+        context, moves = start_search(board, context, moves)
+    ply = moves - context.root_moves
+    maximising = ply % 2 == 0  # the player on turn at the root
+    context.nodes += 1
+    context.nodes_per_ply[ply] += 1
+    if context.deadline is not None and time.time() > context.deadline:
+        raise SearchTimeout
+    tt = context.tt
+    node_key = key if maximising else key ^ ZOBRIST_MIN
+    tt_key, mirrored = canonical_zobrist(node_key)
+
+    alpha_orig = alpha
+    tt_move = None
+    entry = tt.lookup(tt_key) if tt is not None else None
+    if entry is not None:
+        tt_move = entry[3] if entry[3] is None or not mirrored else mirror_move(entry[3])
+        if entry[0] >= depth and not root:
+            entry_value, bound = entry[1], entry[2]
+            if bound == EXACT:
+                return entry_value
+            elif bound == LOWER_BOUND:
+                alpha = max(alpha, entry_value)
+            else:
+                beta = min(beta, entry_value)
+            if alpha >= beta:
+                return entry_value
+
+    if depth == 0 or (not root and game_over(board, opponent, last_move, moves)):
+        if context.evaluator is not None:
+            value = (depth + 1) * context.evaluator.evaluate(player) - (depth + 1) * context.evaluator.evaluate(opponent)
+        else:
+            position, mask = encode_bitboards(board, player)  # one encoding for both players
+            value = (depth + 1) * evaluate_threats(position, mask) \
+                - (depth + 1) * evaluate_threats(mask ^ position, mask)
+        if tt is not None:
+            tt.store(tt_key, depth, value, EXACT, None)
+        return value
+
+    heights = context.heights
+    best_value = -math.inf
+    best_move = None
+    searched = 0
+    for col in ordered_moves(context, node_key, ply, tt_move, maximising):
+        row = heights[col]
+        if row < ROW:
+            child_key = key ^ ZOBRIST[player - 1][row][col]
+            make_move(board, context, col, player)
+            try:
+                if searched == 0:
+                    value = -negamax(board, opponent, -beta, -alpha, depth - 1, (row, col), moves + 1, context,
+                                     child_key)
+                else:
+                    # null window, only proves that the move is not better than alpha
+                    value = -negamax(board, opponent, -alpha - 1, -alpha, depth - 1, (row, col), moves + 1, context,
+                                     child_key)
+                    if alpha < value < beta:
+                        value = -negamax(board, opponent, -beta, -value, depth - 1, (row, col), moves + 1, context,
+                                         child_key)
+            finally:
+                unmake_move(board, context)
+            if value > best_value:
+                best_value = value
+                best_move = col
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        context.record_cutoff(ply, col, searched, depth, maximising)
+                        break
+            searched += 1
+
+    if tt is not None:
+        bound = UPPER_BOUND if best_value <= alpha_orig else LOWER_BOUND if best_value >= beta else EXACT
+        tt.store(tt_key, depth, best_value, bound, stored_move(best_move, mirrored))
+    if root:
+        context.best_move = best_move
+    return best_value
+
+
+def mtdf(board: np.ndarray, player: BoardPiece, guess: int, depth: int, context: SearchContext, key: int) -> int:
+    """
+    MTD(f), finds the value of the root with null window searches of negamax that move the bounds
+    towards the value, starting from `guess`. The transposition table keeps the results between the searches.
+    Arguments:
+        board: ndarray representation of the board
+        player: the player on turn
+        guess: first guess of the value
+        depth: depth of the search
+        context: transposition table and statistics of the search
+        key: Zobrist key of the board
+    Return:
+        int: value of the root for `player`, context.best_move is a move that reaches it
+    """
+    value = guess
+    lower, upper = -math.inf, math.inf
+    best_move = None
+    while lower < upper:
+        beta = value + 1 if value == lower else value
+        value = negamax(board, player, beta - 1, beta, depth, context=context, key=key)
+        if value < beta:
+            upper = value  # failed low, every move is worse than beta
+        else:
+            lower = value  # failed high, the best move reaches at least beta
+            best_move = context.best_move
+    context.best_move = best_move
+    return value
+
+
+def start_search(board: np.ndarray, context: Optional[SearchContext], moves: Optional[int]) \
+        -> Tuple[SearchContext, int]:
+    """
+    Prepares the context for a search from the root `board`
+    Arguments:
+        board: ndarray representation of the board at the root
+        context: context of the search, one without table and move ordering is created when None
+        moves: number of pieces on the board, counted when None
+    Return:
+        Tuple[SearchContext, int]: the context and the number of pieces on the board
+    """
+    if context is None:
+        context = SearchContext(use_tt=False, ordering=())
+    if moves is None:
+        moves = np.count_nonzero(board)
+    context.root_moves = moves
+    context.heights = np.count_nonzero(board, axis=0).tolist()  # column-height index of the search
+    context.stack = []
+    context.evaluator = IncrementalEvaluator(board) if context.incremental else None
+    return context, moves
+
+
+def make_move(board: np.ndarray, context: 'SearchContext', col: int, player: BoardPiece):
+    """
+    Drops a piece of `player` in column `col` in place and pushes the column on the move stack of the search
+        Arguments:
+            board: ndarray representation of the board
+            context: context with the column-height index and the move stack
+            col: column to be played, must not be full
+            player: the player whose turn it is
+    """
+    row = context.heights[col]
+    board[row, col] = player
+    context.heights[col] = row + 1
+    context.stack.append(col)
+    if context.evaluator is not None:
+        context.evaluator.play(row, col, player)
+
+
+def unmake_move(board: np.ndarray, context: 'SearchContext'):
+    """
+    Takes back the last move of the move stack of the search in place
+        Arguments:
+            board: ndarray representation of the board
+            context: context with the column-height index and the move stack
+    """
+    col = context.stack.pop()
+    row = context.heights[col] - 1
+    context.heights[col] = row
+    if context.evaluator is not None:
+        context.evaluator.undo(row, col, board[row, col])
+    board[row, col] = NO_PLAYER
+
+
+def ordered_moves(context: Optional[SearchContext], tt_key: int, ply: int = 0, tt_move: Optional[int] = None,
+                  maximising: bool = True) -> List[int]:
+    """
+    Returns the columns in the order they are searched, following the heuristics in context.ordering.
+    'pv', 'tt' and 'killer' put the move of the previous principal variation, the best move stored
+    in the transposition table and the killer moves of the ply first, in the order of context.ordering.
+    The other columns are sorted by the history table with 'history' and start from the center with 'center'.
+        Arguments:
+            context: context of the search or None for left to right
+            tt_key: Zobrist key of the position, including the player on turn, the key of context.pv_moves
+            ply: distance of the node from the root
+            tt_move: best move stored in the transposition table or None
+            maximising: True, when the agent is on turn
+        Return:
+            List[int]: all columns, full ones included
+    """
+    if context is None:
+        return list(range(COL))
+
+    order = CENTER_ORDER.copy() if 'center' in context.ordering else list(range(COL))
+    if 'history' in context.ordering:
+        history = context.history[0 if maximising else 1]
+        order.sort(key=lambda col: -history[col])  # stable, equal scores keep the static order
+
+    first = []
+    for heuristic in context.ordering:
+        if heuristic == 'pv' and context.pv_moves:
+            first.append(context.pv_moves.get(tt_key))
+        elif heuristic == 'tt':
+            first.append(tt_move)
+        elif heuristic == 'killer':
+            first.extend(context.killers[ply])
+    for col in reversed(first):
+        if col is not None:
+            order.remove(col)
+            order.insert(0, col)
+    return order
+
+
+def game_over(board: np.ndarray, last_player: BoardPiece, last_move: Optional[Tuple[int, int]], moves: int) -> bool:
+    """
+    Returns True, when the game is won or drawn. Only the lines through the last move are checked,
+    when it is known. Called by alpha_beta_minimax.
+        Arguments:
+            board: ndarray representation of the board
+            last_player: the player who did the last move
+            last_move: row and column of the last move, None when unknown
+            moves: number of pieces on the board
+        Return:
+            bool: True, when the game is finished
+    """
+    if last_move is None:
+        return (game_state(board, BoardPiece(1)) != GameState.STILL_PLAYING or
+                game_state(board, BoardPiece(2)) != GameState.STILL_PLAYING)
+    return check_end_state_incremental(board, last_player, last_move, moves) != GameState.STILL_PLAYING
+
+
 def evaluate_curr_board(board: np.ndarray, player: BoardPiece) -> int:
     """
            The function evaluates the board for the current player. Called by alpha_beta_minimax.
@@ -101,45 +800,60 @@ def evaluate_curr_board(board: np.ndarray, player: BoardPiece) -> int:
                 board: ndarray representation of the board
                 player: the player whose moves have to be evaluated
             Return:
-                int: sum of the evaluated values for each the column/row and diagonal
+                int: sum of the evaluated values for each window of the board
             """
-    opponent = other_player(player)
+    position, mask = encode_bitboards(board, player)
+    return evaluate_threats(position, mask)
+
 
-    # when agent wins
-    if common.check_end_state(board, player) == GameState.IS_WIN:
+def evaluate_threats(position: int, mask: int) -> int:
+    """
+    The heuristic of evaluate_curr_board for a bitboard in the BitBoard layout: the windows with three, two and
+    one pieces of the player and no opponent piece are counted by threats.Threats and weighted with WINDOW_SCORE
+        Arguments:
+            position: bit representation of the board with the pieces of the player
+            mask: bit representation of the board with all pieces
+        Return:
+            int: sum of the evaluated values for each window of the board
+    """
+    threats = Threats(position, mask)
+    if threats.fours:
         return 110000
-    # when opponent wins
-    if common.check_end_state(board, opponent) == GameState.IS_WIN:
+    if bit_connected_four(mask ^ position):
         return -100000
+    return (_WINDOW_SCORE[3][0] * threats.threes + _WINDOW_SCORE[2][0] * threats.twos
+            + _WINDOW_SCORE[1][0] * threats.ones)
 
-    # evaluate every row of the board
-    value_row_list = []  # list with computed values for each row
-    for row in range(ROW):
-        value_row_list.append(evaluate_position(board[row, :], player))
-    value_row = np.sum(value_row_list)  # sums the evaluated values for the all 6 rows
-
-    # evaluate every column of the board
-    value_col_list = []  # list with compute values for each column
-    for col in range(COL):
-        value_col_list.append(evaluate_position(board[:, col].T, player))
-    value_col = np.sum(value_col_list)  # sums the evaluated values for the all 7 columns
 
-    # evaluate every (left top, right bottom) diagonal of the board
-    value_main_diag_list = []  # list with compute values for each (left top, right bottom) diagonal
-    for diag in range(-2, 4):
-        main_diag = np.diag(board, diag)
-        value_main_diag_list.append(evaluate_position(main_diag, player))
-        # sums the evaluated values for each (left top, right bottom)) diagonal
-    value_main_diag = np.sum(value_main_diag_list)
-
-    # evaluate every (right top, left bottom) diagonal of the board
-    value_opp_diag_list = []  # list with compute values for each (right top, left bottom) diagonal
-    for diag in range(-2, 4):
-        opp_diag = np.diag(board[::-1], diag)
-        value_opp_diag_list.append(evaluate_position(opp_diag, player))
-    value_opp_diag = np.sum(value_opp_diag_list)  # sums the evaluated values for each (right top, left bottom) diagonal
+def evaluate_boards(boards: np.ndarray) -> np.ndarray:
+    """
+    Vectorized evaluate_curr_board for both players of one board or of a stack of boards.
+    All 69 windows of every board are gathered with one fancy index and the pieces of both players
+    are counted along the last axis, so each board is scored in the same pass for PLAYER1 and PLAYER2.
+        Arguments:
+            boards: ndarray representation of one board (6, 7) or of a stack of boards (N, 6, 7)
+        Return:
+            np.ndarray: values of PLAYER1 and PLAYER2, shape (2,) for one board and (N, 2) for a stack
+    """
+    boards = np.asarray(boards)
+    single = boards.ndim == 2
+    if single:
+        boards = boards[np.newaxis]
+    windows = boards.reshape(len(boards), -1)[:, WINDOW_INDICES]  # shape (N, 69, 4)
+    pieces1 = np.count_nonzero(windows == BoardPiece(1), axis=2)  # shape (N, 69)
+    pieces2 = np.count_nonzero(windows == BoardPiece(2), axis=2)
 
-    return value_col + value_row + value_main_diag + value_opp_diag
+    scores = np.stack([WINDOW_SCORE[pieces1, pieces2].sum(axis=1), WINDOW_SCORE[pieces2, pieces1].sum(axis=1)],
+                      axis=1)
+    won1 = np.any(pieces1 == 4, axis=1)
+    won2 = np.any(pieces2 == 4, axis=1)
+    # when the opponent wins, unless the player wins as well
+    scores[won2, 0] = -100000
+    scores[won1, 1] = -100000
+    # when the player wins
+    scores[won1, 0] = 110000
+    scores[won2, 1] = 110000
+    return scores[0] if single else scores
 
 
 def evaluate_position(array_from_board: np.ndarray, player: BoardPiece) -> int:
@@ -170,6 +884,42 @@ def evaluate_position(array_from_board: np.ndarray, player: BoardPiece) -> int:
     return sum_val
 
 
+def zobrist_key(board: np.ndarray) -> int:
+    """
+    Computes the Zobrist key of the board from scratch, during the search it's updated with every move
+        Arguments:
+            board: ndarray representation of the board
+        Return:
+            int: XOR of the random numbers of all pieces on the board, of the mirror image in the high 64 bits
+    """
+    key = 0
+    for row, col in zip(*np.nonzero(board)):
+        key ^= ZOBRIST[board[row, col] - 1][row][col]
+    return key
+
+
+def canonical_zobrist(key: int) -> Tuple[int, bool]:
+    """
+    Returns the Zobrist key shared by the board and its mirror image, the smaller one of both halves of `key`,
+    and whether it is the key of the mirror image
+        Arguments:
+            key: Zobrist key of the board in the low and of its mirror image in the high 64 bits
+        Return:
+            Tuple[int, bool]: the key and True, when it belongs to the mirror image
+    """
+    board_key, mirrored_key = key & KEY_MASK, key >> KEY_BITS
+    if mirrored_key < board_key:
+        return mirrored_key, True
+    return board_key, False
+
+
+def stored_move(move: Optional[int], mirrored: bool) -> Optional[int]:
+    """
+    Returns the move as stored under the canonical key
+    """
+    return mirror_move(move) if mirrored and move is not None else move
+
+
 def other_player(player: BoardPiece) -> BoardPiece:
     if player == BoardPiece(1):
         return BoardPiece(2)
@@ -0,0 +1,335 @@
+from typing import Optional, Tuple, List, Set
+import numpy as np
+from agents.common import BoardPiece, SavedState, BitBoard, as_bitboard, COLS
+from agents.agents_montecarlo.monte_carlo import ROLLOUTS, MAX_NODES, EVICTION_DEPTH, EVICTION_RATIO, UCB_C, \
+    SearchBudget, bitboard_rollouts, evaluate_move, other_player
+import math
+import random
+
+CAPACITY = 1024  # node slots allocated by a new tree, the arrays double whenever they are full
+
+# name, dtype and value of an empty slot of every array of the tree
+FIELDS = (
+    ('visits', np.int32, 0),
+    ('wins', np.int32, 0),
+    ('value', np.int32, 0),
+    ('parent', np.int32, -1),
+    ('move', np.int8, -1),  # -1 for a slot without a node
+    ('first_child', np.int32, -1),  # first slot of the block of children, -1 before the first expansion
+    ('children', np.int8, 0),  # number of nodes in the block of children
+    ('explored', np.bool_, False),
+)
+
+
+class ArrayTree:
+    """
+    A class used to represent the search tree as a struct of arrays, an alternative to Tree and Node.
+    A node is an index into preallocated arrays, which grow geometrically. The first expansion of a node
+    allocates a block of COLS slots for its children, the child of column col is the slot first_child + col.
+    No board is stored per node, the board of a node is rebuilt from the moves on its path from the root.
+    The statistics of a node are those of Node: wins of the new node count the wins of the player that made
+    its move, like backpropagation.
+
+    Attributes:
+        board: BitBoard the board at the root
+        player: BoardPiece the player on turn at the root
+        size: int number of slots in use, root and blocks of children
+        nodes: int number of nodes, the root included
+        visits, wins, value, parent, move, first_child, children, explored: np.ndarray one entry per slot
+        evictions: int number of subtrees removed by evict
+        evicted_nodes: int number of nodes removed by evict
+        peak_nodes: int largest number of nodes seen by array_mcts or evict
+
+    Methods:
+        expand, path, bitboard, subtree, evict, nbytes
+    """
+
+    def __init__(self, board: BitBoard, player: BoardPiece, capacity: int = CAPACITY):
+        """
+        Initializes the tree with the root at index 0
+        Parameters:
+            board: board at the root, not changed
+            player: the player on turn at the root
+            capacity: number of slots allocated at first
+        """
+        self.board = board.copy()
+        self.player = player
+        for name, dtype, empty in FIELDS:
+            setattr(self, name, np.full(capacity, empty, dtype=dtype))
+        self.size = 1
+        self.nodes = 1
+        self.evictions = 0
+        self.evicted_nodes = 0
+        self.peak_nodes = 1
+
+    def _grow(self, size: int):
+        """
+        Doubles the arrays until `size` slots fit
+        Parameters:
+            size: number of slots needed
+        """
+        capacity = len(self.visits)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, dtype, empty in FIELDS:
+            array = np.full(capacity, empty, dtype=dtype)
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+
+    def expand(self, index: int, col: int) -> int:
+        """
+        Creates the child of the node for the move `col` and returns its index
+        Parameters:
+            index: node to be expanded
+            col: column of the move of the child
+        """
+        first = int(self.first_child[index])
+        if first < 0:
+            self._grow(self.size + COLS)
+            first = self.size
+            self.first_child[index] = first
+            self.size += COLS
+        child = first + col
+        self.move[child] = col
+        self.parent[child] = index
+        self.children[index] += 1
+        self.nodes += 1
+        return child
+
+    def path(self, index: int) -> List[int]:
+        """
+        Returns the moves from the root to the node
+        Parameters:
+            index: node
+        """
+        moves = []
+        while index > 0:
+            moves.append(int(self.move[index]))
+            index = int(self.parent[index])
+        return moves[::-1]
+
+    def bitboard(self, index: int) -> Tuple[BitBoard, BoardPiece]:
+        """
+        Returns the board of the node rebuilt from its path and the player on turn
+        Parameters:
+            index: node
+        """
+        bitboard = self.board.copy()
+        player = self.player
+        for col in self.path(index):
+            bitboard.play(col, player)
+            player = other_player(player)
+        return bitboard, player
+
+    def subtree(self, index: int, collapsed: Optional[Set[int]] = None) -> 'ArrayTree':
+        """
+        Returns a compact copy of the subtree of the node, with the node as root
+        Parameters:
+            index: root of the subtree
+            collapsed: nodes copied without their descendants, as leaves that were never expanded
+        """
+        bitboard, player = self.bitboard(index)
+        tree = ArrayTree(bitboard, player, max(CAPACITY, self.size))
+        for name, _, _ in FIELDS:
+            getattr(tree, name)[0] = getattr(self, name)[index]
+        tree.parent[0] = -1
+        tree.move[0] = -1
+        tree.first_child[0] = -1
+        stack = [(index, 0)]
+        while stack:
+            old, new = stack.pop()
+            first = int(self.first_child[old])
+            if collapsed is not None and old in collapsed:
+                tree.children[new] = 0
+                tree.explored[new] = False  # its moves can be tried again
+                continue
+            if first < 0:
+                continue
+            block = tree.size
+            tree.first_child[new] = block
+            tree.size += COLS
+            for name, _, _ in FIELDS:
+                getattr(tree, name)[block:block + COLS] = getattr(self, name)[first:first + COLS]
+            tree.first_child[block:block + COLS] = -1
+            for col in range(COLS):
+                if self.move[first + col] >= 0:
+                    tree.parent[block + col] = new
+                    tree.nodes += 1
+                    stack.append((first + col, block + col))
+        return tree
+
+    def evict(self, max_nodes: int) -> int:
+        """
+        Shrinks the tree to EVICTION_RATIO of the node budget like monte_carlo.evict: the least visited nodes
+        at least EVICTION_DEPTH moves below the root lose their descendants, then the tree is compacted
+        Parameters:
+            max_nodes: node budget of the tree
+        """
+        self.peak_nodes = max(self.peak_nodes, self.nodes)
+        excess = self.nodes - int(max_nodes * EVICTION_RATIO)
+        # a parent is always stored before its children, one pass in index order finds the depths
+        # and one in reverse order the sizes of the subtrees
+        used = np.flatnonzero(self.move[:self.size] >= 0).tolist()
+        parent = self.parent.tolist()
+        depth = {0: 0}
+        for index in used:
+            depth[index] = depth[parent[index]] + 1
+        descendants = dict.fromkeys(depth, 0)
+        for index in reversed(used):
+            descendants[parent[index]] += descendants[index] + 1
+        candidates = [index for index in used if depth[index] >= EVICTION_DEPTH and descendants[index]]
+        candidates.sort(key=lambda index: self.visits[index])
+
+        collapsed = set()
+        removed = 0
+        for index in candidates:
+            if removed >= excess:
+                break
+            ancestors = []
+            ancestor = index
+            while ancestor > 0 and ancestor not in collapsed:
+                ancestor = parent[ancestor]
+                ancestors.append(ancestor)
+            if ancestor in collapsed:
+                continue  # the node was removed with a subtree
+            count = descendants[index]
+            for ancestor in ancestors:
+                descendants[ancestor] -= count
+            removed += count
+            collapsed.add(index)
+        if not collapsed:
+            return 0
+        tree = self.subtree(0, collapsed)
+        for name, _, _ in FIELDS:
+            setattr(self, name, getattr(tree, name))
+        self.size, self.nodes = tree.size, tree.nodes
+        self.evictions += len(collapsed)
+        self.evicted_nodes += removed
+        return removed
+
+    def nbytes(self) -> int:
+        """
+        Returns the bytes of the arrays, the unused capacity included
+        Parameters: None
+        """
+        return sum(getattr(self, name).nbytes for name, _, _ in FIELDS)
+
+
+def array_mcts(tree: ArrayTree, period: Optional[float] = None, rollouts: Optional[int] = None,
+               max_nodes: Optional[int] = MAX_NODES, max_iterations: Optional[int] = None,
+               max_rollouts: Optional[int] = None, seed: Optional[int] = None) -> int:
+    """
+    Monte Carlo tree search on an ArrayTree executing until its budget is spent, the same algorithm as MCTS:
+    UCB1 descent, one new node per iteration with a random untried move, `rollouts` bitboard rollouts
+    and backpropagation of the results. The board is rebuilt along the descent.
+    Arguments:
+        tree: the tree, extended in place
+        period: in sec; time of the search, PERIOD_OF_TIME when no budget is provided
+        rollouts: random games per simulated node, ROLLOUTS when not provided
+        max_nodes: node budget of the tree, cold subtrees are evicted when it is reached; no limit when None
+        max_iterations: number of iterations, see MCTS
+        max_rollouts: number of random games, see MCTS
+        seed: seed of the random moves of the search, the random module is used when None
+    Return:
+        int: return the best move, the child of the root with the highest value and then the most visits
+    """
+    if rollouts is None:
+        rollouts = ROLLOUTS
+    budget = SearchBudget(period, max_iterations, max_rollouts)
+    rng = random.Random(seed) if seed is not None else random
+
+    while True:
+        # selection
+        bitboard = tree.board.copy()
+        player = tree.player
+        node = 0
+        while True:
+            legal = [col for col in range(COLS) if bitboard.can_play(col)]
+            if tree.children[node] < len(legal):
+                break
+            first = int(tree.first_child[node])
+            block = slice(first, first + COLS)
+            candidates = (tree.move[block] >= 0) & ~tree.explored[block]
+            if not candidates.any():
+                break
+            visits = np.maximum(tree.visits[block], 1)
+            scores = tree.wins[block] / visits + UCB_C * np.sqrt(math.log(tree.visits[node]) / visits)
+            col = int(np.argmax(np.where(candidates, scores, -np.inf)))
+            bitboard.play(col, player)
+            player = other_player(player)
+            node = first + col
+        if tree.children[node] == len(legal):
+            if node == 0:
+                break  # every node was explored
+            tree.explored[node] = True  # every move of the node was tried, it is not selected again
+            if budget.spent(0):
+                break
+            continue
+
+        # expansion
+        first = int(tree.first_child[node])
+        col = rng.choice([col for col in legal if first < 0 or tree.move[first + col] < 0])
+        child = tree.expand(node, col)
+        bitboard.play(col, player)
+        tree.value[child] = evaluate_move(bitboard.pieces[player - 1], bitboard.pieces[2 - player],
+                                          1 << (bitboard.heights[col] - 1))
+
+        # simulation, from the view of the player on turn after the move
+        opponent = other_player(player)
+        if bitboard.is_win(player):
+            wins, draws, losses = 0, 0, rollouts  # the move won, every rollout is lost by the player on turn
+        elif bitboard.is_win(opponent):
+            wins, draws, losses = rollouts, 0, 0  # the node is below a position that was already won
+        else:
+            wins, draws, losses = bitboard_rollouts(bitboard, opponent, rollouts, rng)
+
+        # backpropagation, the same counts as backpropagation_batch
+        credit = [losses, wins]
+        tree.visits[child] += rollouts
+        tree.wins[child] += losses
+        node, depth = child, 1
+        while node > 0:
+            node = int(tree.parent[node])
+            tree.visits[node] += rollouts
+            tree.wins[node] += credit[depth % 2]
+            depth += 1
+        if max_nodes is not None and tree.nodes >= max_nodes:
+            tree.evict(max_nodes)
+        if budget.spent(rollouts):
+            break
+    tree.peak_nodes = max(tree.peak_nodes, tree.nodes)
+
+    # ties of the value are frequent early in the game, they are broken by the visits
+    first = int(tree.first_child[0])
+    moves = [col for col in range(COLS) if first >= 0 and tree.move[first + col] >= 0]
+    return max(moves, key=lambda col: (tree.value[first + col], tree.visits[first + col]))
+
+
+def reuse_array_tree(saved_state: Optional[SavedState], board: BitBoard, player: BoardPiece) -> ArrayTree:
+    """
+    Like reuse_tree for an ArrayTree: returns the subtree of the board after the move of the agent and the reply
+    of the opponent, or a new tree
+    Arguments:
+        saved_state: state returned with the previous move or None
+        board: the board
+        player: the player on turn
+    Return:
+        ArrayTree: tree with the board at the root
+    """
+    if saved_state is not None and isinstance(saved_state.computational_result, ArrayTree):
+        previous = saved_state.computational_result
+        if previous.player == player and previous.board.pieces == board.pieces:
+            return previous
+        if previous.player == player and previous.board.moves + 2 == board.moves:
+            first = int(previous.first_child[0])
+            for col in range(COLS):
+                child = first + col
+                if first < 0 or previous.move[child] < 0 or previous.first_child[child] < 0:
+                    continue
+                for reply in range(COLS):
+                    grandchild = int(previous.first_child[child]) + reply
+                    if previous.move[grandchild] >= 0 and previous.bitboard(grandchild)[0].pieces == board.pieces:
+                        return previous.subtree(grandchild)
+    return ArrayTree(as_bitboard(board), player)
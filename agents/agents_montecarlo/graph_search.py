@@ -0,0 +1,240 @@
+from typing import Optional
+from agents.common import BoardPiece, SavedState, BitBoard, as_bitboard, ROWS, COLS
+from agents.agents_montecarlo.monte_carlo import ROLLOUTS, MAX_NODES, EVICTION_RATIO, UCB_C, SearchBudget, \
+    bitboard_rollouts, evaluate_move, other_player
+import math
+import random
+
+
+class GraphNode:
+    """
+    A class used to represent a position of the search graph, shared by every move order that reaches it.
+    The statistics belong to the position, the visits of the moves out of it to the edges: the exploration
+    term of a move uses the visits of its edge, the exploitation term the win rate of the position it leads to.
+
+    Attributes:
+        moves: int number of pieces on the board
+        visits: int number of simulated games through the position
+        wins: int games won by the player that made the last move of the position
+        result: Optional[int] 1 when that player won with it, 0 for a full board, None when the game goes on
+        edges: Dict[int, List[int]] column -> visits of the move, value of the move (see evaluate),
+               key of the position after the move
+
+    Methods: None
+    """
+
+    def __init__(self, moves: int, result: Optional[int] = None):
+        """
+        Node initialization
+        Parameters:
+            moves: number of pieces on the board
+            result: 1 when the last move won, 0 for a full board, None when the game goes on
+        """
+        self.moves = moves
+        self.visits = 0
+        self.wins = 0
+        self.result = result
+        self.edges = {}
+
+    def __repr__(self):
+        """
+        Represents the wins, visits and moves of the node as strings
+        Parameters: None
+        """
+        return f' Wins: {self.wins} Visits: {self.visits} Moves: {sorted(self.edges)}'
+
+
+class Graph:
+    """
+    A class used to represent the search graph: a table of the positions, keyed by position_key
+
+    Attributes:
+        board: BitBoard the board at the root
+        player: BoardPiece the player on turn at the root
+        root: int key of the root
+        table: Dict[int, GraphNode] every position of the graph
+        transpositions: int number of new moves that led to a position already in the table
+        evictions: int number of times evict shrank the table
+        evicted_nodes: int number of positions removed by evict
+        peak_nodes: int largest number of positions seen by graph_mcts or evict
+
+    Methods:
+        set_root, evict
+    """
+
+    def __init__(self, board: BitBoard, player: BoardPiece):
+        """
+        Initializes the graph with the root position
+        Parameters:
+            board: board at the root, not changed
+            player: the player on turn at the root
+        """
+        self.table = {}
+        self.transpositions = 0
+        self.evictions = 0
+        self.evicted_nodes = 0
+        self.peak_nodes = 0
+        self.set_root(board, player)
+
+    def set_root(self, board: BitBoard, player: BoardPiece):
+        """
+        Moves the root to another position and keeps the table, the statistics of positions that can
+        still be reached are reused by the next search
+        Parameters:
+            board: board at the root, not changed
+            player: the player on turn at the root
+        """
+        self.board = board.copy()
+        self.player = player
+        self.root = position_key(board, player)
+        if self.root not in self.table:
+            self.table[self.root] = GraphNode(board.moves)
+
+    def evict(self, max_nodes: int) -> int:
+        """
+        Shrinks the table to EVICTION_RATIO of the node budget. Positions with as many or fewer pieces than
+        the root can not be reached any more and go first, then the least visited positions. The edges to a removed
+        position keep their visits, the position is created again when the search comes back to it.
+        Parameters:
+            max_nodes: node budget of the graph
+        """
+        self.peak_nodes = max(self.peak_nodes, len(self.table))
+        moves = self.table[self.root].moves
+        keep = int(max_nodes * EVICTION_RATIO)
+        removed = [key for key, node in self.table.items() if node.moves <= moves and key != self.root]
+        if len(self.table) - len(removed) > keep:
+            reachable = sorted((node.visits, key) for key, node in self.table.items()
+                               if node.moves > moves)
+            removed += [key for _, key in reachable[:len(self.table) - len(removed) - keep]]
+        for key in removed:
+            del self.table[key]
+        self.evictions += 1
+        self.evicted_nodes += len(removed)
+        return len(removed)
+
+
+def position_key(board: BitBoard, player: BoardPiece) -> int:
+    """
+    Returns the key of a position in the table, the pieces of the player on turn plus all pieces:
+    unique because the mask has one more bit per column than pieces, see solver.Solver
+    Arguments:
+        board: the board
+        player: the player on turn
+    Return:
+        int: key of the position
+    """
+    return board.pieces[player - 1] + board.mask
+
+
+def graph_mcts(graph: Graph, period: Optional[float] = None, rollouts: Optional[int] = None,
+               max_nodes: Optional[int] = MAX_NODES, max_iterations: Optional[int] = None,
+               max_rollouts: Optional[int] = None, seed: Optional[int] = None) -> int:
+    """
+    Monte Carlo graph search executing until its budget is spent. Like MCTS, every iteration descends with UCB1,
+    adds one new position with a random untried move and simulates it with `rollouts` bitboard rollouts. A new
+    move that leads to a position already in the table shares its statistics; the descent goes on
+    through it, so the rollouts are spent only on new positions. The results are backpropagated along
+    the path of the iteration, which updates shared positions once and every edge of the path once.
+    Arguments:
+        graph: the graph, extended in place
+        period: in sec; time of the search, PERIOD_OF_TIME when no budget is provided
+        rollouts: random games per simulated position, ROLLOUTS when not provided
+        max_nodes: node budget of the graph, see Graph.evict; no limit when None
+        max_iterations: number of iterations, see MCTS
+        max_rollouts: number of random games, see MCTS
+        seed: seed of the random moves of the search, the random module is used when None
+    Return:
+        int: return the best move, the move of the root with the highest value and then the most visits
+    """
+    if rollouts is None:
+        rollouts = ROLLOUTS
+    budget = SearchBudget(period, max_iterations, max_rollouts)
+    rng = random.Random(seed) if seed is not None else random
+    table = graph.table
+
+    while True:
+        bitboard = graph.board.copy()
+        player = graph.player
+        node = table[graph.root]
+        path = []  # node and column of every move of the iteration
+        while True:
+            if node.result is not None:
+                # the game is over, its result is known without rollouts
+                wins, losses = (rollouts, 0) if node.result else (0, 0)
+                break
+            legal = [col for col in range(COLS) if bitboard.can_play(col)]
+            if not legal:
+                wins, losses = 0, 0  # the root is a full board
+                break
+            untried = [col for col in legal if col not in node.edges]
+            if untried:
+                col = rng.choice(untried)
+                bitboard.play(col, player)
+                key = position_key(bitboard, other_player(player))
+                node.edges[col] = [0, evaluate_move(bitboard.pieces[player - 1], bitboard.pieces[2 - player],
+                                                    1 << (bitboard.heights[col] - 1)), key]
+                if key in table:
+                    graph.transpositions += 1
+            else:
+                log_visits = math.log(node.visits)
+                best_score = -math.inf
+                for move, (visits, _, key) in node.edges.items():
+                    child = table.get(key)
+                    if child is None or not child.visits:
+                        score = math.inf  # evicted, simulated again
+                    else:
+                        score = child.wins / child.visits + UCB_C * math.sqrt(log_visits / max(visits, 1))
+                    if score > best_score:
+                        best_score, col = score, move
+                bitboard.play(col, player)
+                key = node.edges[col][2]
+            path.append((node, col))
+            child = table.get(key)
+            if child is not None and child.visits:
+                node = child
+                player = other_player(player)
+                continue
+            if child is None:
+                result = 1 if bitboard.is_win(player) else 0 if bitboard.moves == ROWS * COLS else None
+                child = table[key] = GraphNode(bitboard.moves, result)
+            node = child
+            if node.result is not None:
+                wins, losses = (rollouts, 0) if node.result else (0, 0)
+            else:
+                on_turn_wins, _, on_turn_losses = bitboard_rollouts(bitboard, other_player(player), rollouts, rng)
+                wins, losses = on_turn_losses, on_turn_wins
+            break
+
+        # backpropagation along the path, wins and losses of the player that made the last move
+        node.visits += rollouts
+        node.wins += wins
+        for parent, col in reversed(path):
+            wins, losses = losses, wins
+            parent.edges[col][0] += rollouts
+            parent.visits += rollouts
+            parent.wins += wins
+        if max_nodes is not None and len(table) >= max_nodes:
+            graph.evict(max_nodes)
+        if budget.spent(rollouts):
+            break
+    graph.peak_nodes = max(graph.peak_nodes, len(table))
+
+    edges = table[graph.root].edges
+    return max(edges, key=lambda col: (edges[col][1], edges[col][0]))
+
+
+def reuse_graph(saved_state: Optional[SavedState], board: BitBoard, player: BoardPiece) -> Graph:
+    """
+    Returns the graph of the previous search with the board at the root, or a new graph
+    Arguments:
+        saved_state: state returned with the previous move or None
+        board: the board
+        player: the player on turn
+    Return:
+        Graph: graph with the board at the root
+    """
+    if saved_state is not None and isinstance(saved_state.computational_result, Graph):
+        graph = saved_state.computational_result
+        graph.set_root(board, player)
+        return graph
+    return Graph(as_bitboard(board), player)
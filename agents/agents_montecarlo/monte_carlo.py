@@ -1,6 +1,11 @@
-from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Union, Dict, List
 import numpy as np
-from agents.common import check_end_state, apply_player_action, GameState, BoardPiece, SavedState, PlayerAction
+from agents.common import apply_player_action, BoardPiece, SavedState, PlayerAction, BitBoard, \
+    as_array, as_bitboard, encode_bitboards, bit_connected_four, ROWS, COLS, BIT_HEIGHT
+from agents.threats import Threats
+from agents.opening_book import book_move
+import math
 import random
 import time
 
@@ -9,6 +14,16 @@ DRAW = 0
 LOST = -1
 FULL = -2  # the board is full
 PERIOD_OF_TIME = 3  # in sec; set the timer
+ROLLOUTS = 32  # random games per simulated node
+UCB_C = math.sqrt(2)  # exploration constant of upper_confidence_bound
+WORKERS = 1  # number of processes searching from the root in parallel, 1 searches in the calling process
+MAX_NODES = 100000  # node budget of the tree, about 45 MB of Node objects, None for no limit
+EVICTION_DEPTH = 3  # only subtrees of nodes at least this many moves below the root are evicted
+EVICTION_RATIO = 0.75  # eviction shrinks the tree to this fraction of the node budget
+TREE_BACKEND = 'object'  # storage of the search tree, see TREE_BACKENDS
+# Tree of Node objects, array_tree.ArrayTree, a struct of arrays, or graph_search.Graph, a table of positions
+# shared by all move orders that reach them
+TREE_BACKENDS = ('object', 'array', 'graph')
 
 
 class Node:
@@ -66,6 +81,11 @@ class Tree:
 
     Attributes
         root: node the root node of the tree
+        nodes: list all nodes of the tree except the root
+        evictions: int number of subtrees removed by evict
+        evicted_nodes: int number of nodes removed by evict
+        peak_nodes: int largest number of nodes seen by MCTS or evict
+        iterations: int number of iterations of all searches of MCTS in the tree
     Methods: None
     """
     def __init__(self, root: Node):
@@ -76,6 +96,10 @@ class Tree:
         """
         self.nodes = []
         self.root = root
+        self.evictions = 0
+        self.evicted_nodes = 0
+        self.peak_nodes = 0
+        self.iterations = 0
 
     def add_to_nodes(self, node: Node):
         """
@@ -86,53 +110,334 @@ class Tree:
         self.nodes.append(node)
 
 
-def generate_move_montecarlo(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]) -> Tuple[
-    PlayerAction, Optional[SavedState]]:
+class SearchBudget:
+    """
+    A class used to represent the budget of one search: a time, a number of iterations and a number of
+    random games. The search stops at the first limit that is reached.
+
+    Attributes:
+        period: Optional[float] in sec; time of the search, no time limit when None
+        max_iterations: Optional[int] number of iterations, no limit when None
+        max_rollouts: Optional[int] number of random games, no limit when None
+        iterations: int iterations done so far
+        rollouts: int random games played so far
+
+    Methods:
+        spent
+    """
+
+    def __init__(self, period: Optional[float] = None, max_iterations: Optional[int] = None,
+                 max_rollouts: Optional[int] = None):
+        """
+        Starts the timer, PERIOD_OF_TIME is the budget when none is provided
+        Parameters:
+            period: in sec; time of the search
+            max_iterations: number of iterations
+            max_rollouts: number of random games
+        """
+        if period is None and max_iterations is None and max_rollouts is None:
+            period = PERIOD_OF_TIME
+        self.period = period
+        self.max_iterations = max_iterations
+        self.max_rollouts = max_rollouts
+        self.iterations = 0
+        self.rollouts = 0
+        self.tic = time.time()
+
+    def spent(self, rollouts: int) -> bool:
+        """
+        Counts one iteration and its random games and returns True when the search has to stop
+        Parameters:
+            rollouts: random games played by the iteration
+        """
+        self.iterations += 1
+        self.rollouts += rollouts
+        return (self.max_iterations is not None and self.iterations >= self.max_iterations) \
+            or (self.max_rollouts is not None and self.rollouts >= self.max_rollouts) \
+            or (self.period is not None and time.time() - self.tic > self.period)
+
+
+def generate_move_montecarlo(board: Union[np.ndarray, BitBoard], player: BoardPiece, saved_state: Optional[SavedState],
+                             use_book: bool = False, workers: Optional[int] = None, period: Optional[float] = None,
+                             backend: Optional[str] = None, max_nodes: Optional[int] = MAX_NODES,
+                             max_iterations: Optional[int] = None, max_rollouts: Optional[int] = None,
+                             seed: Optional[int] = None) -> Tuple[PlayerAction, Optional[SavedState]]:
     """
        Choose a move based on Monte Carlo tree search algorithm
 
        Arguments:
-       board: ndarray representation of the board
+       board: ndarray or BitBoard representation of the board
        player: whether agent plays with X (Player1) or O (Player2)
-       saved_state: computation that it could reuse for future moves
+       saved_state: computation that it could reuse for future moves, the tree of the previous move
+       use_book: True to play the move of the opening book, when the position is in it; no state is returned then
+       workers: number of processes searching in parallel, WORKERS when not provided;
+                with more than one the trees stay in the workers, are not reused and None is returned as state,
+                only the 'object' backend is supported
+       period: in sec; time of the search, PERIOD_OF_TIME when no budget is provided; of every worker
+       backend: storage of the tree, one of TREE_BACKENDS, TREE_BACKEND when not provided
+       max_nodes: node budget of the tree, see evict; no limit when None; of every worker
+       max_iterations: number of iterations of the search, see MCTS; of every worker
+       max_rollouts: number of random games of the search, see MCTS; of every worker
+       seed: seed of the random moves of the search, see MCTS; with several workers the seed of their seeds
 
        Return:
-           Tuple[PlayerAction, SavedState]: returns the column, where the agent will play and agent computations
+           Tuple[PlayerAction, SavedState]: returns the column, where the agent will play and the search tree
        """
-    root = Node(board_state=board, player=player)
-    tree = Tree(root)
-    move = MCTS(root, board, tree)
-    return move, saved_state
-
-
-def MCTS(root: Node, board: np.ndarray, tree: Tree) -> int:
-    """
-    Monte Carlo tree search algorithm executing for fixed amount of time
+    if backend is None:
+        backend = TREE_BACKEND
+    if backend not in TREE_BACKENDS:
+        raise ValueError(f'unknown tree backend {backend!r}, expected one of {TREE_BACKENDS}')
+    if use_book:
+        move = book_move(board, player)
+        if move is not None:
+            return move, None  # the state of the search does not belong to the book position
+    if workers is None:
+        workers = WORKERS
+    if workers > 1 and backend != 'object':
+        raise ValueError(f'the {backend!r} backend does not support workers, only the \'object\' backend does')
+    if backend == 'array':
+        from agents.agents_montecarlo.array_tree import array_mcts, reuse_array_tree
+        array_tree = reuse_array_tree(saved_state, as_bitboard(board), player)
+        move = array_mcts(array_tree, period, max_nodes=max_nodes, max_iterations=max_iterations,
+                          max_rollouts=max_rollouts, seed=seed)
+        return PlayerAction(move), SavedState(array_tree)
+    if backend == 'graph':
+        from agents.agents_montecarlo.graph_search import graph_mcts, reuse_graph
+        graph = reuse_graph(saved_state, as_bitboard(board), player)
+        move = graph_mcts(graph, period, max_nodes=max_nodes, max_iterations=max_iterations,
+                          max_rollouts=max_rollouts, seed=seed)
+        return PlayerAction(move), SavedState(graph)
+    board = as_array(board).copy()  # kept at the root of the saved tree
+    if workers > 1:
+        statistics, _ = root_parallel_search(board, player, workers, period, seed, max_nodes=max_nodes,
+                                             max_iterations=max_iterations, max_rollouts=max_rollouts)
+        return PlayerAction(best_parallel_move(statistics)), None
+    tree = reuse_tree(saved_state, board, player)
+    move = MCTS(tree.root, board, tree, period, max_nodes=max_nodes, max_iterations=max_iterations,
+                max_rollouts=max_rollouts, seed=seed)
+    return move, SavedState(tree)
+
+
+def reuse_tree(saved_state: Optional[SavedState], board: np.ndarray, player: BoardPiece) -> Tree:
+    """
+    Returns the subtree of the previous search for the board after the move of the agent and the reply
+    of the opponent, with the statistics gathered so far. The rest of the tree is discarded.
+    A new tree is returned when there is no previous tree or the position was not reached in it.
+    Arguments:
+        saved_state: state returned with the previous move or None
+        board: ndarray representation of the board
+        player: the player on turn
+    Return:
+        Tree: tree with the board at the root
+    """
+    if saved_state is not None and isinstance(saved_state.computational_result, Tree):
+        previous = saved_state.computational_result
+        if previous.root.player == player and np.array_equal(previous.root.board_state, board):
+            return previous  # same position again
+        for child in previous.root.children:
+            for grandchild in child.children:
+                if grandchild.board_state is not None and grandchild.player == player \
+                        and np.array_equal(grandchild.board_state, board):
+                    grandchild.parent = None
+                    tree = Tree(grandchild)
+                    stack = list(grandchild.children)
+                    while stack:
+                        node = stack.pop()
+                        tree.add_to_nodes(node)
+                        stack.extend(node.children)
+                    return tree
+    return Tree(Node(board_state=board, player=player))
+
+
+def MCTS(root: Node, board: np.ndarray, tree: Tree, period: Optional[float] = None, rollouts: Optional[int] = None,
+         max_nodes: Optional[int] = MAX_NODES, max_iterations: Optional[int] = None,
+         max_rollouts: Optional[int] = None, seed: Optional[int] = None) -> int:
+    """
+    Monte Carlo tree search algorithm executing until its budget is spent: a time, a number of iterations
+    or a number of random games, whichever runs out first. Without a budget it runs for PERIOD_OF_TIME.
+    With a seed and without a time budget the search does not depend on the machine: the same tree is
+    built for the same position every time.
     Arguments:
         root: root of the tree, starting node
         board: ndarray representation of the board
         tree: contains all the nodes
+        period: in sec; time of the search, PERIOD_OF_TIME when no budget is provided
+        rollouts: random games per simulated node, ROLLOUTS when not provided
+        max_nodes: node budget of the tree, cold subtrees are evicted when it is reached; no limit when None
+        max_iterations: number of iterations, each expands and simulates at most one node
+        max_rollouts: number of random games, the last iteration may go beyond it
+        seed: seed of the random moves of the search, the random module is used when None
 
     Return:
         int: return the best move
     """
-    tic = time.time()  # start timer
+    if rollouts is None:
+        rollouts = ROLLOUTS
+    budget = SearchBudget(period, max_iterations, max_rollouts)
+    rng = random.Random(seed) if seed is not None else None
     root.board_state = board
 
-    # execute algorithm until time is out
+    # execute algorithm until the budget is spent
     while True:
         best_node = selection(root, tree)
         new_node, updated_tree = expansion(best_node, tree)
-        outcome = simulation(new_node, new_node.parent.board_state.copy())
-        if outcome != FULL:
-            root, final_tree = backpropagation(new_node, outcome, updated_tree)
-        if time.time() - tic > PERIOD_OF_TIME: break  # out of time
+        if rollouts > 1:
+            outcome = simulation_batch(new_node, new_node.parent.board_state.copy(), rollouts, rng)
+            if outcome is not None:
+                root, final_tree = backpropagation_batch(new_node, outcome, updated_tree)
+            else:
+                outcome = FULL
+        else:
+            outcome = simulation(new_node, new_node.parent.board_state.copy(), rng)
+            if outcome != FULL:
+                root, final_tree = backpropagation(new_node, outcome, updated_tree)
+        if outcome == FULL and new_node.parent is not root:
+            new_node.parent.explored = True  # every move of the parent was tried, it is not selected again
+        if max_nodes is not None and len(tree.nodes) >= max_nodes:
+            evict(tree, max_nodes)
+        if budget.spent(0 if outcome == FULL else rollouts): break
+    tree.peak_nodes = max(tree.peak_nodes, len(tree.nodes))
+    tree.iterations += budget.iterations
 
     # find child with best move based on the value
     win_rates = {child.move: child.value for child in root.children}
     return max(win_rates, key=win_rates.get)
 
 
+def evict(tree: Tree, max_nodes: int) -> int:
+    """
+    Shrinks the tree to EVICTION_RATIO of the node budget. The least visited nodes at least EVICTION_DEPTH moves
+    below the root lose all their descendants and become leaves again. Their statistics already sum up those
+    of the subtree, so nothing is lost above them, and a collapsed node is expanded again when the search
+    comes back. Children have fewer visits than their parents, so the coldest subtrees go first.
+    Arguments:
+        tree: contains all the nodes, changed in place
+        max_nodes: node budget of the tree
+    Return:
+        int: number of nodes removed
+    """
+    tree.peak_nodes = max(tree.peak_nodes, len(tree.nodes))
+    excess = len(tree.nodes) - int(max_nodes * EVICTION_RATIO)
+    candidates = []
+    stack = [(tree.root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node.children and depth >= EVICTION_DEPTH:
+            candidates.append(node)
+        stack.extend((child, depth + 1) for child in node.children)
+    candidates.sort(key=lambda node: node.simulations)
+
+    removed = set()
+    for node in candidates:
+        if len(removed) >= excess:
+            break
+        if id(node) in removed:
+            continue
+        stack = node.children
+        node.children = []
+        node.explored = False  # its moves can be tried again
+        while stack:
+            child = stack.pop()
+            removed.add(id(child))
+            stack.extend(child.children)
+            child.children = []
+            child.parent = None  # no reference cycles are left for the garbage collector
+        tree.evictions += 1
+    if removed:
+        tree.nodes = [node for node in tree.nodes if id(node) not in removed]
+        tree.evicted_nodes += len(removed)
+    return len(removed)
+
+
+def root_parallel_search(board: np.ndarray, player: BoardPiece, workers: int, period: Optional[float] = None,
+                         seed: Optional[int] = None, max_nodes: Optional[int] = MAX_NODES,
+                         max_iterations: Optional[int] = None, max_rollouts: Optional[int] = None) \
+        -> Tuple[Dict[int, List[int]], int]:
+    """
+    Root parallelisation, every worker process searches its own tree from the root with another seed.
+    The visits and wins of the children of the roots are summed.
+    Arguments:
+        board: ndarray representation of the board
+        player: the player on turn
+        workers: number of processes
+        period: in sec; time of every search, PERIOD_OF_TIME when no budget is provided
+        seed: seed of the seeds of the workers, random when None
+        max_nodes: node budget of every tree, see evict; no limit when None
+        max_iterations: number of iterations of every search, see MCTS
+        max_rollouts: number of random games of every search, see MCTS
+    Return:
+        Tuple[Dict[int, List[int]], int]: move -> summed simulations and wins, number of iterations of all workers,
+        not of random games
+    """
+    seeds = random.Random(seed).sample(range(2 ** 31), workers)
+    pool = get_pool(workers)
+    futures = [pool.submit(search_worker, board, player, worker_seed, period, max_nodes, max_iterations,
+                           max_rollouts) for worker_seed in seeds]
+    statistics = {}
+    iterations = 0
+    for future in futures:
+        children, worker_iterations = future.result()
+        iterations += worker_iterations
+        for move, (child_simulations, wins) in children.items():
+            total = statistics.setdefault(move, [0, 0])
+            total[0] += child_simulations
+            total[1] += wins
+    return statistics, iterations
+
+
+def search_worker(board: np.ndarray, player: BoardPiece, seed: int, period: Optional[float] = None,
+                  max_nodes: Optional[int] = MAX_NODES, max_iterations: Optional[int] = None,
+                  max_rollouts: Optional[int] = None) -> Tuple[Dict[int, Tuple[int, int]], int]:
+    """
+    Runs one search in a worker process
+    Arguments:
+        board: ndarray representation of the board
+        player: the player on turn
+        seed: seed of the rollouts
+        period: in sec; time of the search, PERIOD_OF_TIME when no budget is provided
+        max_nodes: node budget of the tree, see evict; no limit when None
+        max_iterations: number of iterations of the search, see MCTS
+        max_rollouts: number of random games of the search, see MCTS
+    Return:
+        Tuple[Dict[int, Tuple[int, int]], int]: move -> simulations and wins of the children of the root,
+        number of iterations of the search
+    """
+    root = Node(board_state=board, player=player)
+    tree = Tree(root)
+    MCTS(root, board, tree, period, max_nodes=max_nodes, max_iterations=max_iterations,
+         max_rollouts=max_rollouts, seed=seed)
+    children = {child.move: (child.simulations, child.wins) for child in root.children if child.move is not None}
+    return children, tree.iterations
+
+
+def best_parallel_move(statistics: Dict[int, List[int]]) -> int:
+    """
+    Returns the move with most summed visits, the one with more wins among moves with the same number of visits
+    Arguments:
+        statistics: move -> summed simulations and wins
+    """
+    return max(statistics, key=lambda move: tuple(statistics[move]))
+
+
+_pool = None  # process pool of the root parallel search, kept for the next moves
+_pool_workers = 0  # number of processes of _pool
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns a process pool with `workers` processes, the pool of the previous call when it has as many
+    Arguments:
+        workers: number of processes
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
 def upper_confidence_bound(current_node: Node) -> float:
     """
     Upper confidence bound formula
@@ -144,14 +449,14 @@ def upper_confidence_bound(current_node: Node) -> float:
     w = current_node.wins
     s = current_node.simulations
     sp = current_node.parent.simulations
-    c = np.sqrt(2)
 
-    return (w / s) + c * (np.sqrt((np.log(sp)) / s))
+    return (w / s) + UCB_C * (math.sqrt((math.log(sp)) / s))
 
 
 def selection(node: Node, tree: Tree) -> Node:
     """
-    Returns the node that has the highest possibility of winning (UCB1)
+    Descends from the root to the node to be expanded, at every level to the child with the highest UCB1 score.
+    Stops at the first node that has a move without a child, the cost is O(depth x branching).
 
     Arguments:
         node: root node
@@ -159,18 +464,23 @@ def selection(node: Node, tree: Tree) -> Node:
     Returns:
         Node: return the selected node
     """
+    while True:
+        # a node without a board was never simulated, the others are expanded until every move has a child
+        if node.board_state is None or len(node.children) < number_of_moves(node.board_state):
+            return node
+        children = [child for child in node.children if not child.explored]
+        if not children:
+            return node  # no move left
+        node = max(children, key=upper_confidence_bound)
 
-    # first select all 7 children of the root
-    if (node.parent is None) and (len(node.children) < 7):
-        return node
 
-    # finding best child with UCB
-    best_score = {
-        item: upper_confidence_bound(item)
-        for item in tree.nodes
-        if not item.explored
-    }
-    return max(best_score, key=best_score.get)
+def number_of_moves(board: np.ndarray) -> int:
+    """
+    Returns the number of columns that are not full
+    Arguments:
+        board: ndarray representation of the board
+    """
+    return int(np.count_nonzero(board[-1] == 0))
 
 
 def expansion(selected_node: Node, tree: Tree) -> Tuple[Node, Tree]:
@@ -191,56 +501,165 @@ def expansion(selected_node: Node, tree: Tree) -> Tuple[Node, Tree]:
     return new_node, tree
 
 
-def simulation(newly_created_node: Node, board: np.ndarray) -> int:
+def simulation(newly_created_node: Node, board: np.ndarray, rng: Optional[random.Random] = None) -> int:
     """
     Called until the game is finished (win, lost or draw)
     and return the result. When there is no valid move for the node return that the board is full.
     Arguments:
         newly_created_node: the newly created node to be simulated
         board: ndarray representation of the board
+        rng: random generator of the moves, the random module when None
     Return:
         int: 1 for Win, -1 for Lost, 0 for Draw and  -2 for Full when the board is full
         and the newly_created_node can't make a move
     """
+    if not play_node_move(newly_created_node, board, rng):
+        return FULL
+    return rollout(board.copy(), newly_created_node.player, rng)
+
 
+def simulation_batch(newly_created_node: Node, board: np.ndarray, rollouts: int,
+                     rng: Optional[random.Random] = None) -> Optional[Tuple[int, int, int]]:
+    """
+    Like simulation, but plays `rollouts` random games from the node with bitboard_rollouts
+    Arguments:
+        newly_created_node: the newly created node to be simulated
+        board: ndarray representation of the board
+        rollouts: number of random games
+        rng: random generator of the moves, the random module when None
+    Return:
+        Optional[Tuple[int, int, int]]: number of Win, Draw and Lost results as in simulation,
+        None when the board is full and the newly_created_node can't make a move.
+        When the game is over no rollout is played, all results are a win of the player that made the move
+        when it won, a loss when the other player had already won
+    """
+    if not play_node_move(newly_created_node, board, rng):
+        return None
     opponent = other_player(newly_created_node.player)
+    bitboard = BitBoard.from_array(board)
+    if bitboard.is_win(opponent):
+        return rollouts, 0, 0  # the move of the node won
+    if bitboard.is_win(newly_created_node.player):
+        return 0, 0, rollouts  # the node is below a position that was already won
+    wins, draws, losses = bitboard_rollouts(bitboard, newly_created_node.player, rollouts, rng)
+    return losses, draws, wins  # results of the player on turn, the opponent made the move of the node
+
 
-    move = valid_move(board, opponent, newly_created_node)
+def play_node_move(newly_created_node: Node, board: np.ndarray, rng: Optional[random.Random] = None) -> bool:
+    """
+    Chooses the move of the new node, a random move not taken by its siblings, plays it on `board`
+    and sets the move, board and value of the node
+    Arguments:
+        newly_created_node: the newly created node
+        board: ndarray representation of the board of the parent, changed in place
+        rng: random generator of the move, the random module when None
+    Return:
+        bool: False when there is no move left, the node is marked as explored
+    """
+    opponent = other_player(newly_created_node.player)
+
+    move = valid_move(board, opponent, newly_created_node, rng)
     if move is None:
         newly_created_node.explored = True  # this node cant be explored further
-        return FULL
+        return False
 
     # set nodes value, move and board
     newly_created_node.move = move
     board_before = board.copy()
     newly_created_node.board_state = apply_player_action(board, move, opponent, False)
     newly_created_node.value = evaluate(newly_created_node, opponent, board_before)
+    return True
 
-    # start with simulation
-    board_copy = board.copy()
-    on_turn = newly_created_node.player
-
-    while check_end_state(board_copy, opponent, None) == GameState.STILL_PLAYING \
-            and check_end_state(board_copy, newly_created_node.player, None) == GameState.STILL_PLAYING:
-        move = valid_move(board_copy, on_turn, None)
-        if move is None:
-            return DRAW  # no possible moves
 
-        # do moves
-        if on_turn == newly_created_node.player:
-            apply_player_action(board_copy, move, newly_created_node.player)
-            on_turn = opponent
-        else:
-            apply_player_action(board_copy, move, opponent)
-            on_turn = newly_created_node.player
+def rollout(board_copy: np.ndarray, on_turn: BoardPiece, rng: Optional[random.Random] = None) -> int:
+    """
+    Plays random moves until the game is finished, on bitboards with random_playout. When the game is over
+    no move is played, a win is scored for the player that made the last move when it won, the same as simulation_batch
+    Arguments:
+        board_copy: ndarray representation of the board, not changed
+        on_turn: the player that moves first
+        rng: random generator of the moves, the random module when None
+    Return:
+        int: 1 for Win, -1 for Lost and 0 for Draw, a win is a win of the player that made the last move
+    """
+    bitboard = BitBoard.from_array(board_copy)
+    player, opponent = bitboard.pieces[on_turn - 1], bitboard.pieces[2 - on_turn]
+    if bit_connected_four(opponent):
+        return WIN  # the last move won
+    if bit_connected_four(player):
+        return LOST  # the position was already won by the player on turn
+    result = random_playout(player, opponent, bitboard.heights, bitboard.moves, rng)
+    return LOST if result > 0 else WIN if result < 0 else DRAW
 
-        # game is won
-        if check_end_state(board_copy, opponent) == GameState.IS_WIN:
-            return WIN
-        if check_end_state(board_copy, newly_created_node.player) == GameState.IS_WIN:
-            return LOST
 
-    return DRAW
+def bitboard_rollouts(board: Union[np.ndarray, BitBoard], player: BoardPiece, rollouts: int,
+                      rng: Optional[random.Random] = None) -> Tuple[int, int, int]:
+    """
+    Plays `rollouts` random games one after the other on bitboards from a board that is not over,
+    faster than the lockstep batch_rollouts of benchmarks.bench_monte_carlo for batches of less than a few hundred games
+    Arguments:
+        board: ndarray or BitBoard representation of the board
+        player: the player on turn
+        rollouts: number of games
+        rng: random generator of the moves, the random module when None
+    Return:
+        Tuple[int, int, int]: number of games won, drawn and lost by `player`
+    """
+    bitboard = as_bitboard(board)
+    position, opponent = bitboard.pieces[player - 1], bitboard.pieces[2 - player]
+    heights, moves = bitboard.heights, bitboard.moves
+    wins, losses = 0, 0
+    for _ in range(rollouts):
+        result = random_playout(position, opponent, heights, moves, rng)
+        if result > 0:
+            wins += 1
+        elif result < 0:
+            losses += 1
+    return wins, rollouts - wins - losses, losses
+
+
+def random_playout(position: int, opponent: int, heights: List[int], moves: int,
+                   rng: Optional[random.Random] = None) -> int:
+    """
+    Plays one random game on bitboards in the BitBoard layout. The legal columns are kept in a list,
+    a column is removed when it is full, and only the pieces of the player that moved are checked for four.
+    Arguments:
+        position: pieces of the player on turn
+        opponent: pieces of the other player
+        heights: index of the next free bit of every column, not changed
+        moves: number of pieces on the board
+        rng: random generator of the moves, the random module when None
+    Return:
+        int: 1 when the player on turn wins, -1 when the other player wins, 0 for a draw
+    """
+    heights = heights.copy()
+    legal = [col for col in range(COLS) if heights[col] < col * BIT_HEIGHT + ROWS]
+    sign = 1
+    draw = (rng or random).random
+    while moves < ROWS * COLS:
+        index = int(draw() * len(legal))
+        col = legal[index]
+        position |= 1 << heights[col]
+        heights[col] += 1
+        if heights[col] == col * BIT_HEIGHT + ROWS:
+            legal.pop(index)
+        moves += 1
+        # vertical, horizontal and both diagonals
+        m = position & (position >> 1)
+        if m & (m >> 2):
+            return sign
+        m = position & (position >> BIT_HEIGHT)
+        if m & (m >> 2 * BIT_HEIGHT):
+            return sign
+        m = position & (position >> (BIT_HEIGHT - 1))
+        if m & (m >> 2 * (BIT_HEIGHT - 1)):
+            return sign
+        m = position & (position >> (BIT_HEIGHT + 1))
+        if m & (m >> 2 * (BIT_HEIGHT + 1)):
+            return sign
+        position, opponent = opponent, position
+        sign = -sign
+    return 0
 
 
 def evaluate(node: Node, opponent: BoardPiece, board_before: np.ndarray) -> int:
@@ -253,19 +672,41 @@ def evaluate(node: Node, opponent: BoardPiece, board_before: np.ndarray) -> int:
     Return
         int: nodes value after the move
     """
-    pos_opp, m1 = get_position_mask_bitmap(opponent, node.board_state)  # position after the move
-    pos_player, m2 = get_position_mask_bitmap(node.player, board_before)  # other player position before the move
-    pos_player_block, m3 = get_position_mask_bitmap(node.player, node.board_state)  # position after the move
+    # one encoding of the boards after and before the move, the pieces of node.player are the others
+    positions, masks = encode_bitboards(np.stack([node.board_state, board_before])[:, ::-1], opponent)
+    pos_opp, m1 = int(positions[0]), int(masks[0])  # position after the move
+    pos_player, m2 = int(masks[1] ^ positions[1]), int(masks[1])  # other player position before the move
+    pos_player_block, m3 = m1 ^ pos_opp, m1  # position after the move
 
     if connected_four(pos_opp):
         return 200000
     # check after the move if we blocked the other player
-    elif connected_three(pos_player, m2) and not connected_three(pos_player_block, m3):
+    elif number_of_connected(pos_player, m2) >= 3 and number_of_connected(pos_player_block, m3) < 3:
         return 100000
     else:
         return evaluate_board(pos_opp, m1)
 
 
+def evaluate_move(position: int, opponent: int, move: int) -> int:
+    """
+    Return the same value as evaluate for bitboards in the BitBoard layout
+    Arguments:
+        position: pieces of the player that made the move, after the move
+        opponent: pieces of the other player
+        move: bit of the piece of the move
+    Return
+        int: value of the move
+    """
+    mask = position | opponent
+    if bit_connected_four(position):
+        return 200000
+    # check after the move if we blocked the other player
+    elif number_of_connected(opponent, mask ^ move) >= 3 and number_of_connected(opponent, mask) < 3:
+        return 100000
+    else:
+        return evaluate_board(position, mask)
+
+
 def evaluate_board(position: int, mask: int) -> int:
     """
     Evaluate board according to bit position
@@ -284,9 +725,35 @@ def evaluate_board(position: int, mask: int) -> int:
         return 1
 
 
+def backpropagation_batch(newly_created_node: Node, results: Tuple[int, int, int], tree: Tree) -> Tuple[Node, Tree]:
+    """
+    Backpropagation of several simulations of the node at once, the same as one backpropagation per result
+    Every node is credited with the wins of the player that made its move, the same counts as
+    array_mcts and graph_mcts.
+    Arguments:
+        newly_created_node: selected node
+        results: number of Win, Draw and Lost results of simulation_batch
+        tree: contains all the nodes
+    Return:
+        Tuple[Node, Tree]: updated root and tree
+    """
+    wins, draws, losses = results
+    simulations = wins + draws + losses
+    newly_created_node.simulations += simulations
+    newly_created_node.wins += wins
+    node = newly_created_node.parent
+    while node is not None:
+        node.simulations += simulations
+        node.wins += wins if node.player == newly_created_node.player else losses
+        root = node
+        node = node.parent
+    return root, tree
+
+
 def backpropagation(newly_created_node: Node, outcome: int, tree: Tree) -> Tuple[Node, Tree]:
     """
-    Update nodes scores one by one by going up the tree until the root
+    Update nodes scores one by one by going up the tree until the root, every node counts the wins of the player
+    that made its move, the same as backpropagation_batch
     Returns the root and tree with the updated scores
     Arguments:
         newly_created_node: selected node
@@ -299,7 +766,6 @@ def backpropagation(newly_created_node: Node, outcome: int, tree: Tree) -> Tuple
     newly_created_node.simulations += 1  # new node simulations
 
     if outcome == LOST:
-        newly_created_node.wins += 1
         node = newly_created_node.parent
         while node.parent is not None:
             if newly_created_node.player != node.player:
@@ -311,6 +777,7 @@ def backpropagation(newly_created_node: Node, outcome: int, tree: Tree) -> Tuple
             node.wins += 1
 
     elif outcome == WIN:
+        newly_created_node.wins += 1
         node = newly_created_node.parent
         while node.parent is not None:
             if newly_created_node.player == node.player:
@@ -330,12 +797,13 @@ def backpropagation(newly_created_node: Node, outcome: int, tree: Tree) -> Tuple
     return node, tree
 
 
-def valid_move(board: np.ndarray, player: BoardPiece, node: None) -> int:
+def valid_move(board: np.ndarray, player: BoardPiece, node: None, rng: Optional[random.Random] = None) -> int:
     """
     Return a valid random move in the board
     Arguments:
         board: ndarray representation of the board
         node: current node
+        rng: random generator of the move, the random module when None
     """
 
     # list with invalid moves
@@ -346,7 +814,7 @@ def valid_move(board: np.ndarray, player: BoardPiece, node: None) -> int:
     # create list with next possible moves
     actionList = [col for col in range(7) if np.count_nonzero(board[:, col] == 0) > 0 and col not in invalid_moves]
 
-    return random.choice(actionList) if len(actionList) > 0 else None
+    return (rng or random).choice(actionList) if len(actionList) > 0 else None
 
 
 def other_player(player: BoardPiece) -> BoardPiece:
@@ -365,7 +833,8 @@ def other_player(player: BoardPiece) -> BoardPiece:
 
 def get_position_mask_bitmap(player: BoardPiece, board: np.ndarray) -> Tuple[int, int]:
     """
-    Return bit representation of the board
+    Return bit representation of the board, bit 7 * col + 5 - row: the layout of encode_bitboards
+    for the board upside down
     Arguments:
         player: player for whom we will return position
         board: ndarray representation of the board to be converted in bitboard
@@ -374,36 +843,21 @@ def get_position_mask_bitmap(player: BoardPiece, board: np.ndarray) -> Tuple[int
         position : bit representation of the board with players pieces
         mask: bit representation of the board with all pieces
     """
-    position, mask = '', ''
-    # Start with right-most column
-    for j in range(6, -1, -1):
-        # Add 0-bits to sentinel
-        mask += '0'
-        position += '0'
-        # Start with bottom row
-        for i in range(0, 6):
-            mask += ['0', '1'][board[i, j] != 0]
-            position += ['0', '1'][board[i, j] == player]
-    return int(position, 2), int(mask, 2)
+    return encode_bitboards(board[::-1], player)
 
 
 def number_of_connected(position: int, mask: int) -> int:
     """
-    Returns number of connected pieces for player by given position
+    Returns number of connected pieces for player by given position, the most pieces
+    of the player in a window of four cells without opponent pieces, see threats.Threats.
+    The windows are the same in the layout of get_position_mask_bitmap and in the BitBoard layout.
     Arguments:
         position: bit representation of the board with players pieces
         mask: bit representation of board with all pieces
     Return:
         int: number of connected pieces
     """
-    if connected_four(position):
-        return 4
-    elif connected_three(position, mask):
-        return 3
-    elif connected_two(position, mask):
-        return 2
-    else:
-        return 1
+    return Threats(position, mask).connected()
 
 
 def connected_four(position) -> bool:
@@ -436,61 +890,14 @@ def connected_four(position) -> bool:
 
 def connected_three(position: int, mask: int) -> bool:
     """
-    Return True, when the player has connected 3 and free space after/before them
+    Return True, when the player has 3 pieces in a window of four cells and the fourth cell is free
     Arguments:
         position: bit representation of the board with players pieces
         mask: bit representation of board with all pieces
     Return:
         bool: True for 3 connected
     """
-    opp_pos = mask ^ position
-
-    # Diagonal /
-    m = position & (position >> 8)
-    if m & (m >> 8):
-        bits = "{0: 049b}".format(m & (m >> 8))
-        foo = [len(bits) - i - 1 for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if ((opp_pos >> int(foo[j] + 24)) & 1) != 1 and foo[j] + 24 < 49:  # one piece before
-                return True
-            elif foo[j] >= 8 and ((opp_pos >> int(foo[j] - 8)) & 1) != 1:  # one piece after
-                return True
-
-    # Diagonal \
-    m = position & (position >> 6)
-    if m & (m >> 6):
-        bits = "{0: 049b}".format(m & (m >> 6))
-        foo = [len(bits) - i - 1 + 6 for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if ((opp_pos >> int(foo[j] + 12)) & 1) != 1 and foo[j] + 12 < 49:  # one piece before
-                return True
-            elif foo[j] >= 12 and ((opp_pos >> int(foo[j] - 12)) & 1) != 1 and foo[j] - 12 % 6 == 0:  # one piece after
-                return True
-
-    # Horizontal
-    m = position & (position >> 7)
-    b = m & (m >> 7)
-    if b:
-        bits = "{0: 049b}".format(b)
-        foo = [len(bits) - i - 1 + 7 for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if ((opp_pos >> int(foo[j] + 14)) & 1) != 1 and foo[j] + 14 < 49:  # one piece before
-                return True
-            elif foo[j] >= 14 and ((opp_pos >> int(foo[j] - 14)) & 1) != 1:  # one piece after
-                return True
-
-    # Vertical
-    m = position & (position >> 1)
-    t = m & (m >> 1)
-    if t:
-        bits = "{0: 049b}".format(t)
-        foo = [len(bits) - i for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if foo[j] >= 2 and ((opp_pos >> int(foo[j] - 2)) & 1) != 1:  # one piece after
-                return True
-
-    # Nothing found
-    return False
+    return Threats(position, mask).threes > 0
 
 
 def connected_two(position: int, mask: int) -> bool:
@@ -500,60 +907,6 @@ def connected_two(position: int, mask: int) -> bool:
         position: bit representation of the board with players pieces
         mask: bit representation of board with all pieces
     Return:
-        bool: = value is true when player has 2 connected and 2 spaces after/before them
+        bool: = value is true when player has 2 pieces and 2 free cells in a window of four cells
     """
-
-    opp_pos = mask ^ position
-    # Diagonal /
-    tmp = position & (position >> 8)
-    if tmp:
-        bits = "{0: 049b}".format(tmp)
-        foo = [len(bits) - i - 1 for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if ((opp_pos >> int(foo[j] + 24)) & 1) != 1 and ((opp_pos >> int(foo[j] + 32)) & 1) != 1 \
-                    and foo[j] + 24 < 49 and foo[j] + 32 < 49 and foo[j] + 24 % 8 == 0 and foo[j] + 32 % 8 == 0:
-                return True
-            elif foo[j] >= 16 and ((opp_pos >> int(foo[j] - 8)) & 1) != 1 and ((opp_pos >> int(foo[j] - 16)) & 1) != 1:
-                return True
-            elif ((opp_pos >> int(foo[j] + 16)) & 1) != 1 and foo[j] + 16 < 49 and foo[j] >= 16 \
-                    and ((opp_pos >> int(foo[j] - 16)) & 1) != 1 and foo[j] + 16 % 8 == 0:
-                return True
-
-    # Diagonal \
-    tmp = position & (position >> 6)
-    if tmp:
-        bits = "{0: 049b}".format(tmp)
-        foo = [len(bits) - i - 1 + 6 for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if ((opp_pos >> int(foo[j] + 6)) & 1) != 1 and ((opp_pos >> int(foo[j] + 12)) & 1) != 1 \
-                    and foo[j] + 6 < 49 and foo[j] + 12 < 49 and foo[j] + 6 % 6 == 0 and foo[j] + 12 % 6 == 0:
-                return True
-            elif foo[j] >= 18 and ((opp_pos >> int(foo[j] - 12)) & 1) != 1 and ((opp_pos >> int(foo[j] - 18)) & 1) != 1:
-                return True
-
-    # Horizontal
-    tmp = position & (position >> 7)
-    if tmp:
-        bits = "{0: 049b}".format(tmp)
-        foo = [len(bits) - i - 1 + 7 for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if ((opp_pos >> int(foo[j] + 7)) & 1) != 1 and foo[j] + 7 <= 49 and \
-                    ((opp_pos >> int(foo[j] + 14)) & 1) != 1 and foo[j] + 14 < 49:
-                return True
-            elif foo[j] >= 21 and ((opp_pos >> int(foo[j] - 14)) & 1) != 1 and ((opp_pos >> int(foo[j] - 21)) & 1) != 1:
-                return True
-            elif foo[j] >= 14 and ((opp_pos >> int(foo[j] - 14)) & 1) != 1 and ((opp_pos >> int(foo[j] + 7)) & 1) != 1 \
-                    and foo[j] + 7 < 49:
-                return True
-
-    # Vertical
-    tmp = position & (position >> 1)
-    if tmp:
-        bits = "{0: 049b}".format(tmp)
-        foo = [len(bits) - i for i in range(0, len(bits)) if bits[i] == '1']
-        for j in range(len(foo)):
-            if foo[j] >= 2 and ((opp_pos >> int(foo[j] - 2)) & 1) != 1:
-                return True
-
-    # Nothing found
-    return False
+    return Threats(position, mask).twos > 0
@@ -0,0 +1 @@
+from .solver import generate_move_solver as generate_move
\ No newline at end of file
@@ -0,0 +1,287 @@
+from agents.common import BoardPiece, SavedState, PlayerAction, BitBoard, as_bitboard, canonical_key
+from agents.common import ROWS, COLS, BIT_HEIGHT, BOTTOM_MASK, BOARD_MASK
+from agents.agents_minimax.minimax import TranspositionTable, LOWER_BOUND, UPPER_BOUND
+from agents.opening_book import book_move
+from typing import Optional, Tuple, Union, List
+import numpy as np
+
+CELLS = ROWS * COLS
+MIN_SCORE = -(CELLS // 2) + 3  # lost with the 4th own piece
+MAX_SCORE = (CELLS + 1) // 2 - 3  # won with the 4th own piece
+COLUMN_ORDER = [3, 2, 4, 1, 5, 0, 6]  # central columns first
+TT_SIZE = 1048573  # prime number of slots, the keys of neighbouring positions spread over the table
+NODE_BUDGET = 200000  # nodes per move, about 3 sec, after which generate_move_solver falls back to minimax
+
+
+class SolverBudgetExceeded(Exception):
+    """
+    Raised inside the search when the node budget of the solver is used up
+    """
+
+
+class Solver:
+    """
+    A class used to represent a perfect play solver. A position is solved by null window searches of negamax
+    on the score, a binary search between the smallest and the largest possible score.
+    The score of a position is positive when the player on turn wins, 0 for a draw and negative when
+    the player on turn loses: the earlier the win, the higher the score, (CELLS + 1 - moves) // 2 - own pieces.
+    Positions are given as two bitboards in the BitBoard layout: the pieces of the player on turn and all pieces.
+
+    Attributes:
+        tt: TranspositionTable of bounds of the score, shared by all searches of the solver
+        nodes: int number of visited nodes
+        max_nodes: int number of nodes after which the search is aborted or None
+
+    Methods:
+        solve, analyse, best_move, negamax
+    """
+
+    def __init__(self, tt: Optional[TranspositionTable] = None, max_nodes: Optional[int] = None):
+        """
+        Initializes the solver
+        Parameters:
+            tt: transposition table to be used, a new one is created when not provided
+            max_nodes: nodes after which solve raises SolverBudgetExceeded, no limit when None
+        """
+        self.tt = tt if tt is not None else TranspositionTable(TT_SIZE)
+        self.nodes = 0
+        self.max_nodes = max_nodes
+
+    def solve(self, position: int, mask: int, moves: int, weak: bool = False) -> int:
+        """
+        Returns the score of a position that is not over yet
+        Parameters:
+            position: bitboard of the pieces of the player on turn
+            mask: bitboard of all pieces
+            moves: number of pieces on the board
+            weak: True to find only whether the position is won (1), drawn (0) or lost (-1)
+        """
+        if winning_moves(position, mask) & possible_moves(mask):
+            return 1 if weak else (CELLS + 1 - moves) // 2
+        low, high = -((CELLS - moves) // 2), (CELLS + 1 - moves) // 2
+        if weak:
+            low, high = -1, 1
+        while low < high:
+            # probe close to 0 first, most positions of a game are decided by a few moves
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med:
+                med = int(low / 2)
+            elif med >= 0 and int(high / 2) > med:
+                med = int(high / 2)
+            score = self.negamax(position, mask, moves, med, med + 1)
+            if score <= med:
+                high = score
+            else:
+                low = score
+        if weak:
+            return (low > 0) - (low < 0)  # the bounds found can be beyond the window
+        return low
+
+    def analyse(self, position: int, mask: int, moves: int, weak: bool = False) -> List[Optional[int]]:
+        """
+        Returns the score of every column for the player on turn, None for full columns
+        Parameters:
+            position: bitboard of the pieces of the player on turn
+            mask: bitboard of all pieces
+            moves: number of pieces on the board
+            weak: True to score the moves only with 1, 0 and -1
+        """
+        scores = [None] * COLS
+        for col in range(COLS):
+            move = (mask + bottom_mask(col)) & column_mask(col)
+            if not move:  # full column
+                continue
+            if winning_moves(position, mask) & move:
+                scores[col] = 1 if weak else (CELLS + 1 - moves) // 2
+            elif moves + 1 == CELLS:
+                scores[col] = 0
+            else:
+                scores[col] = -self.solve(position ^ mask, mask | move, moves + 1, weak)
+        return scores
+
+    def best_move(self, position: int, mask: int, moves: int, weak: bool = False) -> Tuple[int, int]:
+        """
+        Returns the best column and its score, the central column among moves with the same score
+        Parameters:
+            position: bitboard of the pieces of the player on turn
+            mask: bitboard of all pieces
+            moves: number of pieces on the board
+            weak: True to look only for a move that keeps the best result, not the fastest win
+        """
+        wins = winning_moves(position, mask) & possible_moves(mask)
+        if wins:
+            col = next(col for col in COLUMN_ORDER if wins & column_mask(col))
+            return col, 1 if weak else (CELLS + 1 - moves) // 2
+        scores = self.analyse(position, mask, moves, weak)
+        col = max((col for col in COLUMN_ORDER if scores[col] is not None), key=lambda col: scores[col])
+        return col, scores[col]
+
+    def negamax(self, position: int, mask: int, moves: int, alpha: int, beta: int) -> int:
+        """
+        Recursive negamax with alpha-beta pruning, the player on turn has no move that wins at once.
+        Returns the score when it is between alpha and beta, else a bound beyond the window.
+        Parameters:
+            position: bitboard of the pieces of the player on turn
+            mask: bitboard of all pieces
+            moves: number of pieces on the board
+            alpha: lower bound of the window
+            beta: upper bound of the window
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SolverBudgetExceeded
+
+        possible = possible_moves(mask)
+        opponent_wins = winning_moves(position ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return -((CELLS - moves) // 2)  # two threats of the opponent, the game is lost
+            possible = forced  # the threat has to be blocked
+        non_losing = possible & ~(opponent_wins >> 1)  # never play below a threat of the opponent
+        if non_losing == 0:
+            return -((CELLS - moves) // 2)
+        if moves >= CELLS - 2:
+            return 0
+
+        # the opponent can not win at once, the player can not win with the next two moves
+        low = -((CELLS - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (CELLS - 1 - moves) // 2
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        key, _ = canonical_key(position, mask)  # shared with the mirror image, no moves are stored
+        entry = self.tt.lookup(key)
+        if entry is not None:
+            _, value, bound, _ = entry
+            if bound == LOWER_BOUND:
+                if alpha < value:
+                    alpha = value
+                    if alpha >= beta:
+                        return alpha
+            elif beta > value:
+                beta = value
+                if alpha >= beta:
+                    return beta
+
+        # moves creating most new threats first, ties in the order of COLUMN_ORDER
+        children = []
+        for col in COLUMN_ORDER:
+            move = non_losing & column_mask(col)
+            if move:
+                children.append((-popcount(winning_moves(position | move, mask)), len(children), move))
+        children.sort()
+
+        for _, _, move in children:
+            score = -self.negamax(position ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.tt.store(key, CELLS - moves, score, LOWER_BOUND, None)
+                return score
+            if score > alpha:
+                alpha = score
+        self.tt.store(key, CELLS - moves, alpha, UPPER_BOUND, None)
+        return alpha
+
+
+def generate_move_solver(board: Union[np.ndarray, BitBoard], player: BoardPiece, saved_state: Optional[SavedState],
+                         max_nodes: Optional[int] = NODE_BUDGET, use_book: bool = False) \
+        -> Tuple[PlayerAction, Optional[SavedState]]:
+    """
+    Choose the best move of perfect play, the fastest win or the slowest loss. The solver is kept in the
+    saved state, so its transposition table is reused for the next moves. When the position can not be solved
+    within `max_nodes` nodes, the move of the minimax agent is played.
+    Arguments:
+        board: ndarray or BitBoard representation of the board
+        player: whether agent plays with X (Player1) or O (Player2)
+        saved_state: computation that it could reuse for future moves
+        max_nodes: node budget of the move, no limit when None
+        use_book: True to play the move of the opening book, when the position is in it; no state is returned then
+    Return:
+        Tuple[PlayerAction, SavedState]: returns the column, where the agent will play and the solver
+    """
+    if use_book:
+        move = book_move(board, player)
+        if move is not None:
+            return move, None  # the state of the search does not belong to the book position
+    if saved_state is None or not isinstance(saved_state.computational_result, Solver):
+        saved_state = SavedState(Solver())
+    solver = saved_state.computational_result
+    solver.nodes = 0
+    solver.max_nodes = max_nodes
+
+    position, mask, moves = encode(board, player)
+    try:
+        action, _ = solver.best_move(position, mask, moves)
+    except SolverBudgetExceeded:
+        from agents.agents_minimax.minimax import generate_move_minimax
+        action, _ = generate_move_minimax(board, player, None, use_book=False)
+    return PlayerAction(action), saved_state
+
+
+def encode(board: Union[np.ndarray, BitBoard], player: BoardPiece) -> Tuple[int, int, int]:
+    """
+    Returns the bitboards of the solver for the player on turn
+    Arguments:
+        board: ndarray or BitBoard representation of the board
+        player: the player on turn
+    Return:
+        Tuple[int, int, int]: pieces of the player on turn, all pieces and the number of pieces
+    """
+    bitboard = as_bitboard(board)
+    return bitboard.pieces[player - 1], bitboard.mask, bitboard.moves
+
+
+def winning_moves(position: int, mask: int) -> int:
+    """
+    Returns the free cells, where a piece of the player would complete four in a row, playable or not
+    Arguments:
+        position: bitboard of the pieces of the player
+        mask: bitboard of all pieces
+    Return:
+        int: bitboard of the winning cells
+    """
+    # vertical
+    r = (position << 1) & (position << 2) & (position << 3)
+    # horizontal and both diagonals
+    for shift in (BIT_HEIGHT, BIT_HEIGHT - 1, BIT_HEIGHT + 1):
+        p = (position << shift) & (position << 2 * shift)
+        r |= p & (position << 3 * shift)
+        r |= p & (position >> shift)
+        p = (position >> shift) & (position >> 2 * shift)
+        r |= p & (position << shift)
+        r |= p & (position >> 3 * shift)
+    return r & (BOARD_MASK ^ mask)
+
+
+def possible_moves(mask: int) -> int:
+    """
+    Returns the bitboard of the lowest free cell of every column that is not full
+    """
+    return (mask + BOTTOM_MASK) & BOARD_MASK
+
+
+def bottom_mask(col: int) -> int:
+    """
+    Returns the bitboard of the bottom cell of the column `col`
+    """
+    return 1 << (col * BIT_HEIGHT)
+
+
+def column_mask(col: int) -> int:
+    """
+    Returns the bitboard of the playable cells of the column `col`
+    """
+    return ((1 << ROWS) - 1) << (col * BIT_HEIGHT)
+
+
+def popcount(bits: int) -> int:
+    """
+    Returns the number of set bits
+    """
+    return bits.bit_count()
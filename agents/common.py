@@ -1,7 +1,7 @@
 from enum import Enum
-from typing import Optional
+from typing import Callable, Optional, Tuple, Union
 import numpy as np
-from typing import Callable, Tuple
+from agents.windows import ROWS, COLS, WINDOW_CELLS, WINDOW_INDICES, CELL_WINDOWS
 
 BoardPiece = np.int8  # The data type (dtype) of the board
 NO_PLAYER = BoardPiece(0)  # board[i, j] == NO_PLAYER where the position is empty
@@ -11,6 +11,16 @@ PLAYER2 = BoardPiece(2)  # board[i, j] == PLAYER2 where player 2 has a piece
 PlayerAction = np.int8  # The column to be played
 BOARD_BEFORE = np.ndarray
 
+BIT_HEIGHT = ROWS + 1  # bits per column in a bitboard, the top bit is an always empty sentinel
+BOTTOM_MASK = sum(1 << (col * BIT_HEIGHT) for col in range(COLS))  # bottom cell of every column
+BOARD_MASK = BOTTOM_MASK * ((1 << ROWS) - 1)  # every playable cell of the board
+COLUMN_BITS = (1 << BIT_HEIGHT) - 1  # all bits of the first column, sentinel included
+# bits of the left column of every pair of mirrored columns and the distance to the right one
+MIRROR_PAIRS = [(COLUMN_BITS << (col * BIT_HEIGHT), (COLS - 1 - 2 * col) * BIT_HEIGHT) for col in range(COLS // 2)]
+MIRROR_CENTER = COLUMN_BITS << (COLS // 2 * BIT_HEIGHT) if COLS % 2 else 0  # the middle column stays
+# index of the bit of every cell board[row, col] in the BitBoard layout
+BIT_INDEX = np.array([[col * BIT_HEIGHT + row for col in range(COLS)] for row in range(ROWS)], dtype=np.uint64)
+
 
 class GameState(Enum):
     IS_WIN = 1
@@ -170,38 +180,19 @@ def connected_four(board: np.ndarray, player: BoardPiece, last_action: Optional[
     """
 
     # checks if there is last action provided
-    # if it's not provided iterate through the whole board and check if the player won
+    # if it's not provided check all windows of the board at once
     if last_action is None:
-        for column in range(7):
-            check = connected_four(board, player, column)
-            if check:
-                return True
-            if not check and column == 6:
-                return False  # there is no win on the board and we already checked all columns
-
-    # finds free row in this column
-    row = len(np.argwhere(board[:, last_action] == 0))  # counts zeros in column
-    row = board.shape[0] - row - 1  # the row of the last action
-
-    # checks horizontal
-    BoardRow = board[row, 0:7].T  # gets whole row of last action
-    if four_in_a_row(BoardRow, player):
-        return True
+        return bool(np.any(np.all(np.asarray(board).reshape(-1)[WINDOW_INDICES] == player, axis=1)))
 
-    # checks vertical
-    BoardCol = (board[0:6, last_action]).T  # gets whole column of last action
-    if four_in_a_row(BoardCol, player):
-        return True
+    # the row of the last action is the top piece of the column
+    row = np.count_nonzero(board[:, last_action]) - 1
+    if row < 0:
+        return False
 
-    # checks diagonal(main)
-    diagList = np.diag(board, (last_action - row))  # gets (left over right down) diagonal of last action
-    if four_in_a_row(diagList, player):
-        return True
-
-    # checks diagonal(opposite)
-    DiagList = np.diag(board[::-1], (last_action - (5 - row)))  # gets (left down right over) diagonal of last action
-    if four_in_a_row(DiagList, player):
-        return True
+    # checks only the windows through the last action
+    for window in CELL_WINDOWS[row][last_action]:
+        if all(board[r, c] == player for r, c in WINDOW_CELLS[window]):
+            return True
 
     return False
 
@@ -246,3 +237,323 @@ def check_end_state(board: np.ndarray, player: BoardPiece, last_action: Optional
     elif np.count_nonzero(board == 0) < 1:
         return GameState.IS_DRAW
     return GameState.STILL_PLAYING
+
+
+def connected_four_batch(positions: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of bit_connected_four for the positions of a stack of boards. Every direction is checked
+    with two shifts and ANDs of the whole uint64 array.
+    Arguments:
+        positions: uint64 array of shape (N,), pieces of a player in the BitBoard layout, see encode_bitboards
+    Return:
+        np.ndarray: bool array of shape (N,), True for the boards where the player has four connected
+    """
+    won = np.zeros(positions.shape, dtype=bool)
+    for shift in (1, BIT_HEIGHT, BIT_HEIGHT - 1, BIT_HEIGHT + 1):  # vertical, horizontal, both diagonals
+        m = positions & (positions >> np.uint64(shift))
+        won |= (m & (m >> np.uint64(2 * shift))) != 0
+    return won
+
+
+def check_end_state_batch(boards: np.ndarray, player: Optional[BoardPiece] = None) -> np.ndarray:
+    """
+    Vectorized version of check_end_state for a stack of boards, on the bitboards of encode_bitboards.
+    When `player` is None a win of either player counts as GameState.IS_WIN.
+    Arguments:
+        boards: ndarray of shape (N, 6, 7) with N boards
+        player: a player whose victory is being checked or None for both players
+    Return:
+        np.ndarray: int8 array of shape (N,) with the GameState value of every board
+    """
+    positions, masks = encode_bitboards(np.asarray(boards), PLAYER1 if player is None else player)
+    won = connected_four_batch(positions)
+    if player is None:
+        won |= connected_four_batch(positions ^ masks)
+    full = masks == np.uint64(BOARD_MASK)
+
+    states = np.full(len(masks), GameState.STILL_PLAYING.value, dtype=np.int8)
+    states[full] = GameState.IS_DRAW.value
+    states[won] = GameState.IS_WIN.value
+    return states
+
+
+def check_end_state_incremental(board: np.ndarray, player: BoardPiece, last_move: Tuple[int, int],
+                                moves: int) -> GameState:
+    """
+    Incremental version of check_end_state. Only the windows through the cell of the last move are checked
+    for a win of `player`, the draw is detected from the number of pieces on the board.
+    Wins that don't go through the last move are not detected.
+    Arguments:
+        board: ndarray representation of the board
+        player: the player who did the last move
+        last_move: row and column of the piece placed last
+        moves: number of pieces on the board including the last move
+    Return:
+        GameState: current game state
+    """
+    row, col = last_move
+    for window in CELL_WINDOWS[row][col]:
+        if all(board.item(cell) == player for cell in WINDOW_CELLS[window]):
+            return GameState.IS_WIN
+    if moves >= ROWS * COLS:
+        return GameState.IS_DRAW
+    return GameState.STILL_PLAYING
+
+
+class BitBoard:
+    """
+    A class used to represent the board as two bitboards, one for each player.
+    Bit col * 7 + row is set when the cell board[row, col] holds a piece of the player,
+    the 7th bit of every column is a sentinel that is never set.
+
+    Attributes:
+        pieces: List[int] bit representation of the pieces of PLAYER1 and PLAYER2
+        heights: List[int] index of the next free bit of every column
+        moves: int number of pieces on the board
+        history: List[int] columns played with play(), used by undo()
+
+    Methods:
+        play, undo, can_play, is_win, is_draw, end_state, copy, from_array, to_array
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty board
+        Parameters: None
+        """
+        self.pieces = [0, 0]
+        self.heights = [col * BIT_HEIGHT for col in range(COLS)]
+        self.moves = 0
+        self.history = []
+
+    @property
+    def mask(self) -> int:
+        """
+        Bit representation of the board with all pieces
+        """
+        return self.pieces[0] | self.pieces[1]
+
+    def can_play(self, action: PlayerAction) -> bool:
+        """
+        Returns True, when the column `action` is not full
+        Parameters:
+            action: column to be checked
+        """
+        return self.heights[action] < action * BIT_HEIGHT + ROWS
+
+    def play(self, action: PlayerAction, player: BoardPiece):
+        """
+        Drops a piece of `player` in the column `action`. The column must not be full.
+        Parameters:
+            action: column, where the player wants to have a piece
+            player: the player whose turn it is
+        """
+        self.pieces[player - 1] |= 1 << self.heights[action]
+        self.heights[action] += 1
+        self.moves += 1
+        self.history.append(action)
+
+    def undo(self) -> PlayerAction:
+        """
+        Takes back the last move done with play() and returns its column
+        Parameters: None
+        """
+        action = self.history.pop()
+        self.heights[action] -= 1
+        self.moves -= 1
+        cleared = ~(1 << self.heights[action])
+        self.pieces[0] &= cleared
+        self.pieces[1] &= cleared
+        return action
+
+    def is_win(self, player: BoardPiece) -> bool:
+        """
+        Returns True, when `player` has four connected pieces
+        Parameters:
+            player: a player whose victory is being checked
+        """
+        return bit_connected_four(self.pieces[player - 1])
+
+    def is_draw(self) -> bool:
+        """
+        Returns True, when the board is full and no player has won
+        Parameters: None
+        """
+        return self.moves == ROWS * COLS and not self.is_win(PLAYER1) and not self.is_win(PLAYER2)
+
+    def end_state(self, player: BoardPiece) -> GameState:
+        """
+        Bitboard version of check_end_state
+        Parameters:
+            player: a player whose victory is being checked
+        """
+        if self.is_win(player):
+            return GameState.IS_WIN
+        elif self.moves == ROWS * COLS:
+            return GameState.IS_DRAW
+        return GameState.STILL_PLAYING
+
+    def copy(self) -> 'BitBoard':
+        """
+        Returns an independent copy of the board
+        Parameters: None
+        """
+        new = BitBoard.__new__(BitBoard)
+        new.pieces = self.pieces.copy()
+        new.heights = self.heights.copy()
+        new.moves = self.moves
+        new.history = self.history.copy()
+        return new
+
+    @classmethod
+    def from_array(cls, board: np.ndarray) -> 'BitBoard':
+        """
+        Converts an ndarray representation of the board into a BitBoard
+        Parameters:
+            board: ndarray representation of the board
+        """
+        bitboard = cls()
+        position, mask = encode_bitboards(board, PLAYER1)
+        bitboard.pieces = [position, mask ^ position]
+        for col in range(COLS):  # above the highest piece of the column
+            bitboard.heights[col] = col * BIT_HEIGHT + ((mask >> (col * BIT_HEIGHT)) & COLUMN_BITS).bit_length()
+        bitboard.moves = mask.bit_count()
+        return bitboard
+
+    def to_array(self) -> np.ndarray:
+        """
+        Converts the BitBoard back into an ndarray representation of the board
+        Parameters: None
+        """
+        return decode_bitboards(self.pieces[0], self.mask, PLAYER1)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BitBoard) and self.pieces == other.pieces
+
+    def __repr__(self):
+        return pretty_print_board(self.to_array())
+
+
+def bit_connected_four(position: int) -> bool:
+    """
+    Returns True, when the bit representation of the pieces of a player contains four connected pieces
+    Arguments:
+        position: bit representation of the board with players pieces
+    Return:
+        bool: True for 4 connected
+    """
+    for shift in (1, BIT_HEIGHT, BIT_HEIGHT - 1, BIT_HEIGHT + 1):  # vertical, horizontal, both diagonals
+        m = position & (position >> shift)
+        if m & (m >> (2 * shift)):
+            return True
+    return False
+
+
+def encode_bitboards(boards: np.ndarray, player: BoardPiece) \
+        -> Tuple[Union[int, np.ndarray], Union[int, np.ndarray]]:
+    """
+    Returns the bit representation in the BitBoard layout of a board or of a stack of boards. The cells are packed
+    into bits with np.packbits, column after column with an empty sentinel bit on top of every column.
+    For the layout of get_position_mask_bitmap, bit 7 * col + 5 - row, encode the boards upside down, board[::-1].
+    Arguments:
+        boards: ndarray representation of a board, shape (6, 7), or of N boards, shape (N, 6, 7)
+        player: the player whose pieces are encoded
+    Return:
+        Tuple[Union[int, np.ndarray], Union[int, np.ndarray]]: pieces of `player` and all pieces, ints for one board
+        and uint64 arrays of shape (N,) for a stack
+    """
+    boards = np.asarray(boards)
+    # columns of BIT_HEIGHT bits, the top one the empty sentinel, 49 bits padded to 64 below
+    cells = np.zeros(boards.shape[:-2] + (2, COLS, BIT_HEIGHT), dtype=bool)
+    cells[..., 0, :, :ROWS] = np.swapaxes(boards == player, -1, -2)
+    cells[..., 1, :, :ROWS] = np.swapaxes(boards != NO_PLAYER, -1, -2)
+    bits = cells.reshape(boards.shape[:-2] + (2, COLS * BIT_HEIGHT))
+    bits = np.concatenate([bits, np.zeros(bits.shape[:-1] + (64 - COLS * BIT_HEIGHT,), dtype=bool)], axis=-1)
+    packed = np.packbits(bits, axis=-1, bitorder='little').view('<u8')[..., 0]
+    if boards.ndim == 2:
+        return int(packed[0]), int(packed[1])
+    return packed[..., 0], packed[..., 1]
+
+
+def decode_bitboards(positions: Union[int, np.ndarray], masks: Union[int, np.ndarray], player: BoardPiece) \
+        -> np.ndarray:
+    """
+    Returns the ndarray representation of boards given in the BitBoard layout, the inverse of encode_bitboards
+    Arguments:
+        positions: pieces of `player`, an int or an array of N ints
+        masks: all pieces, an int or an array of N ints
+        player: the player of `positions`
+    Return:
+        np.ndarray: board of shape (6, 7) or boards of shape (N, 6, 7), data type BoardPiece
+    """
+    positions = np.asarray(positions, dtype=np.uint64)[..., np.newaxis, np.newaxis]
+    masks = np.asarray(masks, dtype=np.uint64)[..., np.newaxis, np.newaxis]
+    own = ((positions >> BIT_INDEX) & np.uint64(1)).astype(bool)
+    occupied = ((masks >> BIT_INDEX) & np.uint64(1)).astype(bool)
+    boards = np.where(occupied, BoardPiece(3) - player, NO_PLAYER).astype(BoardPiece)
+    boards[own] = player
+    return boards
+
+
+def mirror_bits(bits: int) -> int:
+    """
+    Returns the bit representation of the left-right mirror image, column col becomes column COLS - 1 - col
+    Arguments:
+        bits: bit representation of pieces in the BitBoard layout
+    Return:
+        int: bit representation of the mirrored pieces
+    """
+    mirrored = bits & MIRROR_CENTER
+    for left, shift in MIRROR_PAIRS:  # swap the column pairs
+        mirrored |= ((bits & left) << shift) | ((bits >> shift) & left)
+    return mirrored
+
+
+def mirror_move(action: PlayerAction) -> PlayerAction:
+    """
+    Returns the column of `action` in the mirror image of the board
+    """
+    return COLS - 1 - action
+
+
+def canonical_key(position: int, mask: int) -> Tuple[int, bool]:
+    """
+    Returns the key shared by a position and its mirror image, the smaller of both keys,
+    and whether it is the key of the mirror image. Moves stored under the key have to be mirrored then.
+    Arguments:
+        position: bit representation of the pieces of the player on turn
+        mask: bit representation of all pieces
+    Return:
+        Tuple[int, bool]: the key and True, when it belongs to the mirror image
+    """
+    key = position + mask
+    mirrored = mirror_bits(key)  # the sum never carries into the next column, mirroring the key mirrors both
+    if mirrored < key:
+        return mirrored, True
+    return key, False
+
+
+def as_bitboard(board: Union[np.ndarray, BitBoard]) -> BitBoard:
+    """
+    Returns `board` as BitBoard, converting it when it is an ndarray
+    Arguments:
+        board: ndarray or BitBoard representation of the board
+    Return:
+        BitBoard: bit representation of the board
+    """
+    if isinstance(board, BitBoard):
+        return board
+    return BitBoard.from_array(board)
+
+
+def as_array(board: Union[np.ndarray, BitBoard]) -> np.ndarray:
+    """
+    Returns `board` as ndarray, converting it when it is a BitBoard
+    Arguments:
+        board: ndarray or BitBoard representation of the board
+    Return:
+        np.ndarray: ndarray representation of the board
+    """
+    if isinstance(board, BitBoard):
+        return board.to_array()
+    return board
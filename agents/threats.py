@@ -0,0 +1,103 @@
+from agents.common import BIT_HEIGHT, BOARD_MASK, BOTTOM_MASK, ROWS
+
+# shift between neighbouring cells of a line: vertical, horizontal, diagonal \ and diagonal /
+DIRECTIONS = (1, BIT_HEIGHT, BIT_HEIGHT - 1, BIT_HEIGHT + 1)
+# WINDOW_STARTS[i] has the lowest bit of every window of four cells in DIRECTIONS[i] set; windows through
+# the sentinel row are left out, so the 69 windows of the board are counted once
+WINDOW_STARTS = tuple(BOARD_MASK & (BOARD_MASK >> d) & (BOARD_MASK >> 2 * d) & (BOARD_MASK >> 3 * d)
+                      for d in DIRECTIONS)
+# the first, third and fifth row from the bottom, and the second, fourth and sixth
+ODD_ROWS = BOTTOM_MASK * sum(1 << row for row in range(0, ROWS, 2))
+EVEN_ROWS = BOTTOM_MASK * sum(1 << row for row in range(1, ROWS, 2))
+
+
+class Threats:
+    """
+    A class used to represent the threats of a player in the BitBoard layout, bit col * BIT_HEIGHT + row.
+    All windows of four cells of a direction are scanned at once: the pieces of the player are shifted into
+    the four cells of every window and added with bitwise half adders, so the windows with one, two, three or
+    four pieces and no opponent piece are found without looping over the windows.
+    The counts are the same for the layout of monte_carlo.get_position_mask_bitmap, the board upside down,
+    the rows of odd, even and playable are those of the BitBoard layout.
+
+    Attributes:
+        winning: int empty cells that complete a window of four, the squares of the open threes
+        open_threes: int pieces of the windows with three pieces and an empty cell
+        open_twos: int empty cells of the windows with two pieces and two empty cells, where a new three is made
+        odd: int winning cells on the first, third and fifth row from the bottom
+        even: int winning cells on the second, fourth and sixth row
+        playable: int winning cells which can be played now, directly above the pieces of their column
+        fours: int number of windows filled by the player
+        threes: int number of windows with three pieces and an empty cell
+        twos: int number of windows with two pieces and two empty cells
+        ones: int number of windows with one piece and three empty cells
+
+    Methods:
+        connected, immediate_wins
+    """
+
+    def __init__(self, position: int, mask: int):
+        """
+        Finds the threats of the player in one pass over the four directions
+        Parameters:
+            position: bit representation of the board with the pieces of the player
+            mask: bit representation of the board with all pieces
+        """
+        empty = BOARD_MASK & ~mask
+        free = position | empty  # cells without opponent piece
+        winning = open_threes = open_twos = 0
+        fours = threes = twos = ones = 0
+        for d, starts in zip(DIRECTIONS, WINDOW_STARTS):
+            windows = starts & free & (free >> d) & (free >> 2 * d) & (free >> 3 * d)
+            if not windows:
+                continue
+            first, second, third, fourth = position, position >> d, position >> 2 * d, position >> 3 * d
+            low_both, low_one = first & second, first ^ second
+            high_both, high_one = third & fourth, third ^ fourth
+            low_any, high_any = first | second, third | fourth
+            four = windows & low_both & high_both
+            three = windows & ((low_both & high_one) | (low_one & high_both))
+            two = windows & ((low_both & ~high_any) | (high_both & ~low_any) | (low_one & high_one))
+            one = windows & ((low_one & ~high_any) | (high_one & ~low_any))
+            if three:
+                cells = three | (three << d) | (three << 2 * d) | (three << 3 * d)
+                winning |= cells & empty
+                open_threes |= cells & position
+            if two:
+                open_twos |= (two | (two << d) | (two << 2 * d) | (two << 3 * d)) & empty
+            fours += four.bit_count()
+            threes += three.bit_count()
+            twos += two.bit_count()
+            ones += one.bit_count()
+        self.winning = winning
+        self.open_threes = open_threes
+        self.open_twos = open_twos
+        self.odd = winning & ODD_ROWS
+        self.even = winning & EVEN_ROWS
+        self.playable = winning & (mask + BOTTOM_MASK)
+        self.fours = fours
+        self.threes = threes
+        self.twos = twos
+        self.ones = ones
+
+    def connected(self) -> int:
+        """
+        Returns the most pieces of the player in a window without opponent pieces, at least 1
+        Parameters: None
+        """
+        return 4 if self.fours else 3 if self.threes else 2 if self.twos else 1
+
+    def immediate_wins(self) -> int:
+        """
+        Returns the number of columns in which the player wins with the next move
+        Parameters: None
+        """
+        return self.playable.bit_count()
+
+    def __repr__(self):
+        """
+        Represents the counts of the windows and of the winning cells as strings
+        Parameters: None
+        """
+        return f' Fours: {self.fours} Threes: {self.threes} Twos: {self.twos} Ones: {self.ones}' \
+               f' Odd: {self.odd.bit_count()} Even: {self.even.bit_count()} Playable: {self.playable.bit_count()}'
@@ -0,0 +1,51 @@
+from typing import Callable, List, Tuple
+import numpy as np
+
+# the dimensions of the board are defined here only, agents.common imports them
+ROWS = 6  # number of rows of the board
+COLS = 7  # number of columns of the board
+
+
+def _window_cells() -> List[Tuple[Tuple[int, int], ...]]:
+    """
+    Finds all windows of four cells in a horizontal, vertical or diagonal line
+    Arguments:
+        ---
+    Return:
+        List[Tuple[Tuple[int, int], ...]]: row and column of the four cells of every window
+    """
+    windows = []
+    for d_row, d_col in ((0, 1), (1, 0), (1, 1), (-1, 1)):  # horizontal, vertical, main and opposite diagonal
+        for row in range(ROWS):
+            for col in range(COLS):
+                cells = tuple((row + i * d_row, col + i * d_col) for i in range(4))
+                if all(0 <= r < ROWS and 0 <= c < COLS for r, c in cells):
+                    windows.append(cells)
+    return windows
+
+
+def window_masks(bit_index: Callable[[int, int], int]) -> List[int]:
+    """
+    Returns the bitmask of every window for a bitboard layout
+    Arguments:
+        bit_index: function of row and column returning the bit of the cell in the layout
+    Return:
+        List[int]: one bitmask per window, in the order of WINDOW_CELLS
+    """
+    return [sum(1 << bit_index(row, col) for row, col in cells) for cells in WINDOW_CELLS]
+
+
+WINDOW_CELLS = _window_cells()  # the 69 windows of the board
+N_WINDOWS = len(WINDOW_CELLS)
+
+# index arrays of shape (69, 4), board[WINDOW_ROWS, WINDOW_COLS] gathers all windows at once
+WINDOW_ROWS = np.array([[row for row, _ in cells] for cells in WINDOW_CELLS], dtype=np.intp)
+WINDOW_COLS = np.array([[col for _, col in cells] for cells in WINDOW_CELLS], dtype=np.intp)
+WINDOW_INDICES = WINDOW_ROWS * COLS + WINDOW_COLS  # indices into board.reshape(-1)
+
+# CELL_WINDOWS[row][col] lists the windows the cell belongs to (at most 13)
+CELL_WINDOWS = [[[w for w, cells in enumerate(WINDOW_CELLS) if (row, col) in cells] for col in range(COLS)]
+                for row in range(ROWS)]
+
+# window bitmasks in the BitBoard layout, bit col * 7 + row
+WINDOW_MASKS = window_masks(lambda row, col: col * (ROWS + 1) + row)
@@ -0,0 +1,201 @@
+"""
+Benchmarks of the minimax agent on a fixed set of positions.
+Run from the repository root with: python -m benchmarks.bench_minimax
+"""
+import time
+import numpy as np
+from agents.common import initialize_game_state, apply_player_action, BoardPiece, PLAYER1, PLAYER2
+from agents.common import bit_connected_four, canonical_key
+from agents.agents_minimax import minimax
+
+# positions given as the columns played from the empty board, PLAYER1 starts
+BENCHMARK_POSITIONS = [
+    '',
+    '3',
+    '33',
+    '3324',
+    '332415',
+    '33443322',
+    '3232565',
+    '4455666',
+    '2435341',
+    '0123456',
+    '33333322',
+    '4343543225',
+]
+
+
+def board_from_moves(moves: str) -> np.ndarray:
+    """
+    Returns the board after playing the columns in `moves`, PLAYER1 starts
+    Arguments:
+        moves: string of the columns played
+    Return:
+        np.ndarray: ndarray representation of the board
+    """
+    board = initialize_game_state()
+    for i, col in enumerate(moves):
+        apply_player_action(board, int(col), PLAYER1 if i % 2 == 0 else PLAYER2)
+    return board
+
+
+def player_on_turn(moves: str) -> BoardPiece:
+    """
+    Returns the player that moves next after `moves`
+    """
+    return PLAYER1 if len(moves) % 2 == 0 else PLAYER2
+
+
+def bench_transposition_table():
+    """
+    Compares node counts of the search with and without the transposition table
+    """
+    print(f'{"position":<12}{"nodes":>8}{"nodes tt":>10}{"saved":>8}{"hit rate":>10}{"time":>8}{"time tt":>9}')
+    total, total_tt = 0, 0
+    for moves in BENCHMARK_POSITIONS:
+        board = board_from_moves(moves)
+        player = player_on_turn(moves)
+
+        plain = minimax.SearchContext(use_tt=False)
+        tic = time.time()
+        action, _ = minimax.generate_move_minimax(board, player, None, plain, use_book=False)
+        elapsed = time.time() - tic
+
+        cached = minimax.SearchContext()
+        tic = time.time()
+        action_tt, _ = minimax.generate_move_minimax(board, player, None, cached, use_book=False)
+        elapsed_tt = time.time() - tic
+
+        total += plain.nodes
+        total_tt += cached.nodes
+        print(f'{moves or "-":<12}{plain.nodes:>8}{cached.nodes:>10}{1 - cached.nodes / plain.nodes:>8.1%}'
+              f'{cached.tt.hit_rate():>10.1%}{elapsed:>8.2f}{elapsed_tt:>9.2f}')
+    print(f'{"total":<12}{total:>8}{total_tt:>10}{1 - total_tt / total:>8.1%}')
+
+
+def bench_move_ordering():
+    """
+    Compares node counts, cutoffs on the first move and effective branching factors of the move orderings
+    """
+    orderings = [(), ('center',), ('tt', 'center'), ('tt', 'killer', 'center'), minimax.ORDERING]
+    print(f'{"ordering":<36}{"nodes":>8}{"cutoffs":>9}{"first":>8}{"branching factor per ply":>30}')
+    for ordering in orderings:
+        nodes, cutoffs, first = 0, 0, 0
+        per_ply = [0] * 5
+        for moves in BENCHMARK_POSITIONS:
+            context = minimax.SearchContext(ordering=ordering)
+            minimax.generate_move_minimax(board_from_moves(moves), player_on_turn(moves), None, context, use_book=False)
+            nodes += context.nodes
+            cutoffs += sum(context.cutoffs)
+            first += sum(context.first_move_cutoffs)
+            per_ply = [total + count for total, count in zip(per_ply, context.nodes_per_ply)]
+        factors = ' '.join(f'{per_ply[ply + 1] / per_ply[ply]:.2f}' for ply in range(4))
+        print(f'{",".join(ordering) or "left to right":<36}{nodes:>8}{cutoffs:>9}{first / cutoffs:>8.1%}{factors:>30}')
+
+
+def bench_nodes_per_second(depth: int = 7):
+    """
+    Measures nodes per second of the search with leaves scored from scratch, with the incremental evaluator
+    and with a constant leaf evaluation, which measures the search alone
+    """
+    def run(label, incremental):
+        nodes, elapsed = 0, 0.0
+        for moves in BENCHMARK_POSITIONS:
+            context = minimax.SearchContext(use_tt=False, ordering=(), incremental=incremental)
+            tic = time.perf_counter()
+            minimax.generate_move_minimax(board_from_moves(moves), player_on_turn(moves), None, context, use_book=False)
+            elapsed += time.perf_counter() - tic
+            nodes += context.nodes
+        print(f'{label:<36}{nodes:>8}{elapsed:>8.2f}s{nodes / elapsed:>10.0f} nodes/s')
+
+    run(f'depth {minimax.DEPTH}, evaluate_threats', False)
+    run(f'depth {minimax.DEPTH}, incremental evaluation', True)
+    evaluate, fixed_depth = minimax.evaluate_threats, minimax.DEPTH
+    minimax.evaluate_threats, minimax.DEPTH = lambda position, mask: 0, depth
+    try:
+        run(f'depth {depth}, constant leaves', False)
+    finally:
+        minimax.evaluate_threats, minimax.DEPTH = evaluate, fixed_depth
+
+
+def bench_engines(depth: int = 6):
+    """
+    Compares nodes and time of the search engines, searching each position once at `depth`
+    and deepening from depth 1 to `depth` with a shared context, the time to reach the depth
+    """
+    print(f'{"engine":<12}{"nodes":>10}{"time":>8}{"nodes deepening":>18}{"time to depth":>15}{"same value":>12}')
+    reference = None
+    for engine in minimax.ENGINES:
+        nodes, elapsed, nodes_id, elapsed_id = 0, 0.0, 0, 0.0
+        values = []
+        for moves in BENCHMARK_POSITIONS:
+            board, player = board_from_moves(moves), player_on_turn(moves)
+            key = minimax.zobrist_key(board)
+
+            context = minimax.SearchContext()
+            tic = time.perf_counter()
+            values.append(minimax.search_root(board, player, depth, context, key, engine))
+            elapsed += time.perf_counter() - tic
+            nodes += context.nodes
+
+            context = minimax.SearchContext()
+            value = 0
+            tic = time.perf_counter()
+            for iteration in range(1, depth + 1):
+                value = minimax.search_root(board, player, iteration, context, key, engine, value)
+                context.pv = minimax.principal_variation(board, player, context, key, iteration)
+            elapsed_id += time.perf_counter() - tic
+            nodes_id += context.nodes
+        if reference is None:
+            reference = values
+        print(f'{engine:<12}{nodes:>10}{elapsed:>7.2f}s{nodes_id:>18}{elapsed_id:>14.2f}s{str(values == reference):>12}')
+
+
+def bench_mirror_keys(plies: int = 8):
+    """
+    Counts the positions reachable without a win after every ply and the ones left, when a position
+    and its mirror image share a key
+    """
+    print(f'{"ply":<6}{"positions":>12}{"canonical":>12}{"ratio":>8}')
+    layer = {(0, 0)}  # position of the player on turn and all pieces
+    for ply in range(1, plies + 1):
+        children = set()
+        for position, mask in layer:
+            for col in range(7):
+                move = (mask + (1 << (col * 7))) & (0b111111 << (col * 7))
+                if move and not bit_connected_four(position | move):
+                    children.add((position ^ mask, mask | move))
+        layer = children
+        canonical = {canonical_key(position, mask)[0] for position, mask in layer}
+        print(f'{ply:<6}{len(layer):>12}{len(canonical):>12}{len(layer) / len(canonical):>8.2f}')
+
+
+def bench_batch_evaluation(n: int = 20000):
+    """
+    Compares scoring a stack of boards with evaluate_boards against one evaluate_curr_board call per board and player
+    """
+    rng = np.random.default_rng(10)
+    boards = rng.integers(0, 3, size=(n, 6, 7)).astype(BoardPiece)
+    tic = time.perf_counter()
+    minimax.evaluate_boards(boards)
+    batch = time.perf_counter() - tic
+    tic = time.perf_counter()
+    for board in boards[:1000]:
+        minimax.evaluate_curr_board(board, PLAYER1)
+        minimax.evaluate_curr_board(board, PLAYER2)
+    single = (time.perf_counter() - tic) / 1000
+    print(f'evaluate_boards: {batch / n * 1e6:.1f} us per board, evaluate_curr_board: {single * 1e6:.1f} us per board')
+
+
+if __name__ == '__main__':
+    bench_transposition_table()
+    print()
+    bench_move_ordering()
+    print()
+    bench_nodes_per_second()
+    print()
+    bench_batch_evaluation()
+    print()
+    bench_engines()
+    print()
+    bench_mirror_keys()
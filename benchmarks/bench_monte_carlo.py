@@ -0,0 +1,592 @@
+"""
+Benchmarks of the Monte Carlo tree search agent.
+Run from the repository root with: python -m benchmarks.bench_monte_carlo
+"""
+import gc
+import os
+import random
+import sys
+import time
+from typing import Tuple
+import numpy as np
+from agents.common import initialize_game_state, apply_player_action, check_end_state, check_end_state_incremental, \
+    GameState, SavedState, BitBoard, BoardPiece, PLAYER1, PLAYER2, encode_bitboards, decode_bitboards
+from agents.agents_montecarlo import monte_carlo
+from agents.agents_montecarlo.monte_carlo import Node, Tree, FULL
+from agents.agents_montecarlo.array_tree import ArrayTree, array_mcts
+from agents.agents_montecarlo.graph_search import Graph, graph_mcts, position_key
+from agents.threats import Threats
+from agents.windows import ROWS, COLS, WINDOW_MASKS, WINDOW_INDICES, CELL_WINDOWS
+
+
+def scan_selection(node: Node, tree: Tree) -> Node:
+    """
+    The former selection, the best UCB1 score of all nodes of the tree, O(total nodes) per iteration
+    """
+    if (node.parent is None) and (len(node.children) < 7):
+        return node
+    best_score = {item: monte_carlo.upper_confidence_bound(item) for item in tree.nodes if not item.explored}
+    return max(best_score, key=best_score.get)
+
+
+def iterations_per_second(select, iterations: int = 4000, bucket: int = 500, seed: int = 15):
+    """
+    Runs the iterations of the search from the empty board and measures the rate of every `bucket` iterations
+    Arguments:
+        select: selection function
+        iterations: number of iterations
+        bucket: number of iterations per measurement
+        seed: seed of the rollouts
+    Return:
+        List[Tuple[int, float]]: size of the tree and iterations per second of every bucket
+    """
+    random.seed(seed)
+    board = initialize_game_state()
+    root = Node(board_state=board, player=PLAYER1)
+    tree = Tree(root)
+    rates = []
+    tic = time.perf_counter()
+    for i in range(1, iterations + 1):
+        node = select(root, tree)
+        new_node, tree = monte_carlo.expansion(node, tree)
+        outcome = monte_carlo.simulation(new_node, new_node.parent.board_state.copy())
+        if outcome != FULL:
+            monte_carlo.backpropagation(new_node, outcome, tree)
+        elif new_node.parent is not root:
+            new_node.parent.explored = True
+        if i % bucket == 0:
+            toc = time.perf_counter()
+            rates.append((len(tree.nodes), bucket / (toc - tic)))
+            tic = toc
+    return rates
+
+
+def bench_selection(iterations: int = 4000, bucket: int = 500):
+    """
+    Compares iterations per second against the size of the tree of the tree descent and the former scan
+    """
+    descent = iterations_per_second(monte_carlo.selection, iterations, bucket)
+    scan = iterations_per_second(scan_selection, iterations, bucket)
+    print(f'{"tree size":>10}{"descent it/s":>14}{"scan it/s":>12}')
+    for (size, rate), (_, scan_rate) in zip(descent, scan):
+        print(f'{size:>10}{rate:>14.0f}{scan_rate:>12.0f}')
+
+
+def ndarray_rollout(board: np.ndarray, on_turn) -> int:
+    """
+    The former rollout, random moves on the ndarray board checked with check_end_state_incremental
+    """
+    player = on_turn
+    moves = np.count_nonzero(board)
+    while True:
+        free = [col for col in range(7) if board[-1, col] == 0]
+        if not free:
+            return monte_carlo.DRAW
+        move = random.choice(free)
+        row = np.count_nonzero(board[:, move])
+        apply_player_action(board, move, player)
+        moves += 1
+        state = check_end_state_incremental(board, player, (row, move), moves)
+        if state == GameState.IS_WIN:
+            return monte_carlo.LOST if player == on_turn else monte_carlo.WIN
+        if state == GameState.IS_DRAW:
+            return monte_carlo.DRAW
+        player = PLAYER2 if player == PLAYER1 else PLAYER1
+
+
+def cell_window_table():
+    """
+    Returns the windows of every cell row * COLS + col padded to 13 with window 0, and a mask of the windows
+    that belong to the cell
+    """
+    size = max(len(CELL_WINDOWS[row][col]) for row in range(ROWS) for col in range(COLS))
+    table = np.zeros((ROWS * COLS, size), dtype=np.intp)
+    valid = np.zeros((ROWS * COLS, size), dtype=bool)
+    for row in range(ROWS):
+        for col in range(COLS):
+            windows = CELL_WINDOWS[row][col]
+            table[row * COLS + col, :len(windows)] = windows
+            valid[row * COLS + col, :len(windows)] = True
+    return table, valid
+
+
+CELL_WINDOW_TABLE, CELL_WINDOW_VALID = cell_window_table()
+
+
+def batch_rollouts(board: np.ndarray, player: BoardPiece, rollouts: int, rng: np.random.Generator) \
+        -> Tuple[int, int, int]:
+    """
+    The former batch rollouts, kept as the baseline of bench_rollouts: plays `rollouts` random games from a board
+    that is not over in lockstep, as one (rollouts, 42) array.
+    Every ply a random legal column is drawn for all running games at once and only the windows
+    through the new pieces are checked.
+    Arguments:
+        board: ndarray representation of the board
+        player: the player on turn
+        rollouts: number of games
+        rng: random generator of the moves
+    Return:
+        Tuple[int, int, int]: number of games won, drawn and lost by `player`
+    """
+    boards = np.repeat(board.reshape(1, -1), rollouts, axis=0)
+    heights = np.repeat(np.count_nonzero(board, axis=0)[np.newaxis], rollouts, axis=0)
+    games = np.arange(rollouts)  # running games
+    wins, losses = 0, 0
+    on_turn = player
+    for moves in range(np.count_nonzero(board), ROWS * COLS):
+        n = games.size
+        game_heights = heights[games]
+        keys = rng.random((n, COLS))
+        keys[game_heights >= ROWS] = -1.0  # full columns are never drawn
+        cols = keys.argmax(axis=1)
+        cells = game_heights[np.arange(n), cols] * COLS + cols
+        boards[games, cells] = on_turn
+        heights[games, cols] += 1
+
+        pieces = boards[games[:, np.newaxis, np.newaxis], WINDOW_INDICES[CELL_WINDOW_TABLE[cells]]]  # (n, 13, 4)
+        won = np.any(np.all(pieces == on_turn, axis=2) & CELL_WINDOW_VALID[cells], axis=1)
+        if on_turn == player:
+            wins += int(np.count_nonzero(won))
+        else:
+            losses += int(np.count_nonzero(won))
+        games = games[~won]
+        if games.size == 0:
+            break
+        on_turn = monte_carlo.other_player(on_turn)
+    return wins, rollouts - wins - losses, losses
+
+
+def bench_tree_reuse(moves: int = 6, period: float = 1.0, seed: int = 16):
+    """
+    Plays the search against random replies and against the replies the tree predicts, the most visited ones,
+    and prints the visits at the root inherited from the previous move
+    """
+    period_of_time = monte_carlo.PERIOD_OF_TIME
+    monte_carlo.PERIOD_OF_TIME = period
+    print(f'{"replies":<11}{"move":>6}{"inherited":>11}{"visits":>9}{"tree size":>11}')
+    try:
+        for replies in ('random', 'predicted'):
+            random.seed(seed)
+            board = initialize_game_state()
+            saved_state = None
+            for i in range(moves):
+                saved_state = SavedState(monte_carlo.reuse_tree(saved_state, board, PLAYER1))
+                inherited = saved_state.computational_result.root.simulations
+                action, saved_state = monte_carlo.generate_move_montecarlo(board, PLAYER1, saved_state,
+                                                                          use_book=False)
+                tree = saved_state.computational_result
+                print(f'{replies:<11}{i + 1:>6}{inherited:>11}{tree.root.simulations:>9}{len(tree.nodes):>11}')
+                apply_player_action(board, action, PLAYER1)
+                if check_end_state(board, PLAYER1) != GameState.STILL_PLAYING:
+                    break
+                child = next(child for child in tree.root.children if child.move == action)
+                if replies == 'predicted' and child.children:
+                    reply = max(child.children, key=lambda node: node.simulations).move
+                else:
+                    reply = random.choice([col for col in range(7) if board[-1, col] == 0])
+                apply_player_action(board, reply, PLAYER2)
+                if check_end_state(board, PLAYER2) != GameState.STILL_PLAYING:
+                    break
+    finally:
+        monte_carlo.PERIOD_OF_TIME = period_of_time
+
+
+def bench_rollouts(seconds: float = 2.0):
+    """
+    Compares playouts per second of the former rollout on ndarrays, of the bitboard rollouts and of batch_rollouts
+    with several batch sizes, from the empty board and from a midgame position, and the playouts per second
+    of the whole search
+    """
+    midgame = initialize_game_state()
+    for i, col in enumerate([3, 3, 2, 4, 4, 2, 1, 5, 3, 3, 2, 4]):
+        apply_player_action(midgame, col, PLAYER1 if i % 2 == 0 else PLAYER2)
+    print(f'{"rollouts":<18}{"empty board":>14}{"midgame":>12}')
+    for label, batch in [('ndarray', 0), ('bitboard', -1), ('bitboard 32', -32), ('batch 1', 1), ('batch 8', 8),
+                         ('batch 32', 32), ('batch 128', 128), ('batch 512', 512)]:
+        rates = []
+        for board in (initialize_game_state(), midgame):
+            rng = np.random.default_rng(18)
+            random.seed(18)
+            playouts = 0
+            tic = time.perf_counter()
+            while time.perf_counter() - tic < seconds / 2:
+                if batch > 0:
+                    batch_rollouts(board, PLAYER1, batch, rng)
+                    playouts += batch
+                elif batch < -1:
+                    monte_carlo.bitboard_rollouts(board, PLAYER1, -batch)
+                    playouts -= batch
+                elif batch == -1:
+                    monte_carlo.rollout(board, PLAYER1)
+                    playouts += 1
+                else:
+                    ndarray_rollout(board.copy(), PLAYER1)
+                    playouts += 1
+            rates.append(playouts / (time.perf_counter() - tic))
+        print(f'{label:<18}{rates[0]:>14.0f}{rates[1]:>12.0f}')
+
+    print(f'{"search rollouts":<18}{"it/s":>14}{"playouts/s":>12}')
+    for rollouts in (1, 8, 32, 128):
+        random.seed(18)
+        board = initialize_game_state()
+        root = Node(board_state=board, player=PLAYER1)
+        tree = Tree(root)
+        tic = time.perf_counter()
+        monte_carlo.MCTS(root, board, tree, seconds, rollouts)
+        elapsed = time.perf_counter() - tic
+        print(f'{rollouts:<18}{len(tree.nodes) / elapsed:>14.0f}{root.simulations / elapsed:>12.0f}')
+
+
+def object_tree_bytes(tree: Tree) -> int:
+    """
+    Returns the bytes of the nodes of an object tree: objects, attribute dicts, lists of children,
+    boards and the list of nodes of the tree
+    """
+    total = sys.getsizeof(tree.nodes)
+    for node in [tree.root] + tree.nodes:
+        total += sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.children)
+        if node.board_state is not None:
+            total += sys.getsizeof(node.board_state)
+    return total
+
+
+def bench_tree_backends(seconds: float = 3.0):
+    """
+    Compares iterations per second, bytes per node and garbage collections of the object tree
+    and of the array tree from the empty board
+    """
+    print(f'{"backend":<10}{"nodes":>8}{"it/s":>8}{"bytes/node":>12}{"gc runs":>9}')
+    for backend in monte_carlo.TREE_BACKENDS:
+        random.seed(20)
+        gc.collect()
+        collections = sum(stats['collections'] for stats in gc.get_stats())
+        tic = time.perf_counter()
+        if backend == 'array':
+            tree = ArrayTree(BitBoard(), PLAYER1)
+            array_mcts(tree, seconds)
+            nodes, size = tree.nodes, tree.nbytes()
+        else:
+            board = initialize_game_state()
+            tree = Tree(Node(board_state=board, player=PLAYER1))
+            monte_carlo.MCTS(tree.root, board, tree, seconds)
+            nodes, size = len(tree.nodes) + 1, object_tree_bytes(tree)
+        elapsed = time.perf_counter() - tic
+        collections = sum(stats['collections'] for stats in gc.get_stats()) - collections
+        print(f'{backend:<10}{nodes:>8}{nodes / elapsed:>8.0f}{size / nodes:>12.0f}{collections:>9}')
+
+
+def bench_node_budget(seconds: float = 10.0, budgets=(None, 1200, 600)):
+    """
+    Searches from the empty board without and with node budgets and reports evictions and the peak memory
+    of the tree, the peak number of nodes times the bytes per node of the backend
+    """
+    print(f'{"backend":<10}{"budget":>8}{"it/s":>8}{"nodes":>8}{"peak":>8}{"evictions":>11}{"evicted":>9}'
+          f'{"peak kB":>9}')
+    for backend in monte_carlo.TREE_BACKENDS:
+        for max_nodes in budgets:
+            random.seed(21)
+            tic = time.perf_counter()
+            if backend == 'array':
+                tree = ArrayTree(BitBoard(), PLAYER1)
+                array_mcts(tree, seconds, max_nodes=max_nodes)
+                nodes, per_node = tree.nodes, tree.nbytes() / tree.nodes
+            else:
+                board = initialize_game_state()
+                tree = Tree(Node(board_state=board, player=PLAYER1))
+                monte_carlo.MCTS(tree.root, board, tree, seconds, max_nodes=max_nodes)
+                nodes = len(tree.nodes) + 1
+                per_node = object_tree_bytes(tree) / nodes
+            iterations = (nodes + tree.evicted_nodes) / (time.perf_counter() - tic)
+            print(f'{backend:<10}{str(max_nodes):>8}{iterations:>8.0f}{nodes:>8}{tree.peak_nodes:>8}'
+                  f'{tree.evictions:>11}{tree.evicted_nodes:>9}{tree.peak_nodes * per_node / 1000:>9.0f}')
+
+
+def bench_graph_search(seconds: float = 10.0, depths=(2, 3, 4, 5)):
+    """
+    Compares the array tree, one node per move order, with the graph of positions after searches
+    of the same time from the empty board: nodes, distinct positions and at several depths the mean visits
+    per node and per position, for the tree the largest visits among the nodes of a position
+    """
+    random.seed(22)
+    tree = ArrayTree(BitBoard(), PLAYER1)
+    array_mcts(tree, seconds, max_nodes=None)
+    tree_visits = {}
+    for index in range(tree.size):
+        if index == 0 or tree.move[index] >= 0:
+            bitboard, player = tree.bitboard(index)
+            key = position_key(bitboard, player)
+            tree_visits.setdefault((bitboard.moves, key), []).append(int(tree.visits[index]))
+    random.seed(22)
+    graph = Graph(BitBoard(), PLAYER1)
+    graph_mcts(graph, seconds, max_nodes=None)
+
+    print(f'{"search":<8}{"iterations":>11}{"nodes":>8}{"positions":>11}{"transpositions":>16}')
+    print(f'{"tree":<8}{tree.visits[0] // monte_carlo.ROLLOUTS:>11}{tree.nodes:>8}{len(tree_visits):>11}{"":>16}')
+    print(f'{"graph":<8}{graph.table[graph.root].visits // monte_carlo.ROLLOUTS:>11}{len(graph.table):>8}'
+          f'{len(graph.table):>11}{graph.transpositions:>16}')
+    print(f'{"depth":<8}{"tree nodes":>11}{"positions":>11}{"visits/node":>13}{"max node":>10}'
+          f'{"graph positions":>17}{"visits":>8}')
+    for depth in depths:
+        nodes = [node_visits for (moves, _), node_visits in tree_visits.items() if moves == depth]
+        visits = [sum(node_visits) for node_visits in nodes]
+        largest = [max(node_visits) for node_visits in nodes]
+        positions = [node.visits for node in graph.table.values() if node.moves == depth]
+        print(f'{depth:<8}{sum(map(len, nodes)):>11}{len(nodes):>11}{sum(visits) / sum(map(len, nodes)):>13.0f}'
+              f'{sum(largest) / len(nodes):>10.0f}{len(positions):>17}{sum(positions) / len(positions):>8.0f}')
+
+
+def bench_fixed_work(iterations: int = 1000, repeats: int = 3, seed: int = 23):
+    """
+    Times every backend on the same seeded search of `iterations` iterations from the empty board, the same work
+    on every run, and prints the fastest of `repeats` runs and the spread of the runs
+    """
+    print(f'{"backend":<10}{"iterations":>11}{"best s":>9}{"spread":>9}{"root visits":>13}')
+    for backend in monte_carlo.TREE_BACKENDS:
+        times, visits = [], set()
+        for _ in range(repeats):
+            tic = time.perf_counter()
+            if backend == 'array':
+                tree = ArrayTree(BitBoard(), PLAYER1)
+                array_mcts(tree, max_iterations=iterations, seed=seed)
+                visits.add(int(tree.visits[0]))
+            elif backend == 'graph':
+                graph = Graph(BitBoard(), PLAYER1)
+                graph_mcts(graph, max_iterations=iterations, seed=seed)
+                visits.add(graph.table[graph.root].visits)
+            else:
+                board = initialize_game_state()
+                tree = Tree(Node(board_state=board, player=PLAYER1))
+                monte_carlo.MCTS(tree.root, board, tree, max_iterations=iterations, seed=seed)
+                visits.add(tree.root.simulations)
+            times.append(time.perf_counter() - tic)
+        assert len(visits) == 1  # the same tree every time
+        print(f'{backend:<10}{iterations:>11}{min(times):>9.2f}{(max(times) - min(times)) / min(times):>9.1%}'
+              f'{visits.pop():>13}')
+
+
+def string_position_mask_bitmap(player, board: np.ndarray):
+    """
+    The former get_position_mask_bitmap, a string of bits per board
+    """
+    position, mask = '', ''
+    for j in range(6, -1, -1):
+        mask += '0'
+        position += '0'
+        for i in range(0, 6):
+            mask += ['0', '1'][board[i, j] != 0]
+            position += ['0', '1'][board[i, j] == player]
+    return int(position, 2), int(mask, 2)
+
+
+def bench_encoding(boards: int = 512, seconds: float = 1.0, seed: int = 24):
+    """
+    Compares the boards per second converted to bitboards by the former string encoding, by encode_bitboards
+    one board at a time and on stacks of boards, and by BitBoard.from_array, and of decode_bitboards,
+    and times evaluate which encodes two boards per call
+    """
+    rng = np.random.default_rng(seed)
+    stack = []
+    for _ in range(boards):
+        board = initialize_game_state()
+        for i in range(rng.integers(0, 43)):
+            free = [col for col in range(7) if board[5, col] == 0]
+            apply_player_action(board, rng.choice(free), PLAYER1 if i % 2 == 0 else PLAYER2)
+        stack.append(board)
+    stack = np.stack(stack)
+    positions, masks = encode_bitboards(stack, PLAYER1)
+
+    def rate(convert, per_call):
+        calls = 0
+        tic = time.perf_counter()
+        while time.perf_counter() - tic < seconds:
+            convert(calls % boards)
+            calls += 1
+        return calls * per_call / (time.perf_counter() - tic)
+
+    print(f'{"conversion":<22}{"boards/s":>12}')
+    for label, convert, per_call in [
+            ('strings', lambda i: string_position_mask_bitmap(PLAYER1, stack[i]), 1),
+            ('encode 1', lambda i: encode_bitboards(stack[i], PLAYER1), 1),
+            ('encode 64', lambda i: encode_bitboards(stack[:64], PLAYER1), 64),
+            (f'encode {boards}', lambda i: encode_bitboards(stack, PLAYER1), boards),
+            ('BitBoard.from_array', lambda i: BitBoard.from_array(stack[i]), 1),
+            ('decode 1', lambda i: decode_bitboards(int(positions[i]), int(masks[i]), PLAYER1), 1),
+            (f'decode {boards}', lambda i: decode_bitboards(positions, masks, PLAYER1), boards)]:
+        print(f'{label:<22}{rate(convert, per_call):>12.0f}')
+
+    nodes = [(Node(board_state=stack[i], player=PLAYER1), stack[i - 1]) for i in range(1, boards)]
+    calls = 0
+    tic = time.perf_counter()
+    while time.perf_counter() - tic < seconds:
+        node, board_before = nodes[calls % len(nodes)]
+        monte_carlo.evaluate(node, PLAYER2, board_before)
+        calls += 1
+    print(f'{"evaluate calls/s":<22}{calls / (time.perf_counter() - tic):>12.0f}')
+
+
+def window_number_of_connected(position: int, mask: int) -> int:
+    """
+    The former number_of_connected, one test per window
+    """
+    opp_pos = mask ^ position
+    connected = 1
+    for window in WINDOW_MASKS:
+        if not window & opp_pos:
+            count = bin(window & position).count('1')
+            if count > connected:
+                connected = count
+                if connected == 4:
+                    break
+    return connected
+
+
+def string_connected_three(position: int, mask: int) -> bool:
+    """
+    The former connected_three, formats the bitboards as strings of bits
+    """
+    opp_pos = mask ^ position
+
+    # Diagonal /
+    m = position & (position >> 8)
+    if m & (m >> 8):
+        bits = "{0: 049b}".format(m & (m >> 8))
+        foo = [len(bits) - i - 1 for i in range(0, len(bits)) if bits[i] == '1']
+        for j in range(len(foo)):
+            if ((opp_pos >> int(foo[j] + 24)) & 1) != 1 and foo[j] + 24 < 49:  # one piece before
+                return True
+            elif foo[j] >= 8 and ((opp_pos >> int(foo[j] - 8)) & 1) != 1:  # one piece after
+                return True
+
+    # Diagonal \
+    m = position & (position >> 6)
+    if m & (m >> 6):
+        bits = "{0: 049b}".format(m & (m >> 6))
+        foo = [len(bits) - i - 1 + 6 for i in range(0, len(bits)) if bits[i] == '1']
+        for j in range(len(foo)):
+            if ((opp_pos >> int(foo[j] + 12)) & 1) != 1 and foo[j] + 12 < 49:  # one piece before
+                return True
+            elif foo[j] >= 12 and ((opp_pos >> int(foo[j] - 12)) & 1) != 1 and foo[j] - 12 % 6 == 0:  # one piece after
+                return True
+
+    # Horizontal
+    m = position & (position >> 7)
+    b = m & (m >> 7)
+    if b:
+        bits = "{0: 049b}".format(b)
+        foo = [len(bits) - i - 1 + 7 for i in range(0, len(bits)) if bits[i] == '1']
+        for j in range(len(foo)):
+            if ((opp_pos >> int(foo[j] + 14)) & 1) != 1 and foo[j] + 14 < 49:  # one piece before
+                return True
+            elif foo[j] >= 14 and ((opp_pos >> int(foo[j] - 14)) & 1) != 1:  # one piece after
+                return True
+
+    # Vertical
+    m = position & (position >> 1)
+    t = m & (m >> 1)
+    if t:
+        bits = "{0: 049b}".format(t)
+        foo = [len(bits) - i for i in range(0, len(bits)) if bits[i] == '1']
+        for j in range(len(foo)):
+            if foo[j] >= 2 and ((opp_pos >> int(foo[j] - 2)) & 1) != 1:  # one piece after
+                return True
+
+    # Nothing found
+    return False
+
+
+def bench_threats(positions: int = 512, seconds: float = 1.0, seed: int = 25):
+    """
+    Compares the calls per second of the former number_of_connected and connected_three with threats.Threats,
+    which finds the winning cells and counts the windows of three, two and one pieces in one pass,
+    and of evaluate_move, which calls number_of_connected three times
+    """
+    rng = np.random.default_rng(seed)
+    bitboards = []
+    for _ in range(positions):
+        bitboard = BitBoard()
+        for i in range(rng.integers(0, 30)):
+            bitboard.play(rng.choice([col for col in range(7) if bitboard.can_play(col)]), PLAYER1 if i % 2 == 0
+                          else PLAYER2)
+        bitboards.append((bitboard.pieces[0], bitboard.mask))
+
+    print(f'{"function":<26}{"calls/s":>12}')
+    for label, function in [('former number_of_connected', window_number_of_connected),
+                            ('number_of_connected', monte_carlo.number_of_connected),
+                            ('former connected_three', string_connected_three),
+                            ('connected_three', monte_carlo.connected_three),
+                            ('Threats', Threats),
+                            ('evaluate_move', lambda position, mask: monte_carlo.evaluate_move(
+                                position, mask ^ position, position & -position))]:
+        calls = 0
+        tic = time.perf_counter()
+        while time.perf_counter() - tic < seconds:
+            function(*bitboards[calls % positions])
+            calls += 1
+        print(f'{label:<26}{calls / (time.perf_counter() - tic):>12.0f}')
+
+
+def play_game(agents, period: float) -> int:
+    """
+    Plays one game between two root parallel searches
+    Arguments:
+        agents: number of workers of PLAYER1 and PLAYER2
+        period: in sec; time per move
+    Return:
+        int: 1 when PLAYER1 wins, -1 when PLAYER2 wins, 0 for a draw
+    """
+    board = initialize_game_state()
+    while True:
+        for workers, player in zip(agents, (PLAYER1, PLAYER2)):
+            statistics, _ = monte_carlo.root_parallel_search(board, player, workers, period)
+            apply_player_action(board, monte_carlo.best_parallel_move(statistics), player)
+            state = check_end_state(board, player)
+            if state == GameState.IS_WIN:
+                return 1 if player == PLAYER1 else -1
+            if state == GameState.IS_DRAW:
+                return 0
+
+
+def bench_root_parallel(worker_counts=None, period: float = 1.0, games: int = 4, game_period: float = 0.5):
+    """
+    Scaling report of the root parallel search: iterations per second from the empty board and the score
+    against the same search with one worker, half of the games with each color
+    """
+    if worker_counts is None:
+        worker_counts = sorted({1, 2} | {2 ** i for i in range(os.cpu_count().bit_length())} | {os.cpu_count()})
+    print(f'{os.cpu_count()} cores')
+    print(f'{"workers":>8}{"it/s":>10}{"speedup":>9}{"score vs 1":>12}')
+    base = None
+    for workers in worker_counts:
+        monte_carlo.get_pool(workers)  # start the processes outside of the measurement
+        _, iterations = monte_carlo.root_parallel_search(initialize_game_state(), PLAYER1, workers, period, seed=17)
+        rate = iterations / period
+        base = base or rate
+        score = 0
+        for game in range(games):
+            if game % 2 == 0:
+                score += play_game((workers, 1), game_period)
+            else:
+                score -= play_game((1, workers), game_period)
+        print(f'{workers:>8}{rate:>10.0f}{rate / base:>9.2f}{(score + games) / (2 * games):>12.0%}')
+
+
+if __name__ == '__main__':
+    bench_selection()
+    print()
+    bench_rollouts()
+    print()
+    bench_tree_reuse()
+    print()
+    bench_tree_backends()
+    print()
+    bench_node_budget()
+    print()
+    bench_graph_search()
+    print()
+    bench_fixed_work()
+    print()
+    bench_encoding()
+    print()
+    bench_threats()
+    print()
+    bench_root_parallel()
@@ -0,0 +1,57 @@
+"""
+Benchmarks of the perfect play solver on random positions.
+Run from the repository root with: python -m benchmarks.bench_solver
+"""
+import random
+import time
+from agents.common import BitBoard, BoardPiece
+from agents.agents_solver.solver import Solver, encode
+
+
+def random_positions(pieces: int, n: int, seed: int = 12):
+    """
+    Returns `n` random positions with `pieces` pieces and without four in a row
+    Arguments:
+        pieces: number of pieces of every position
+        n: number of positions
+        seed: seed of the random moves
+    Return:
+        List[BitBoard]: the positions
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < n:
+        bitboard = BitBoard()
+        for i in range(pieces):
+            player = BoardPiece(i % 2 + 1)
+            bitboard.play(rng.choice([col for col in range(7) if bitboard.can_play(col)]), player)
+            if bitboard.is_win(player):
+                break
+        else:
+            positions.append(bitboard)
+    return positions
+
+
+def bench_solve(n: int = 10):
+    """
+    Measures the time and the nodes to solve random positions, strong and weak
+    """
+    print(f'{"pieces":<8}{"mean time":>11}{"max time":>10}{"mean nodes":>12}{"weak time":>11}')
+    for pieces in (28, 24, 20, 16):
+        times, nodes, weak_times = [], [], []
+        for bitboard in random_positions(pieces, n):
+            position, mask, moves = encode(bitboard, BoardPiece(pieces % 2 + 1))
+            solver = Solver()
+            tic = time.perf_counter()
+            solver.solve(position, mask, moves)
+            times.append(time.perf_counter() - tic)
+            nodes.append(solver.nodes)
+            tic = time.perf_counter()
+            Solver().solve(position, mask, moves, weak=True)
+            weak_times.append(time.perf_counter() - tic)
+        print(f'{pieces:<8}{sum(times) / n:>10.3f}s{max(times):>9.3f}s{sum(nodes) / n:>12.0f}'
+              f'{sum(weak_times) / n:>10.3f}s')
+
+
+if __name__ == '__main__':
+    bench_solve()
@@ -76,5 +76,5 @@ def human_vs_agent(
 
 
 if __name__ == '__main__':
-    human_vs_agent(generate_move_montecarlo)
+    human_vs_agent(generate_move_montecarlo, args_1=(True,))  # use_book, the opening book when it was built
 
@@ -0,0 +1,181 @@
+from agents.common import initialize_game_state, apply_player_action, BoardPiece, BitBoard, SavedState
+
+
+def test_expand():
+    from agents.agents_montecarlo.array_tree import ArrayTree
+
+    tree = ArrayTree(BitBoard(), BoardPiece(1), capacity=8)
+    child = tree.expand(0, 3)
+    grandchild = tree.expand(child, 4)
+    sibling = tree.expand(0, 2)
+    assert (child, sibling) == (1 + 3, 1 + 2)  # one block of seven slots for the children of the root
+    assert tree.nodes == 4 and tree.size == 1 + 7 + 7
+    assert len(tree.visits) >= tree.size  # the arrays grew
+    assert tree.parent[grandchild] == child
+    assert tree.children[0] == 2 and tree.children[child] == 1
+    assert tree.path(grandchild) == [3, 4]
+
+    bitboard, player = tree.bitboard(grandchild)
+    board = initialize_game_state()
+    apply_player_action(board, 3, BoardPiece(1))
+    apply_player_action(board, 4, BoardPiece(2))
+    assert bitboard.pieces == BitBoard.from_array(board).pieces
+    assert player == BoardPiece(1)
+
+
+def test_evaluate_move():
+    import random
+    from agents.agents_montecarlo.monte_carlo import Node, evaluate, evaluate_move
+
+    random.seed(20)
+    for _ in range(200):
+        board = initialize_game_state()
+        player = BoardPiece(1)
+        for _ in range(random.randrange(1, 30)):
+            col = random.choice([col for col in range(7) if board[-1, col] == 0])
+            board_before = board.copy()
+            apply_player_action(board, col, player)
+            player = BoardPiece(3 - player)
+        # `player` is on turn, the other player made the move into `col`
+        node = Node(board_state=board, player=player)
+        bitboard = BitBoard.from_array(board)
+        mover = 3 - player
+        move = 1 << (bitboard.heights[col] - 1)
+        assert evaluate_move(bitboard.pieces[mover - 1], bitboard.pieces[player - 1], move) \
+            == evaluate(node, BoardPiece(mover), board_before)
+
+
+def test_array_mcts():
+    from agents.agents_montecarlo.array_tree import ArrayTree, array_mcts
+
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    tree = ArrayTree(BitBoard.from_array(board), BoardPiece(1))
+    assert array_mcts(tree, rollouts=8, max_iterations=200, seed=20) == 3  # the winning move
+
+    # every node was simulated with 8 rollouts and all of them reached the root
+    nodes = [index for index in range(1, tree.size) if tree.move[index] >= 0]
+    assert len(nodes) + 1 == tree.nodes
+    assert tree.visits[0] == 8 * len(nodes)
+    for index in nodes:
+        first = tree.first_child[index]
+        below = sum(tree.visits[first + col] for col in range(7) if first >= 0 and tree.move[first + col] >= 0)
+        assert tree.visits[index] == 8 + below
+
+
+def test_array_mcts_win():
+    from agents.agents_montecarlo.array_tree import ArrayTree, array_mcts
+
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    tree = ArrayTree(BitBoard.from_array(board), BoardPiece(1))
+    array_mcts(tree, rollouts=8, max_iterations=7, seed=20)
+    # the first seven iterations expand the moves of the root, the winning move is won by every rollout
+    first = tree.first_child[0]
+    assert tree.children[0] == 7
+    assert (tree.visits[first + 3], tree.wins[first + 3]) == (8, 8)
+
+
+def test_reuse_array_tree():
+    from agents.agents_montecarlo.array_tree import ArrayTree, array_mcts, reuse_array_tree
+
+    board = initialize_game_state()
+    tree = ArrayTree(BitBoard(), BoardPiece(1))
+    array_mcts(tree, rollouts=4, max_iterations=300, seed=20)
+    assert reuse_array_tree(SavedState(tree), BitBoard(), BoardPiece(1)) is tree
+
+    child = max((index for index in range(1, 8) if tree.move[index] >= 0), key=lambda index: tree.visits[index])
+    first = tree.first_child[child]
+    assert first >= 0  # the most visited move was expanded
+    grandchild = max((first + col for col in range(7) if tree.move[first + col] >= 0),
+                     key=lambda index: tree.visits[index])
+    apply_player_action(board, int(tree.move[child]), BoardPiece(1))
+    apply_player_action(board, int(tree.move[grandchild]), BoardPiece(2))
+    subtree = reuse_array_tree(SavedState(tree), BitBoard.from_array(board), BoardPiece(1))
+    assert subtree.board.pieces == BitBoard.from_array(board).pieces
+    assert subtree.visits[0] == tree.visits[grandchild]
+    # the same nodes with the same statistics in a compact copy
+    assert subtree.nodes == 1 + sum(1 for index in range(tree.size)
+                                    if tree.move[index] >= 0 and grandchild in ancestors(tree, index))
+    assert subtree.size <= tree.size
+    array_mcts(subtree, rollouts=4, max_iterations=50, seed=21)
+
+    apply_player_action(board, 6, BoardPiece(1))
+    apply_player_action(board, 6, BoardPiece(2))
+    assert reuse_array_tree(SavedState(tree), BitBoard.from_array(board), BoardPiece(1)).nodes == 1
+
+
+def ancestors(tree, index):
+    while index > 0:
+        index = int(tree.parent[index])
+        yield index
+
+
+def test_generate_move_array_backend():
+    import pytest
+    from agents.agents_montecarlo.monte_carlo import generate_move_montecarlo
+    from agents.agents_montecarlo.array_tree import ArrayTree
+
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    move, saved_state = generate_move_montecarlo(board, BoardPiece(1), None, use_book=False, backend='array',
+                                                 max_iterations=200, seed=20)
+    assert move == 3
+    assert isinstance(saved_state.computational_result, ArrayTree)
+    with pytest.raises(ValueError):
+        generate_move_montecarlo(board, BoardPiece(1), None, use_book=False, backend='list')
+
+
+def test_evict(monkeypatch):
+    import math
+    from agents.agents_montecarlo import array_tree
+    from agents.agents_montecarlo.array_tree import ArrayTree, array_mcts
+
+    monkeypatch.setattr(array_tree, 'EVICTION_DEPTH', 2)
+    tree = ArrayTree(BitBoard(), BoardPiece(1))
+    array_mcts(tree, rollouts=4, max_nodes=None, max_iterations=300, seed=21)
+    visits = tree.visits[0]
+    paths = {tuple(tree.path(index)): (tree.visits[index], tree.wins[index], tree.value[index])
+             for index in range(tree.size) if tree.move[index] >= 0 or index == 0}
+    size = tree.nodes
+
+    # nodes up to EVICTION_DEPTH moves below the root are never removed, the budget leaves room for them
+    near_root = 1 + sum(1 for path in paths if 0 < len(path) <= 2)
+    max_nodes = max(size // 2, math.ceil(near_root / array_tree.EVICTION_RATIO))
+    assert max_nodes < size
+    removed = tree.evict(max_nodes)
+    assert removed == size - tree.nodes
+    assert tree.nodes <= max_nodes * array_tree.EVICTION_RATIO
+    assert tree.evictions > 0 and tree.evicted_nodes == removed and tree.peak_nodes == size
+    assert tree.visits[0] == visits
+    # the nodes left are a part of the old tree with the same statistics, near the root nothing is missing
+    left = {tuple(tree.path(index)): (tree.visits[index], tree.wins[index], tree.value[index])
+            for index in range(tree.size) if tree.move[index] >= 0 or index == 0}
+    assert len(left) == tree.nodes
+    assert all(paths[path] == statistics for path, statistics in left.items())
+    assert {path for path in paths if len(path) <= 2} <= set(left)
+    for index in range(1, tree.size):
+        if tree.move[index] >= 0:
+            first = tree.first_child[index]
+            children = [first + col for col in range(7) if first >= 0 and tree.move[first + col] >= 0]
+            assert tree.children[index] == len(children)
+            assert tree.visits[index] >= sum(tree.visits[child] for child in children)
+
+    array_mcts(tree, rollouts=4, max_nodes=max_nodes, max_iterations=200, seed=22)
+    assert tree.nodes < max_nodes
+    assert tree.visits[0] > visits
+
+
+def test_array_mcts_seed():
+    from agents.agents_montecarlo.array_tree import ArrayTree, FIELDS, array_mcts
+
+    trees = []
+    for seed in (23, 23, 24):
+        tree = ArrayTree(BitBoard(), BoardPiece(1))
+        array_mcts(tree, rollouts=8, max_iterations=150, seed=seed)
+        trees.append([getattr(tree, name)[:tree.size].tolist() for name, _, _ in FIELDS])
+        assert tree.visits[0] == 150 * 8
+    assert trees[0] == trees[1] and trees[0] != trees[2]
@@ -274,3 +274,177 @@ def test_string_to_board():
                '|==============|\n' \
                '|0 1 2 3 4 5 6 |'
     assert np.all(string_to_board(boardStr) == board)
+
+
+def test_bitboard():
+    from agents.common import BitBoard, GameState, PLAYER1, PLAYER2, initialize_game_state, apply_player_action
+    bitboard = BitBoard()
+    board = initialize_game_state()
+    assert bitboard.moves == 0
+    assert np.all(bitboard.to_array() == board)
+
+    # play and compare with the ndarray version
+    for col, player in [(3, PLAYER1), (3, PLAYER2), (2, PLAYER1), (4, PLAYER2), (1, PLAYER1), (1, PLAYER2)]:
+        bitboard.play(col, player)
+        apply_player_action(board, col, player)
+    assert bitboard.moves == 6
+    assert np.all(bitboard.to_array() == board)
+    assert BitBoard.from_array(board) == bitboard
+    assert not bitboard.is_win(PLAYER1)
+    assert bitboard.end_state(PLAYER1) == GameState.STILL_PLAYING
+
+    # horizontal win and undo
+    bitboard.play(0, PLAYER1)
+    assert bitboard.is_win(PLAYER1)
+    assert bitboard.end_state(PLAYER1) == GameState.IS_WIN
+    assert bitboard.undo() == 0
+    assert not bitboard.is_win(PLAYER1)
+    assert np.all(bitboard.to_array() == board)
+
+    # full column
+    for i in range(6):
+        assert bitboard.can_play(6)
+        bitboard.play(6, PLAYER1 if i % 2 else PLAYER2)
+    assert not bitboard.can_play(6)
+
+    # draw
+    board[0, 0:7] = [2, 1, 2, 2, 2, 1, 2]
+    board[1, 0:7] = [2, 2, 1, 2, 1, 1, 2]
+    board[2, 0:7] = [1, 1, 1, 2, 1, 1, 1]
+    board[3, 0:7] = [2, 2, 1, 1, 1, 2, 2]
+    board[4, 0:7] = [1, 1, 2, 2, 2, 1, 2]
+    board[5, 0:7] = [2, 1, 2, 1, 2, 1, 1]
+    bitboard = BitBoard.from_array(board)
+    assert bitboard.is_draw()
+    assert bitboard.end_state(PLAYER2) == GameState.IS_DRAW
+    assert np.all(bitboard.to_array() == board)
+
+
+def test_agents_accept_bitboard():
+    from agents.common import BitBoard, PLAYER1, PLAYER2
+    from agents.agents_random import generate_move
+    bitboard = BitBoard()
+    for col in range(6):
+        for row in range(6):
+            bitboard.play(col, PLAYER1 if (row + col // 2) % 2 else PLAYER2)
+    action, _ = generate_move(bitboard, PLAYER1, None)
+    assert action == 6
+
+
+def test_check_end_state_incremental():
+    from agents.common import check_end_state_incremental, initialize_game_state, apply_player_action, GameState
+
+    # horizontal win through the last move
+    board = initialize_game_state()
+    board[0, 0:7] = [0, 1, 1, 0, 1, 2, 2]
+    board[1, 0:7] = [0, 0, 2, 0, 0, 0, 0]
+    apply_player_action(board, 3, BoardPiece(1))
+    assert check_end_state_incremental(board, BoardPiece(1), (0, 3), 7) == GameState.IS_WIN
+    assert check_end_state_incremental(board, BoardPiece(2), (0, 3), 7) == GameState.STILL_PLAYING
+
+    # diagonal win through the last move
+    board = initialize_game_state()
+    board[0, 0:7] = [2, 1, 1, 2, 1, 0, 0]
+    board[1, 0:7] = [0, 2, 2, 1, 0, 0, 0]
+    board[2, 0:7] = [0, 0, 2, 1, 0, 0, 0]
+    board[3, 0:7] = [0, 0, 0, 0, 0, 0, 0]
+    apply_player_action(board, 3, BoardPiece(2))
+    assert check_end_state_incremental(board, BoardPiece(2), (3, 3), 12) == GameState.IS_WIN
+
+    # vertical and anti-diagonal win at the edge of the board
+    board = initialize_game_state()
+    board[0:3, 6] = BoardPiece(1)
+    apply_player_action(board, 6, BoardPiece(1))
+    assert check_end_state_incremental(board, BoardPiece(1), (3, 6), 4) == GameState.IS_WIN
+    board = initialize_game_state()
+    board[0, 0:7] = [0, 0, 0, 1, 2, 2, 2]
+    board[1, 0:7] = [0, 0, 0, 0, 1, 1, 2]
+    board[2, 0:7] = [0, 0, 0, 0, 0, 1, 1]
+    board[3, 0:7] = [0, 0, 0, 0, 0, 0, 0]
+    apply_player_action(board, 6, BoardPiece(1))
+    assert check_end_state_incremental(board, BoardPiece(1), (3, 6), 12) == GameState.IS_WIN
+
+    # draw from the move counter
+    board[0, 0:7] = [2, 1, 2, 2, 2, 1, 2]
+    board[1, 0:7] = [2, 2, 1, 2, 1, 1, 2]
+    board[2, 0:7] = [1, 1, 1, 2, 1, 1, 1]
+    board[3, 0:7] = [2, 2, 1, 1, 1, 2, 2]
+    board[4, 0:7] = [1, 1, 2, 2, 2, 1, 2]
+    board[5, 0:7] = [2, 1, 2, 1, 2, 1, 1]
+    assert check_end_state_incremental(board, BoardPiece(1), (5, 6), 42) == GameState.IS_DRAW
+    assert check_end_state_incremental(board, BoardPiece(1), (5, 6), 41) == GameState.STILL_PLAYING
+
+
+def test_check_end_state_batch():
+    from agents.common import check_end_state_batch, initialize_game_state, apply_player_action, GameState, BitBoard
+    rng = np.random.default_rng(4)
+    boards = []
+    for _ in range(300):
+        board = initialize_game_state()
+        for i in range(rng.integers(0, 43)):
+            free = [col for col in range(7) if board[5, col] == 0]
+            apply_player_action(board, rng.choice(free), BoardPiece(i % 2 + 1))
+        boards.append(board)
+    boards = np.stack(boards)
+    bitboards = [BitBoard.from_array(board) for board in boards]
+
+    for player in (BoardPiece(1), BoardPiece(2)):
+        ret = check_end_state_batch(boards, player)
+        assert ret.dtype == np.int8
+        assert ret.shape == (300,)
+        assert [GameState(state) for state in ret] == [bitboard.end_state(player) for bitboard in bitboards]
+
+    ret = check_end_state_batch(boards)
+    expected = [GameState.IS_WIN if bitboard.is_win(1) or bitboard.is_win(2) else bitboard.end_state(1)
+                for bitboard in bitboards]
+    assert [GameState(state) for state in ret] == expected
+    assert GameState.IS_WIN.value in ret and GameState.STILL_PLAYING.value in ret
+
+
+def test_canonical_key():
+    from agents.common import BitBoard, mirror_bits, mirror_move, canonical_key, initialize_game_state, \
+        apply_player_action, PLAYER1, PLAYER2
+
+    board = initialize_game_state()
+    for i, col in enumerate([0, 1, 1, 2, 6, 3]):
+        apply_player_action(board, col, PLAYER1 if i % 2 == 0 else PLAYER2)
+    bitboard = BitBoard.from_array(board)
+    mirrored = BitBoard.from_array(board[:, ::-1])
+    assert mirror_bits(bitboard.pieces[0]) == mirrored.pieces[0]
+    assert mirror_bits(mirror_bits(bitboard.mask)) == bitboard.mask
+    assert mirror_move(0) == 6 and mirror_move(3) == 3
+
+    key, flipped = canonical_key(bitboard.pieces[0], bitboard.mask)
+    mirrored_key, mirrored_flipped = canonical_key(mirrored.pieces[0], mirrored.mask)
+    assert key == mirrored_key
+    assert flipped != mirrored_flipped
+    # symmetric positions are never mirrored
+    assert canonical_key(1 << 21, 1 << 21) == (2 << 21, False)
+
+
+def test_encode_bitboards():
+    from agents.common import encode_bitboards, decode_bitboards, initialize_game_state, apply_player_action, \
+        BitBoard, PLAYER1, PLAYER2
+    rng = np.random.default_rng(24)
+    boards = []
+    for _ in range(100):
+        board = initialize_game_state()
+        for i in range(rng.integers(0, 43)):
+            free = [col for col in range(7) if board[5, col] == 0]
+            apply_player_action(board, rng.choice(free), BoardPiece(i % 2 + 1))
+        boards.append(board)
+    boards = np.stack(boards)
+
+    positions, masks = encode_bitboards(boards, PLAYER1)
+    assert positions.dtype == masks.dtype == np.uint64
+    assert positions.shape == masks.shape == (100,)
+    for board, position, mask in zip(boards, positions, masks):
+        bitboard = BitBoard.from_array(board)
+        assert encode_bitboards(board, PLAYER1) == (bitboard.pieces[0], bitboard.mask) == (position, mask)
+        assert encode_bitboards(board, PLAYER2) == (bitboard.pieces[1], bitboard.mask)
+        assert isinstance(position.item(), int)
+        assert np.all(decode_bitboards(int(position), int(mask), PLAYER1) == board)
+    decoded = decode_bitboards(masks ^ positions, masks, PLAYER2)
+    assert decoded.dtype == BoardPiece and decoded.shape == (100, 6, 7)
+    assert np.all(decoded == boards)
+    assert encode_bitboards(initialize_game_state(), PLAYER1) == (0, 0)
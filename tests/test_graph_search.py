@@ -0,0 +1,95 @@
+from agents.common import initialize_game_state, apply_player_action, BoardPiece, BitBoard, SavedState
+
+
+def test_position_key():
+    from agents.agents_montecarlo.graph_search import position_key
+
+    # two move orders of the same position
+    first, second = BitBoard(), BitBoard()
+    for col, other in zip([0, 1, 2, 3], [2, 3, 0, 1]):
+        first.play(col, BoardPiece(first.moves % 2 + 1))
+        second.play(other, BoardPiece(second.moves % 2 + 1))
+    assert position_key(first, BoardPiece(1)) == position_key(second, BoardPiece(1))
+    assert position_key(first, BoardPiece(1)) != position_key(first, BoardPiece(2))
+    third = BitBoard()
+    for col in [1, 0, 2, 3]:  # the pieces of the players swapped in two columns
+        third.play(col, BoardPiece(third.moves % 2 + 1))
+    assert position_key(first, BoardPiece(1)) != position_key(third, BoardPiece(1))
+
+
+def test_graph_mcts():
+    from agents.agents_montecarlo.graph_search import Graph, graph_mcts, position_key
+
+    graph = Graph(BitBoard(), BoardPiece(1))
+    graph_mcts(graph, rollouts=4, max_nodes=None, max_iterations=400, seed=22)
+    table = graph.table
+    root = table[graph.root]
+    assert root.visits == sum(visits for visits, _, _ in root.edges.values())
+    assert graph.transpositions > 0
+
+    parents = {}
+    for key, node in table.items():
+        # a position was simulated once, all other visits went on through its moves
+        if key != graph.root and node.result is None:
+            assert node.visits == 4 + sum(visits for visits, _, _ in node.edges.values())
+        for visits, _, child in node.edges.values():
+            parents.setdefault(child, []).append(visits)
+    # a position reached by several move orders shares the visits of all of them
+    shared = [key for key, visits in parents.items() if len(visits) > 1 and key in table]
+    assert shared
+    for key in shared:
+        assert table[key].visits == sum(parents[key])
+
+
+def test_graph_mcts_wins():
+    from agents.agents_montecarlo.graph_search import Graph, graph_mcts, position_key
+
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    bitboard = BitBoard.from_array(board)
+    graph = Graph(bitboard, BoardPiece(1))
+    assert graph_mcts(graph, rollouts=8, max_iterations=100, seed=22) == 3
+    bitboard.play(3, BoardPiece(1))
+    win = graph.table[position_key(bitboard, BoardPiece(2))]
+    assert win.result == 1 and win.wins == win.visits > 0
+    assert win.edges == {}
+
+
+def test_evict_and_reuse():
+    from agents.agents_montecarlo.graph_search import Graph, graph_mcts, reuse_graph, position_key
+    from agents.agents_montecarlo.monte_carlo import generate_move_montecarlo
+
+    graph = Graph(BitBoard(), BoardPiece(1))
+    graph_mcts(graph, rollouts=4, max_nodes=None, max_iterations=200, seed=22)
+    size = len(graph.table)
+    removed = graph.evict(size // 2)
+    assert len(graph.table) == size - removed <= size // 2 * 0.75
+    assert graph.root in graph.table
+    assert graph.peak_nodes == size and graph.evicted_nodes == removed
+
+    # the moves of the agent and of the opponent, the graph is kept and the old positions are evicted first
+    board = initialize_game_state()
+    move, saved_state = generate_move_montecarlo(board, BoardPiece(1), SavedState(graph), use_book=False,
+                                                 backend='graph', max_iterations=100, seed=22)
+    assert saved_state.computational_result is graph
+    apply_player_action(board, move, BoardPiece(1))
+    apply_player_action(board, 0, BoardPiece(2))
+    bitboard = BitBoard.from_array(board)
+    assert reuse_graph(saved_state, bitboard, BoardPiece(1)) is graph
+    assert graph.root == position_key(bitboard, BoardPiece(1))
+    graph.evict(len(graph.table))
+    assert all(node.moves > 2 for key, node in graph.table.items() if key != graph.root)
+    assert reuse_graph(None, bitboard, BoardPiece(1)) is not graph
+
+
+def test_graph_mcts_seed():
+    from agents.agents_montecarlo.graph_search import Graph, graph_mcts
+
+    graphs = []
+    for seed in (23, 23, 24):
+        graph = Graph(BitBoard(), BoardPiece(1))
+        graph_mcts(graph, rollouts=8, max_rollouts=8 * 150, seed=seed)
+        graphs.append({key: (node.visits, node.wins, node.edges) for key, node in graph.table.items()})
+        assert graph.table[graph.root].visits == 150 * 8
+    assert graphs[0] == graphs[1] and graphs[0] != graphs[2]
@@ -2,6 +2,13 @@ from agents.agents_minimax.minimax import generate_move_minimax
 from agents.common import apply_player_action, initialize_game_state, BoardPiece,pretty_print_board
 
 
+def board_from_moves(moves: str):
+    board = initialize_game_state()
+    for i, col in enumerate(moves):
+        apply_player_action(board, int(col), BoardPiece(i % 2 + 1))
+    return board
+
+
 def test_generate_move_minimax():
     # win on the first move
     board = initialize_game_state()
@@ -59,4 +66,302 @@ def test_generate_move_minimax():
     board4[4, 0:7] = [2, 1, 2, 2, 1, 1, 1]
     board4[5, 0:7] = [1, 2, 2, 1, 2, 0, 2]
     action4, save_state = generate_move_minimax(board4, BoardPiece(2), False)
-    assert action4 == 5
\ No newline at end of file
+    assert action4 == 5
+
+
+def test_transposition_table():
+    from agents.agents_minimax.minimax import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+    tt = TranspositionTable(max_entries=8)
+    assert tt.lookup(3) is None
+    tt.store(3, 2, 150, EXACT, 4)
+    assert tt.lookup(3) == (2, 150, EXACT, 4)
+    assert tt.lookup(11) is None  # same slot, other position
+    assert tt.hits == 1 and tt.probes == 3
+
+    # a shallower search doesn't replace a deeper one
+    tt.store(11, 1, -20, UPPER_BOUND, 0)
+    assert tt.lookup(3) == (2, 150, EXACT, 4)
+    tt.store(11, 3, -20, LOWER_BOUND, 0)
+    assert tt.lookup(11) == (3, -20, LOWER_BOUND, 0)
+    assert tt.overwrites == 1
+
+    always = TranspositionTable(max_entries=8, replacement='always')
+    always.store(3, 2, 150, EXACT, 4)
+    always.store(11, 1, -20, UPPER_BOUND, 0)
+    assert always.lookup(11) == (1, -20, UPPER_BOUND, 0)
+
+
+def test_zobrist_key():
+    from agents.agents_minimax.minimax import zobrist_key, ZOBRIST
+    board = initialize_game_state()
+    assert zobrist_key(board) == 0
+    apply_player_action(board, 3, BoardPiece(1), False)
+    apply_player_action(board, 3, BoardPiece(2), False)
+    assert zobrist_key(board) == ZOBRIST[0][0][3] ^ ZOBRIST[1][1][3]
+
+    # transposed move orders give the same key
+    board1 = initialize_game_state()
+    board2 = initialize_game_state()
+    for col, player in [(2, 1), (4, 2), (3, 1), (5, 2)]:
+        apply_player_action(board1, col, BoardPiece(player), False)
+    for col, player in [(3, 1), (5, 2), (2, 1), (4, 2)]:
+        apply_player_action(board2, col, BoardPiece(player), False)
+    assert zobrist_key(board1) == zobrist_key(board2)
+
+
+def test_generate_move_minimax_transposition_table():
+    from agents.agents_minimax.minimax import SearchContext
+    board = initialize_game_state()
+    board[0, 0:7] = [1, 0, 2, 1, 2, 0, 1]
+    board[1, 0:7] = [0, 0, 1, 2, 0, 0, 0]
+    plain = SearchContext(use_tt=False)
+    cached = SearchContext()
+    action, _ = generate_move_minimax(board, BoardPiece(2), None, plain)
+    action_tt, _ = generate_move_minimax(board, BoardPiece(2), None, cached)
+    assert action == action_tt == 2
+    assert cached.tt.hits > 0
+    assert cached.nodes <= plain.nodes
+
+
+def test_generate_move_minimax_iterative_deepening():
+    import time
+    from agents.agents_minimax.minimax import SearchContext
+
+    # win on the first move
+    board = initialize_game_state()
+    board[0, 0:7] = [0, 0, 2, 2, 0, 0, 0]
+    board[1, 0:7] = [0, 0, 1, 2, 0, 0, 0]
+    board[2, 0:7] = [0, 0, 1, 2, 0, 0, 0]
+    board[3, 0:7] = [0, 0, 1, 0, 0, 0, 0]
+    context = SearchContext()
+    tic = time.time()
+    action, _ = generate_move_minimax(board, BoardPiece(1), None, context, time_budget=0.5)
+    assert time.time() - tic < 1.5
+    assert action == 2
+    assert context.completed_depth >= 2
+    assert context.pv[0] == 2
+
+    # block opponent
+    board1 = initialize_game_state()
+    board1[0, 0:7] = [1, 0, 2, 2, 0, 0, 0]
+    board1[1, 0:7] = [1, 0, 1, 2, 0, 0, 0]
+    board1[2, 0:7] = [0, 0, 0, 2, 0, 0, 0]
+    action1, _ = generate_move_minimax(board1, BoardPiece(1), None, time_budget=0.5)
+    assert action1 == 3
+
+    # the search stops when the board is full
+    board4 = initialize_game_state()
+    board4[0, 0:7] = [1, 2, 2, 1, 1, 2, 2]
+    board4[1, 0:7] = [1, 2, 2, 2, 1, 1, 2]
+    board4[2, 0:7] = [2, 1, 1, 1, 2, 2, 1]
+    board4[3, 0:7] = [1, 1, 2, 1, 1, 2, 2]
+    board4[4, 0:7] = [2, 1, 2, 2, 1, 1, 1]
+    board4[5, 0:7] = [1, 2, 2, 1, 2, 0, 2]
+    context4 = SearchContext()
+    action4, _ = generate_move_minimax(board4, BoardPiece(2), None, context4, time_budget=5)
+    assert action4 == 5
+    assert context4.completed_depth == 1
+
+
+def test_ordered_moves():
+    from agents.agents_minimax.minimax import ordered_moves, SearchContext
+    assert ordered_moves(None, 0) == [0, 1, 2, 3, 4, 5, 6]
+    assert ordered_moves(SearchContext(ordering=()), 0) == [0, 1, 2, 3, 4, 5, 6]
+    assert ordered_moves(SearchContext(ordering=('center',)), 0) == [3, 2, 4, 1, 5, 0, 6]
+
+    context = SearchContext()
+    context.history[0][6] = 10
+    context.history[0][1] = 5
+    assert ordered_moves(context, 0) == [6, 1, 3, 2, 4, 5, 0]
+    assert ordered_moves(context, 0, maximising=False) == [3, 2, 4, 1, 5, 0, 6]
+
+    context.record_cutoff(2, 5, 1, 2, False)
+    context.record_cutoff(2, 0, 0, 2, False)
+    assert context.killers[2] == [0, 5]
+    assert context.cutoffs[2] == 2 and context.first_move_cutoffs[2] == 1
+    assert ordered_moves(context, 0, ply=2, tt_move=4, maximising=False) == [4, 0, 5, 3, 2, 1, 6]
+
+    context.pv_moves = {7: 1}
+    assert ordered_moves(context, 7, ply=2, tt_move=4, maximising=False)[:4] == [1, 4, 0, 5]
+
+
+def test_move_ordering_statistics():
+    from agents.agents_minimax.minimax import SearchContext
+    board = initialize_game_state()
+    board[0, 0:7] = [1, 0, 2, 1, 2, 0, 1]
+    board[1, 0:7] = [0, 0, 1, 2, 0, 0, 0]
+    unordered = SearchContext(ordering=())
+    ordered = SearchContext()
+    action, _ = generate_move_minimax(board, BoardPiece(2), None, unordered)
+    action_ordered, _ = generate_move_minimax(board, BoardPiece(2), None, ordered)
+    assert action == action_ordered == 2
+    assert ordered.nodes < unordered.nodes
+    assert ordered.nodes_per_ply[0] == 1
+    assert sum(ordered.nodes_per_ply) == ordered.nodes
+    assert len(ordered.branching_factors()) == 4
+    assert sum(ordered.first_move_cutoffs) <= sum(ordered.cutoffs)
+
+
+def test_make_unmake_move():
+    import math
+    import numpy as np
+    from agents.agents_minimax.minimax import SearchContext, make_move, unmake_move, alpha_beta_minimax
+    board = initialize_game_state()
+    board[0, 0:7] = [1, 0, 2, 1, 2, 0, 1]
+    board[1, 0:7] = [0, 0, 1, 2, 0, 0, 0]
+    before = board.copy()
+
+    context = SearchContext()
+    context.heights = np.count_nonzero(board, axis=0).tolist()
+    make_move(board, context, 2, BoardPiece(2))
+    make_move(board, context, 2, BoardPiece(1))
+    assert board[2, 2] == 2 and board[3, 2] == 1
+    assert context.heights[2] == 4 and context.stack == [2, 2]
+    unmake_move(board, context)
+    unmake_move(board, context)
+    assert np.all(board == before)
+    assert context.heights[2] == 2 and context.stack == []
+
+    # the search leaves the board unchanged
+    value, saved_value = alpha_beta_minimax(board, BoardPiece(2), -math.inf, math.inf, 3, True)
+    assert np.all(board == before)
+    assert value == np.nanmax(saved_value)
+
+
+def test_incremental_evaluator():
+    import numpy as np
+    from agents.agents_minimax.minimax import IncrementalEvaluator, evaluate_curr_board
+    from agents.common import check_end_state, GameState
+    rng = np.random.default_rng(8)
+    for _ in range(20):
+        board = initialize_game_state()
+        evaluator = IncrementalEvaluator(board)
+        played = []
+        for i in range(42):
+            player = BoardPiece(i % 2 + 1)
+            col = rng.choice([col for col in range(7) if board[5, col] == 0])
+            row = np.count_nonzero(board[:, col])
+            apply_player_action(board, col, player)
+            evaluator.play(row, col, player)
+            played.append((row, col, player))
+            for p in (BoardPiece(1), BoardPiece(2)):
+                assert evaluator.evaluate(p) == evaluate_curr_board(board, p)
+            if check_end_state(board, player) != GameState.STILL_PLAYING:
+                break
+
+        # undo everything
+        for row, col, player in reversed(played):
+            evaluator.undo(row, col, player)
+        assert evaluator.totals == [0, 0] and evaluator.fours == [0, 0]
+        assert not any(evaluator.counts[0]) and not any(evaluator.counts[1])
+
+
+def test_generate_move_minimax_incremental_evaluation():
+    from agents.agents_minimax.minimax import SearchContext
+    board = initialize_game_state()
+    board[0, 0:7] = [1, 0, 2, 1, 2, 0, 1]
+    board[1, 0:7] = [0, 0, 1, 2, 0, 0, 0]
+    scratch = SearchContext(incremental=False)
+    incremental = SearchContext()
+    value_scratch = generate_move_minimax(board, BoardPiece(2), None, scratch)[0]
+    value_incremental = generate_move_minimax(board, BoardPiece(2), None, incremental)[0]
+    assert value_scratch == value_incremental == 2
+    assert scratch.nodes == incremental.nodes
+
+
+def test_evaluate_boards():
+    import numpy as np
+    from agents.agents_minimax.minimax import evaluate_boards, evaluate_curr_board, evaluate_position
+
+    def evaluate_lines(board, player):
+        # the evaluation row by row, column by column and diagonal by diagonal
+        value = sum(evaluate_position(board[row, :], player) for row in range(6))
+        value += sum(evaluate_position(board[:, col], player) for col in range(7))
+        value += sum(evaluate_position(np.diag(board, diag), player) for diag in range(-2, 4))
+        value += sum(evaluate_position(np.diag(board[::-1], diag), player) for diag in range(-2, 4))
+        return value
+
+    rng = np.random.default_rng(10)
+    boards = []
+    for _ in range(50):
+        board = initialize_game_state()
+        for i in range(rng.integers(0, 30)):
+            free = [col for col in range(7) if board[5, col] == 0]
+            apply_player_action(board, rng.choice(free), BoardPiece(i % 2 + 1))
+        boards.append(board)
+    boards = np.stack(boards)
+
+    scores = evaluate_boards(boards)
+    assert scores.shape == (50, 2)
+    for board, score in zip(boards, scores):
+        assert np.all(evaluate_boards(board) == score)
+        for player in (BoardPiece(1), BoardPiece(2)):
+            assert score[player - 1] == evaluate_curr_board(board, player)
+
+    # without fours the windows give the same value as the lines
+    for board, score in zip(boards, scores):
+        if max(score) < 100000:
+            assert score[0] == evaluate_lines(board, BoardPiece(1))
+            assert score[1] == evaluate_lines(board, BoardPiece(2))
+
+    # wins
+    board = initialize_game_state()
+    board[0, 0:7] = [0, 2, 2, 2, 2, 1, 1]
+    board[1, 0:7] = [0, 0, 0, 0, 0, 1, 1]
+    assert list(evaluate_boards(board)) == [-100000, 110000]
+    assert list(evaluate_boards(board[:, ::-1])) == [-100000, 110000]  # mirrored
+
+
+def test_search_engines():
+    import numpy as np
+    from agents.agents_minimax.minimax import ENGINES, SearchContext, search_root, zobrist_key
+
+    for moves in ['', '3324', '332415', '3232565', '4343543225']:
+        board = board_from_moves(moves)
+        player = BoardPiece(len(moves) % 2 + 1)
+        results = []
+        for engine in ENGINES:
+            for use_tt in (False, True):
+                context = SearchContext(use_tt=use_tt)
+                value = search_root(board, player, 4, context, zobrist_key(board), engine)
+                assert board[5, context.best_move] == 0
+                results.append(value)
+        assert len(set(results)) == 1  # all engines find the alpha-beta value
+        assert np.all(board == board_from_moves(moves))
+
+
+def test_generate_move_engines():
+    import pytest
+    from agents.agents_minimax.minimax import generate_move_minimax, SearchContext
+
+    board = initialize_game_state()
+    board[0, 0:4] = [1, 1, 1, 0]
+    board[1, 0:3] = [2, 2, 2]
+    for engine in ('alphabeta', 'pvs', 'mtdf'):
+        action, _ = generate_move_minimax(board, BoardPiece(1), None, engine=engine)
+        assert action == 3  # wins
+        context = SearchContext()
+        action, _ = generate_move_minimax(board, BoardPiece(1), None, context, time_budget=0.2, engine=engine)
+        assert action == 3
+        assert context.completed_depth >= 1
+    with pytest.raises(ValueError):
+        generate_move_minimax(board, BoardPiece(1), None, engine='sss')
+
+
+def test_mirrored_positions_share_entries():
+    from agents.agents_minimax.minimax import zobrist_key, canonical_zobrist, SearchContext, search_root
+
+    board = initialize_game_state()
+    for i, col in enumerate([1, 2, 2, 0, 5]):
+        apply_player_action(board, col, BoardPiece(i % 2 + 1))
+    mirrored = board[:, ::-1].copy()
+    key, flipped = canonical_zobrist(zobrist_key(board))
+    assert (key, not flipped) == canonical_zobrist(zobrist_key(mirrored))
+
+    context = SearchContext()
+    value = search_root(board, BoardPiece(2), 4, context, zobrist_key(board))
+    move, nodes = context.best_move, context.nodes
+    # the mirrored search finds the root and the subtrees in the table
+    assert search_root(mirrored, BoardPiece(2), 4, context, zobrist_key(mirrored)) == value
+    assert context.best_move == 6 - move
+    assert context.nodes - nodes < nodes / 4
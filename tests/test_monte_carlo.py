@@ -133,7 +133,7 @@ def test_backpropagation():
     new_node, tree = backpropagation(leaf, 1, tree)
 
     assert leaf.simulations == 2
-    assert leaf.wins == 1
+    assert leaf.wins == 2
 
     assert child2.wins == 2
     assert child2.simulations == 4
@@ -179,7 +179,7 @@ def test_backpropagation():
     new_node1, tree1 = backpropagation(leaf1, -1, tree1)
 
     assert leaf1.simulations == 2
-    assert leaf1.wins == 2
+    assert leaf1.wins == 1
 
     assert child21.wins == 3
     assert child21.simulations == 4
@@ -407,7 +407,7 @@ def test_number_of_connected():
     p, m = get_position_mask_bitmap(2, board)
     pp, mm = get_position_mask_bitmap(1, board)
     assert number_of_connected(p, m) == 4
-    assert number_of_connected(pp, mm) == 2
+    assert number_of_connected(pp, mm) == 1  # every window through the two X also holds an O
 
     board = initialize_game_state()
     board[0, 0:7] = [2, 1, 2, 2, 1, 1, 1]
@@ -442,7 +442,7 @@ def test_generate_move_montecarlo():
     board[3, 0:7] = [0, 0, 0, 0, 0, 0, 0]
     board[4, 0:7] = [0, 0, 0, 0, 0, 0, 0]
     board[5, 0:7] = [0, 0, 0, 0, 0, 0, 0]
-    move, ss = generate_move_montecarlo(board,1,None)
+    move, ss = generate_move_montecarlo(board, 1, None, max_iterations=100, seed=23)
     assert move == 4
 
     board1 = initialize_game_state()
@@ -452,5 +452,292 @@ def test_generate_move_montecarlo():
     board1[3, 0:7] = [0, 0, 0, 0, 0, 0, 0]
     board1[4, 0:7] = [0, 0, 0, 0, 0, 0, 0]
     board1[5, 0:7] = [0, 0, 0, 0, 0, 0, 0]
-    move1, ss = generate_move_montecarlo(board1,1,None)
+    move1, ss = generate_move_montecarlo(board1, 1, None, max_iterations=100, seed=23)
     assert move1 == 3
+
+
+def test_selection_descends():
+    board = initialize_game_state()
+    root = Node(board_state=board, player=BoardPiece(1))
+    tree = Tree(root)
+    root.simulations = 70
+    for move in range(7):
+        root.add_node()
+        child = root.children[move]
+        child.move, child.board_state, child.player = move, board, BoardPiece(2)
+        child.simulations, child.wins = 10, move  # the last child has the best UCB1 score
+        tree.add_to_nodes(child)
+    best = root.children[6]
+    assert selection(root, tree) == best  # fully expanded root
+
+    best.add_node()
+    grandchild = best.children[0]
+    grandchild.move, grandchild.board_state, grandchild.simulations, grandchild.wins = 0, board, 1, 1
+    tree.add_to_nodes(grandchild)
+    assert selection(root, tree) == best  # has untried moves
+
+    best.explored = True
+    assert selection(root, tree) == root.children[5]
+
+
+def test_reuse_tree():
+    from agents.agents_montecarlo.monte_carlo import reuse_tree
+
+    board = initialize_game_state()
+    move, saved_state = generate_move_montecarlo(board, BoardPiece(1), None, use_book=False, max_iterations=200,
+                                                 seed=16)
+    old_tree = saved_state.computational_result
+    child = next(child for child in old_tree.root.children if child.move == move)
+    if not child.children:  # no reply of the move was expanded, take the most simulated move with replies
+        child = max((child for child in old_tree.root.children if child.children), key=lambda node: node.simulations)
+    apply_player_action(board, child.move, BoardPiece(1))
+    reply = max(child.children, key=lambda node: node.simulations)
+    apply_player_action(board, reply.move, BoardPiece(2))
+
+    tree = reuse_tree(saved_state, board, BoardPiece(1))
+    assert tree.root is reply
+    assert tree.root.parent is None
+    assert tree.root.simulations > 0  # head start
+    assert len(tree.nodes) < len(old_tree.nodes)
+    assert all(node in tree.nodes for node in tree.root.children)
+
+    # the same position again keeps the whole tree
+    assert reuse_tree(saved_state, initialize_game_state(), BoardPiece(1)) is old_tree
+    # a position that is not in the tree starts a new one
+    apply_player_action(board, 0, BoardPiece(1))
+    apply_player_action(board, 0, BoardPiece(2))
+    tree = reuse_tree(saved_state, board, BoardPiece(1))
+    assert tree.root.simulations == 0 and tree.nodes == []
+    assert reuse_tree(None, board, BoardPiece(1)).root.simulations == 0
+
+
+def test_root_parallel_search():
+    import pytest
+    from agents.agents_montecarlo.monte_carlo import root_parallel_search, best_parallel_move, ROLLOUTS
+
+    board = initialize_game_state()
+    board[0, 0:4] = [1, 1, 1, 0]
+    board[1, 0:3] = [2, 2, 2]
+    statistics, iterations = root_parallel_search(board, BoardPiece(1), 2, seed=17, max_iterations=50)
+    assert set(statistics) == set(range(7))
+    assert iterations == 2 * 50  # the budget of every worker
+    assert iterations * ROLLOUTS >= sum(simulations for simulations, _ in statistics.values())
+    assert root_parallel_search(board, BoardPiece(1), 2, seed=17, max_iterations=50) == (statistics, iterations)
+    assert best_parallel_move({0: [5, 1], 1: [7, 0], 2: [7, 3]}) == 2
+
+    action, saved_state = generate_move_montecarlo(board, BoardPiece(1), None, use_book=False, workers=2,
+                                                   max_iterations=50, seed=17)
+    assert action == best_parallel_move(statistics)
+    assert saved_state is None
+    with pytest.raises(ValueError):
+        generate_move_montecarlo(board, BoardPiece(1), None, workers=2, backend='array')
+
+
+def test_bitboard_rollouts_outcomes():
+    import random
+    from agents.common import BitBoard
+    from agents.agents_montecarlo.monte_carlo import bitboard_rollouts
+
+    def outcomes(bitboard, on_turn, player):
+        # results of `player` reachable with any sequence of moves
+        results = set()
+        for col in range(7):
+            if bitboard.can_play(col):
+                bitboard.play(col, on_turn)
+                if bitboard.is_win(on_turn):
+                    results.add(0 if on_turn == player else 2)
+                elif bitboard.moves == 42:
+                    results.add(1)
+                else:
+                    results |= outcomes(bitboard, BoardPiece(3 - on_turn), player)
+                bitboard.undo()
+        return results
+
+    random.seed(18)
+    tested = 0
+    while tested < 20:
+        bitboard = BitBoard()
+        player = BoardPiece(1)
+        while bitboard.moves < 39:
+            bitboard.play(random.choice([col for col in range(7) if bitboard.can_play(col)]), player)
+            if bitboard.is_win(player):
+                break
+            player = BoardPiece(3 - player)
+        else:
+            counts = bitboard_rollouts(bitboard, player, 200)
+            assert sum(counts) == 200
+            assert {i for i, count in enumerate(counts) if count} <= outcomes(bitboard, player, player)
+            tested += 1
+
+    # three in a row for the player on turn
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    wins, draws, losses = bitboard_rollouts(board, BoardPiece(1), 500)
+    assert wins > losses
+
+
+def test_bitboard_rollouts():
+    import random
+    from agents.common import BitBoard
+    from agents.agents_montecarlo.monte_carlo import bitboard_rollouts, rollout, WIN, DRAW, LOST
+
+    random.seed(19)
+    # only a draw is left: the last two free cells of the board can not complete four
+    moves = '3316501142661412314344523630642605555202'
+    bitboard = BitBoard()
+    for i, col in enumerate(moves):
+        bitboard.play(int(col), BoardPiece(i % 2 + 1))
+    assert not bitboard.is_win(BoardPiece(1)) and not bitboard.is_win(BoardPiece(2))
+    assert bitboard_rollouts(bitboard, BoardPiece(1), 50) == (0, 50, 0)
+    assert rollout(bitboard.to_array(), BoardPiece(1)) == DRAW
+
+    # the player on turn wins at once in one column of seven
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    wins, draws, losses = bitboard_rollouts(board, BoardPiece(1), 2000)
+    assert wins + draws + losses == 2000
+    assert wins > 2000 // 7
+
+    # a win of the player that moves first is a loss of the player that made the last move
+    results = [rollout(board, BoardPiece(1)) for _ in range(2000)]
+    assert results.count(LOST) > results.count(WIN)
+    assert abs(results.count(LOST) - wins) < 200
+
+
+def test_backpropagation_batch():
+    from agents.agents_montecarlo.monte_carlo import backpropagation_batch, WIN, DRAW, LOST
+
+    def chain():
+        root = Node(player=BoardPiece(1))
+        tree = Tree(root)
+        node = root
+        for _ in range(3):
+            node.add_node()
+            node.children[0].player = BoardPiece(3 - node.player)
+            node = node.children[0]
+            tree.add_to_nodes(node)
+        return tree, node
+
+    tree, leaf = chain()
+    for outcome in [WIN] * 3 + [DRAW] * 2 + [LOST] * 4:
+        backpropagation(leaf, outcome, tree)
+    batch_tree, batch_leaf = chain()
+    root, _ = backpropagation_batch(batch_leaf, (3, 2, 4), batch_tree)
+    assert root is batch_tree.root
+    for node, batch_node in zip([tree.root] + tree.nodes, [batch_tree.root] + batch_tree.nodes):
+        assert (node.simulations, node.wins) == (batch_node.simulations, batch_node.wins)
+    # the new node counts the wins of the player that made its move
+    assert (batch_leaf.simulations, batch_leaf.wins) == (9, 3)
+
+
+def test_simulation_batch_game_over():
+    from agents.agents_montecarlo.monte_carlo import simulation_batch
+
+    board = initialize_game_state()
+    board[0, 0:3] = [1, 1, 1]
+    board[1, 0:3] = [2, 2, 2]
+    parent = Node(board_state=board, player=BoardPiece(1))
+    for col in [0, 1, 2, 4, 5, 6]:  # the moves of the siblings, the new node plays the winning move
+        parent.add_node()
+        parent.children[-1].move = col
+    parent.add_node()
+    node = parent.children[-1]
+    node.player = BoardPiece(2)
+    assert simulation_batch(node, board.copy(), 8) == (8, 0, 0)  # wins of player 1 that made the move
+    assert node.move == 3
+
+    node.add_node()
+    below = node.children[0]
+    below.player = BoardPiece(1)
+    assert simulation_batch(below, node.board_state.copy(), 8) == (0, 0, 8)  # player 1 had already won
+
+
+def test_winning_child_rollouts():
+    from agents.agents_montecarlo.monte_carlo import MCTS
+
+    board = initialize_game_state()
+    board[0, 0:7] = [1, 1, 1, 0, 2, 2, 2]
+    # the scalar and the batch simulation credit every simulation below the winning move to player 1
+    for rollouts in (1, 8):
+        root = Node(board_state=board, player=BoardPiece(1))
+        assert MCTS(root, board, Tree(root), rollouts=rollouts, max_nodes=None, max_iterations=100, seed=20) == 3
+        child = next(child for child in root.children if child.move == 3)
+        assert child.simulations > rollouts
+        assert child.wins == child.simulations
+
+
+def test_evict(monkeypatch):
+    import math
+    from agents.agents_montecarlo import monte_carlo
+    from agents.agents_montecarlo.monte_carlo import MCTS, evict, EVICTION_RATIO
+
+    # the tree of a short search is too shallow for the default depth
+    monkeypatch.setattr(monte_carlo, 'EVICTION_DEPTH', 2)
+    board = initialize_game_state()
+    root = Node(board_state=board, player=BoardPiece(1))
+    tree = Tree(root)
+    MCTS(root, board, tree, rollouts=4, max_nodes=None, max_iterations=300, seed=21)
+    simulations = root.simulations
+    size = len(tree.nodes)
+    depths = {id(root): 0}
+    for node in tree.nodes:  # parents are added before their children
+        depths[id(node)] = depths[id(node.parent)] + 1
+
+    # nodes up to EVICTION_DEPTH moves below the root are never removed, the budget leaves room for them
+    near_root = sum(depths[id(node)] <= 2 for node in tree.nodes)
+    max_nodes = max(size // 2, math.ceil(near_root / EVICTION_RATIO))
+    assert max_nodes < size
+    removed = evict(tree, max_nodes)
+    assert removed == size - len(tree.nodes)
+    assert len(tree.nodes) <= max_nodes * EVICTION_RATIO
+    assert tree.evictions > 0 and tree.evicted_nodes == removed and tree.peak_nodes == size
+    # the nodes of the tree are those reachable from the root and no statistics were lost above them
+    reachable = []
+    stack = list(root.children)
+    while stack:
+        node = stack.pop()
+        reachable.append(node)
+        stack.extend(node.children)
+    assert sorted(map(id, reachable)) == sorted(map(id, tree.nodes))
+    assert root.simulations == simulations
+    for node in tree.nodes:
+        assert node.simulations >= sum(child.simulations for child in node.children)
+    # only nodes at least two moves below the root lost their children
+    assert sum(depths[id(node)] <= 2 for node in tree.nodes) == near_root
+
+    # the search goes on in the evicted tree and stays under the budget
+    MCTS(root, board, tree, rollouts=4, max_nodes=max_nodes, max_iterations=200, seed=22)
+    assert len(tree.nodes) < max_nodes
+    assert root.simulations > simulations
+
+
+def test_search_budget():
+    from agents.agents_montecarlo.monte_carlo import MCTS, SearchBudget
+
+    def search(seed, **budget):
+        board = initialize_game_state()
+        root = Node(board_state=board, player=BoardPiece(1))
+        tree = Tree(root)
+        move = MCTS(root, board, tree, rollouts=8, seed=seed, **budget)
+        return move, tree
+
+    def shape(node):
+        return node.move, node.simulations, node.wins, node.value, [shape(child) for child in node.children]
+
+    move, tree = search(23, max_iterations=150)
+    assert len(tree.nodes) == 150 and tree.root.simulations == 150 * 8
+    # the same seed builds the same tree, another seed another one
+    same_move, same_tree = search(23, max_iterations=150)
+    assert same_move == move and shape(same_tree.root) == shape(tree.root)
+    assert shape(search(24, max_iterations=150)[1].root) != shape(tree.root)
+
+    _, tree = search(23, max_rollouts=100)
+    assert tree.root.simulations == 13 * 8  # the last iteration goes beyond the budget
+    _, tree = search(23, period=10.0, max_iterations=20)  # the first limit reached stops the search
+    assert tree.root.simulations == 20 * 8
+
+    budget = SearchBudget()
+    assert budget.period is not None and budget.max_iterations is None
+    assert SearchBudget(max_iterations=5).period is None
@@ -0,0 +1,67 @@
+from agents.common import initialize_game_state, apply_player_action, BoardPiece, BitBoard, SavedState
+
+
+def test_write_book(tmp_path):
+    import os
+    from agents.opening_book import OpeningBook, write_book, HEADER, RECORD
+    from agents.common import mirror_bits
+
+    path = str(tmp_path / 'book.bin')
+    # keys of positions with pieces in the columns 0 and 1, smaller than the mirrored ones
+    entries = {key: (key % 7, key % 5 - 2) for key in (5, 1, 2 ** 8 + 3, 77, 12)}
+    write_book(path, entries, 4)
+    assert os.path.getsize(path) == HEADER.size + 5 * RECORD.size
+    with OpeningBook(path) as book:
+        assert book.depth == 4
+        assert book.size == 5
+        for key, entry in entries.items():
+            assert book.lookup(key, 0) == entry
+            # the mirror image
+            assert book.lookup(mirror_bits(key), 0) == (6 - entry[0], entry[1])
+        for key in (0, 2, 76, 78, 2 ** 8 + 4):
+            assert book.lookup(key, 0) is None
+
+
+def test_build_book(tmp_path):
+    from agents.opening_book import OpeningBook, build_book, position_key, UNKNOWN_SCORE
+
+    path = str(tmp_path / 'book.bin')
+    entries = build_book(path, 3, max_nodes=100)
+    assert len(entries) == 1 + 4 + 25  # without mirror images
+    with OpeningBook(path) as book:
+        assert book.size == 30
+        board = initialize_game_state()
+        assert book.move(board, BoardPiece(1)) == entries[0][0]
+        assert entries[0][1] == UNKNOWN_SCORE  # too deep for 100 nodes
+        apply_player_action(board, 1, BoardPiece(1))
+        bitboard = BitBoard.from_array(board)
+        move = book.move(board, BoardPiece(2))
+        key, mirrored = position_key(bitboard.pieces[1], bitboard.mask)
+        assert (6 - move if mirrored else move, UNKNOWN_SCORE) == entries[key]
+        assert book.move(board[:, ::-1], BoardPiece(2)) == 6 - move
+        apply_player_action(board, move, BoardPiece(2))
+        assert book.move(board, BoardPiece(1)) is not None
+        apply_player_action(board, 0, BoardPiece(1))
+        assert book.move(board, BoardPiece(2)) is None  # beyond the depth of the book
+
+
+def test_book_move(tmp_path, monkeypatch):
+    from agents import opening_book
+    from agents.opening_book import write_book, position_key
+    from agents.agents_montecarlo.monte_carlo import generate_move_montecarlo
+    from agents.agents_minimax.minimax import generate_move_minimax
+
+    board = initialize_game_state()
+    path = str(tmp_path / 'book.bin')
+    write_book(path, {position_key(0, 0)[0]: (5, 0)}, 1)
+    monkeypatch.setattr(opening_book, 'BOOK_PATH', path)
+    monkeypatch.setattr(opening_book, '_default_book', None)
+    assert opening_book.book_move(board, BoardPiece(1)) == 5
+    assert generate_move_montecarlo(board, BoardPiece(1), None, use_book=True)[0] == 5
+    # the state of a previous search is not handed back with a book move
+    assert generate_move_minimax(board, BoardPiece(1), SavedState(None), use_book=True) == (5, None)
+    assert generate_move_minimax(board, BoardPiece(1), None)[0] != 5  # the book is off by default
+
+    monkeypatch.setattr(opening_book, 'BOOK_PATH', str(tmp_path / 'missing.bin'))
+    monkeypatch.setattr(opening_book, '_default_book', None)
+    assert opening_book.book_move(board, BoardPiece(1)) is None
@@ -0,0 +1,75 @@
+from agents.common import initialize_game_state, apply_player_action, BoardPiece, BitBoard
+
+
+def board_from_moves(moves: str):
+    board = initialize_game_state()
+    for i, col in enumerate(moves):
+        apply_player_action(board, int(col), BoardPiece(i % 2 + 1))
+    return board
+
+
+def test_winning_moves():
+    from agents.agents_solver.solver import winning_moves, possible_moves, encode
+
+    # three in a row at the bottom, open on both sides
+    position, mask, moves = encode(board_from_moves('15263'), BoardPiece(2))
+    assert moves == 5
+    wins = winning_moves(mask ^ position, mask)
+    assert wins & possible_moves(mask) == (1 << 0) | (1 << 28)
+    assert winning_moves(position, mask) == 0
+
+
+def test_solve():
+    import random
+    from agents.agents_solver.solver import Solver, encode, bottom_mask, column_mask, CELLS
+    from agents.common import bit_connected_four
+
+    def brute_force(position, mask, moves, memo):
+        # exact score without pruning
+        if (position, mask) in memo:
+            return memo[position, mask]
+        scores = []
+        for col in range(7):
+            move = (mask + bottom_mask(col)) & column_mask(col)
+            if not move:
+                continue
+            if bit_connected_four(position | move):
+                scores.append((CELLS + 1 - moves) // 2)
+                break
+            scores.append(0 if moves + 1 == CELLS else -brute_force(position ^ mask, mask | move, moves + 1, memo))
+        memo[position, mask] = max(scores)
+        return memo[position, mask]
+
+    random.seed(12)
+    solver = Solver()
+    solved = 0
+    while solved < 10:
+        # random position without four in a row
+        bitboard = BitBoard()
+        for i in range(30 + solved % 4):
+            player = BoardPiece(i % 2 + 1)
+            bitboard.play(random.choice([col for col in range(7) if bitboard.can_play(col)]), player)
+            if bitboard.is_win(player):
+                break
+        else:
+            position, mask, moves = encode(bitboard, BoardPiece(bitboard.moves % 2 + 1))
+            score = solver.solve(position, mask, moves)
+            assert score == brute_force(position, mask, moves, {})
+            assert solver.solve(position, mask, moves, weak=True) == (score > 0) - (score < 0)
+            solved += 1
+
+
+def test_generate_move_solver():
+    from agents.agents_solver import generate_move
+    from agents.agents_solver.solver import Solver
+
+    # win at once
+    action, saved_state = generate_move(board_from_moves('010106'), BoardPiece(1), None)
+    assert action == 0
+    assert isinstance(saved_state.computational_result, Solver)
+    action, _ = generate_move(board_from_moves('010105461612513145655'), BoardPiece(2), saved_state)
+    assert action == 0  # block
+
+    # the empty board can not be solved within a small budget, the minimax move is played
+    action, _ = generate_move(initialize_game_state(), BoardPiece(1), None, max_nodes=1000)
+    assert 0 <= action < 7
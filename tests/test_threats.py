@@ -0,0 +1,87 @@
+import numpy as np
+from agents.common import BoardPiece, BitBoard, initialize_game_state, apply_player_action
+
+
+def test_threats():
+    from agents.threats import Threats, WINDOW_STARTS
+    from agents.windows import WINDOW_MASKS
+    assert sum(starts.bit_count() for starts in WINDOW_STARTS) == 69
+
+    rng = np.random.default_rng(25)
+    for _ in range(300):
+        bitboard = BitBoard()
+        for i in range(rng.integers(0, 43)):
+            bitboard.play(rng.choice([col for col in range(7) if bitboard.can_play(col)]), BoardPiece(i % 2 + 1))
+        mask = bitboard.mask
+        for player in (1, 2):
+            position = bitboard.pieces[player - 1]
+            threats = Threats(position, mask)
+            # the same counts and cells as a test of every window
+            counts = [0] * 5
+            winning = open_threes = open_twos = 0
+            for window in WINDOW_MASKS:
+                if window & (mask ^ position):
+                    continue
+                pieces = (window & position).bit_count()
+                counts[pieces] += 1
+                if pieces == 3:
+                    winning |= window & ~mask
+                    open_threes |= window & position
+                elif pieces == 2:
+                    open_twos |= window & ~mask
+            assert (threats.ones, threats.twos, threats.threes, threats.fours) == tuple(counts[1:])
+            assert (threats.winning, threats.open_threes, threats.open_twos) == (winning, open_threes, open_twos)
+            assert threats.odd | threats.even == threats.winning and not threats.odd & threats.even
+            playable = sum(1 << bitboard.heights[col] for col in range(7) if bitboard.can_play(col))
+            assert threats.playable == winning & playable
+            assert threats.connected() == max([1] + [pieces for pieces in range(1, 5) if counts[pieces]])
+
+
+def test_threat_rows():
+    from agents.threats import Threats
+    from agents.agents_montecarlo.monte_carlo import connected_three, connected_two
+
+    board = initialize_game_state()
+    board[0, 0:7] = [0, 0, 0, 2, 2, 2, 0]
+    board[1, 0:7] = [0, 0, 0, 1, 1, 1, 0]
+    bitboard = BitBoard.from_array(board)
+    # the threes of player 1 on the second row wait for the cells below them
+    threats = Threats(bitboard.pieces[0], bitboard.mask)
+    assert threats.winning == threats.even == 1 << (2 * 7 + 1) | 1 << (6 * 7 + 1)
+    assert threats.odd == threats.playable == 0 and threats.immediate_wins() == 0
+    assert threats.open_threes == bitboard.pieces[0]
+    assert threats.threes == 2 and threats.fours == 0
+    # the threes of player 2 on the first row can be completed now
+    threats = Threats(bitboard.pieces[1], bitboard.mask)
+    assert threats.winning == threats.odd == threats.playable == 1 << (2 * 7) | 1 << (6 * 7)
+    assert threats.even == 0 and threats.immediate_wins() == 2
+    assert connected_three(bitboard.pieces[1], bitboard.mask)
+
+    apply_player_action(board, 2, BoardPiece(1))
+    bitboard = BitBoard.from_array(board)
+    threats = Threats(bitboard.pieces[0], bitboard.mask)
+    assert threats.playable == 1 << (2 * 7 + 1)
+    threats = Threats(bitboard.pieces[1], bitboard.mask)
+    assert threats.winning == 1 << (6 * 7) and threats.threes == 1
+
+    board = initialize_game_state()
+    board[0, 0:7] = [1, 1, 2, 2, 0, 0, 0]
+    bitboard = BitBoard.from_array(board)
+    assert not connected_three(bitboard.pieces[1], bitboard.mask)
+    assert connected_two(bitboard.pieces[1], bitboard.mask)
+    assert not connected_two(bitboard.pieces[0], bitboard.mask)  # the pieces of player 2 close the row
+
+
+def test_evaluate_threats():
+    from agents.agents_minimax.minimax import evaluate_threats, evaluate_boards
+
+    rng = np.random.default_rng(26)
+    for _ in range(200):
+        board = initialize_game_state()
+        for i in range(rng.integers(0, 43)):
+            apply_player_action(board, rng.choice([col for col in range(7) if board[5, col] == 0]),
+                                BoardPiece(i % 2 + 1))
+        bitboard = BitBoard.from_array(board)
+        scores = evaluate_boards(board)
+        assert evaluate_threats(bitboard.pieces[0], bitboard.mask) == scores[0]
+        assert evaluate_threats(bitboard.pieces[1], bitboard.mask) == scores[1]
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def test_windows():
+    from agents.windows import WINDOW_CELLS, WINDOW_ROWS, WINDOW_COLS, WINDOW_INDICES, CELL_WINDOWS, \
+        WINDOW_MASKS, N_WINDOWS
+    assert N_WINDOWS == 69
+    assert WINDOW_ROWS.shape == WINDOW_COLS.shape == WINDOW_INDICES.shape == (69, 4)
+    assert len(set(WINDOW_CELLS)) == 69
+
+    # 24 horizontal, 21 vertical and 2 x 12 diagonal windows
+    directions = [(cells[1][0] - cells[0][0], cells[1][1] - cells[0][1]) for cells in WINDOW_CELLS]
+    assert directions.count((0, 1)) == 24
+    assert directions.count((1, 0)) == 21
+    assert directions.count((1, 1)) == 12
+    assert directions.count((-1, 1)) == 12
+
+    # corner and center cells
+    assert len(CELL_WINDOWS[0][0]) == 3
+    assert len(CELL_WINDOWS[2][3]) == 13
+    assert sum(len(CELL_WINDOWS[row][col]) for row in range(6) for col in range(7)) == 69 * 4
+    for row in range(6):
+        for col in range(7):
+            for w in range(69):
+                member = (row, col) in WINDOW_CELLS[w]
+                assert (w in CELL_WINDOWS[row][col]) == member
+                assert bool(WINDOW_MASKS[w] >> (col * 7 + row) & 1) == member
+
+    board = np.arange(42).reshape(6, 7)
+    assert np.all(board[WINDOW_ROWS, WINDOW_COLS] == board.reshape(-1)[WINDOW_INDICES])